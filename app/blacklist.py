@@ -1,9 +1,157 @@
 """
 blacklist.py
 
-This file just contains the blacklist of the JWT tokens–it will be imported by
-app and the logout resource so that tokens can be added to the blacklist when the
-user logs out.
+Revocation store for JWT tokens. Revoked token ids (jti) are kept in a shared
+backend, either the revoked_tokens table or a Redis cache, so a revocation made
+in one worker or container is seen by all of them, and they expire with the
+token's own 'exp'.
+
+Every worker keeps a Bloom filter of the revoked ids, synced from the backend
+every REVOCATION_SYNC_INTERVAL seconds, plus a small LRU of confirmed
+revocations. The common "not revoked" answer therefore needs no round trip; a
+revocation made by another worker is enforced here after at most one sync
+interval.
 """
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from models.revoked_token import RevokedTokenModel
+from user_functions.bloom_filter import BloomFilter
+
+# Overlap between syncs so revocations stamped by a slightly skewed clock are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+# Full rebuilds of the Bloom filter drop revocations whose tokens have expired
+REBUILD_INTERVAL = 3600
+
+
+class DatabaseRevocationBackend(object):
+    def revoke(self, jti:str, expires:datetime) -> None:
+        RevokedTokenModel.revoke(jti, expires)
+
+    def is_revoked(self, jti:str) -> bool:
+        return RevokedTokenModel.is_revoked(jti)
+
+    def revoked_since(self, since:datetime=None):
+        return RevokedTokenModel.fetch_revoked_since(since)
+
+
+class RedisRevocationBackend(object):
+    INDEX_KEY = 'revoked-tokens'
+
+    def __init__(self, url:str, max_token_lifetime:timedelta):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("REVOCATION_BACKEND 'redis' needs the redis package installed.")
+        self.client = redis.Redis.from_url(url)
+        self.max_token_lifetime = max_token_lifetime.total_seconds()
+
+    def revoke(self, jti:str, expires:datetime) -> None:
+        ttl = int((expires - datetime.utcnow()).total_seconds())
+        if ttl <= 0:
+            return
+        now = time.time()
+        pipeline = self.client.pipeline()
+        pipeline.set(f'revoked-token:{jti}', 1, ex=ttl)
+        # Index of revocations scored by revocation time, for incremental syncs;
+        # entries older than the longest token lifetime can no longer matter.
+        pipeline.zadd(self.INDEX_KEY, {f'{now + ttl}:{jti}': now})
+        pipeline.zremrangebyscore(self.INDEX_KEY, '-inf', now - self.max_token_lifetime)
+        pipeline.execute()
+
+    def is_revoked(self, jti:str) -> bool:
+        return bool(self.client.exists(f'revoked-token:{jti}'))
+
+    def revoked_since(self, since:datetime=None):
+        since_timestamp = (since - datetime(1970, 1, 1)).total_seconds() if since else '-inf'
+        now = time.time()
+        revoked = []
+        for member in self.client.zrangebyscore(self.INDEX_KEY, since_timestamp, '+inf'):
+            expires, jti = member.decode().split(':', 1)
+            if float(expires) > now:
+                revoked.append(jti)
+        return revoked
+
+
+class RevocationStore(object):
+    def __init__(self, app=None):
+        self.backend = None
+        self.sync_interval = 5.0
+        self.bloom_capacity = 100000
+        self.lru_size = 10000
+        self.backend_lookups = 0
+        self._lock = threading.Lock()
+        self._revoked = OrderedDict()
+        self._bloom = None
+        self._synced_at = None
+        self._next_sync = 0.0
+        self._next_rebuild = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        if app.config.get('REVOCATION_BACKEND', 'database') == 'redis':
+            max_token_lifetime = app.config.get('JWT_REFRESH_TOKEN_EXPIRES') or timedelta(days=30)
+            self.backend = RedisRevocationBackend(app.config['REVOCATION_CACHE_URL'], max_token_lifetime)
+        else:
+            self.backend = DatabaseRevocationBackend()
+        self.sync_interval = app.config.get('REVOCATION_SYNC_INTERVAL', 5.0)
+        self.bloom_capacity = app.config.get('REVOCATION_BLOOM_CAPACITY', 100000)
+
+    def revoke(self, decrypted_token:dict) -> None:
+        '''Revoke a token until its own expiry.'''
+        jti = decrypted_token['jti']
+        expires = datetime.utcfromtimestamp(decrypted_token['exp']) if decrypted_token.get('exp') else datetime.utcnow() + timedelta(days=365)
+        self.backend.revoke(jti, expires)
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            self._remember(jti)
+
+    def is_revoked(self, jti:str) -> bool:
+        self.sync()
+        if jti in self._revoked:
+            return True
+        if jti not in self._bloom:
+            return False
+        # Possibly revoked (or a Bloom false positive): confirm with the backend
+        self.backend_lookups += 1
+        revoked = self.backend.is_revoked(jti)
+        if revoked:
+            with self._lock:
+                self._remember(jti)
+        return revoked
+
+    def _remember(self, jti:str) -> None:
+        self._revoked[jti] = True
+        self._revoked.move_to_end(jti)
+        while len(self._revoked) > self.lru_size:
+            self._revoked.popitem(last=False)
+
+    def sync(self) -> None:
+        '''Bring the Bloom filter up to date with the backend, at most once per sync interval.'''
+        if time.monotonic() < self._next_sync:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_sync:
+                return
+            started = datetime.utcnow()
+            if self._bloom is None or self._bloom.saturated or now >= self._next_rebuild:
+                revoked = self.backend.revoked_since(None)
+                bloom = BloomFilter(max(self.bloom_capacity, 2 * len(revoked)))
+                for jti in revoked:
+                    bloom.add(jti)
+                self._bloom = bloom
+                self._next_rebuild = now + REBUILD_INTERVAL
+            else:
+                for jti in self.backend.revoked_since(self._synced_at - SYNC_OVERLAP):
+                    if jti not in self._bloom:
+                        self._bloom.add(jti)
+            self._synced_at = started
+            self._next_sync = now + self.sync_interval
+
 
-BLACKLIST = set()
\ No newline at end of file
+revocation_store = RevocationStore()
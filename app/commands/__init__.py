@@ -0,0 +1,13 @@
+from .inventory import reconcile_inventory
+from .logos import backfill_logo_variants
+from .schema import setup_schema
+from .openapi import write_openapi
+from .signing_keys import generate_signing_key
+
+
+def register_commands(app):
+    app.cli.add_command(reconcile_inventory)
+    app.cli.add_command(backfill_logo_variants)
+    app.cli.add_command(setup_schema)
+    app.cli.add_command(write_openapi)
+    app.cli.add_command(generate_signing_key)
@@ -0,0 +1,31 @@
+import json
+
+import click
+from flask.cli import with_appcontext
+
+from models.application import ApplicationModel
+from models.license import LicenseModel
+
+
+@click.command('reconcile-inventory')
+@click.option('--batch-size', default=500, show_default=True, help='Applications recounted per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report drift, do not fix the counters.')
+@with_appcontext
+def reconcile_inventory(batch_size, dry_run):
+    '''Recompute the license inventory counters and report drift.'''
+    checked = 0
+    drifted = 0
+    after = None
+    while True:
+        applications, after = ApplicationModel.fetch_page(after=after, limit=batch_size)
+        if applications:
+            drift = LicenseModel.reconcile_inventory([application.id for application in applications], fix=not dry_run)
+            for counter in drift:
+                click.echo(json.dumps(counter))
+            checked += len(applications)
+            drifted += len(drift)
+        if after is None:
+            break
+
+    action = 'found' if dry_run else 'fixed'
+    click.echo(f'Checked {checked} applications, {action} {drifted} drifted counters.')
@@ -0,0 +1,19 @@
+import click
+from flask.cli import with_appcontext
+
+from models.logo_variant import LogoVariantModel
+from user_functions.logo_variants import logo_pipeline
+
+
+@click.command('backfill-logo-variants')
+@click.option('--all', 'regenerate', is_flag=True, help='Also regenerate logos that already have variants.')
+@with_appcontext
+def backfill_logo_variants(regenerate):
+    '''Generate thumbnail and WebP variants for logos already in the upload folder.'''
+    logos = [logo for logo in logo_pipeline.originals() if regenerate or not LogoVariantModel.has_variants(logo)]
+    failed = 0
+    for logo, error in logo_pipeline.backfill(logos):
+        if error:
+            failed += 1
+            click.echo(f'{logo}: {error}', err=True)
+    click.echo(f'Generated variants for {len(logos) - failed} logos, {failed} failed.')
@@ -0,0 +1,29 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from resources import api
+from user_functions.openapi import document_etag, render_document
+
+
+@click.command('write-openapi')
+@click.option('--output', help='File to write, defaults to OPENAPI_DOCUMENT.')
+@with_appcontext
+def write_openapi(output):
+    '''Write the Swagger/OpenAPI document to a static file.'''
+    output = output or current_app.config.get('OPENAPI_DOCUMENT')
+    if not output:
+        raise click.UsageError('Give --output or set OPENAPI_DOCUMENT.')
+    with current_app.test_request_context('/'):
+        document = render_document(api)
+
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    # Written aside and renamed, so nginx never serves a partial file
+    partial_output = f'{output}.partial'
+    with open(partial_output, 'wb') as document_file:
+        document_file.write(document)
+    os.replace(partial_output, output)
+    click.echo(f'Wrote {len(document)} bytes to {output}, ETag "{document_etag(document)}".')
@@ -0,0 +1,28 @@
+import click
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask import current_app
+from flask.cli import with_appcontext
+from flask_migrate import upgrade
+
+from models import db
+
+
+@click.command('setup-schema')
+@click.option('--check', is_flag=True, help='Only report whether the schema is up to date; exit with status 1 if not.')
+@with_appcontext
+def setup_schema(check):
+    '''Bring the database schema up to date with the migrations.'''
+    migrate = current_app.extensions['migrate']
+    head = ScriptDirectory.from_config(migrate.migrate.get_config(migrate.directory)).get_current_head()
+    with db.engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+
+    if current == head:
+        click.echo(f'The schema is up to date at {head}.')
+        return
+    if check:
+        click.echo(f"The schema is at {current or 'no revision'}, the latest migration is {head}.")
+        raise SystemExit(1)
+    upgrade(directory=migrate.directory)
+    click.echo(f"Upgraded the schema from {current or 'no revision'} to {head}.")
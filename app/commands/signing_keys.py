@@ -0,0 +1,44 @@
+import os
+import time
+
+import click
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+def write_signing_key(directory:str, key_id:str) -> str:
+    '''Write a new Ed25519 private key to `<directory>/<key_id>.pem`, readable by the owner only.'''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{key_id}.pem')
+    pem = Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    # O_EXCL: an existing key is never overwritten
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, 'wb') as key_file:
+        key_file.write(pem)
+    return path
+
+
+@click.command('generate-signing-key')
+@click.option('--key-id', help='Key id, defaults to the current date and time.')
+@click.option('--directory', help='Keys directory, defaults to LICENSE_SIGNING_KEYS_DIR.')
+@with_appcontext
+def generate_signing_key(key_id, directory):
+    '''Add a new Ed25519 license signing key to the keys directory.'''
+    directory = directory or current_app.config.get('LICENSE_SIGNING_KEYS_DIR')
+    if not directory:
+        raise click.UsageError('Give --directory or set LICENSE_SIGNING_KEYS_DIR.')
+    key_id = key_id or time.strftime('%Y%m%d%H%M%S', time.gmtime())
+    if not key_id.replace('-', '').replace('_', '').isalnum():
+        raise click.UsageError('Key ids may only hold letters, digits, - and _.')
+
+    if os.path.exists(os.path.join(directory, f'{key_id}.pem')) or os.path.exists(os.path.join(directory, f'{key_id}.pub')):
+        raise click.UsageError(f"There is already a key '{key_id}' in {directory}.")
+    path = write_signing_key(directory, key_id)
+
+    click.echo(f"Wrote signing key '{key_id}' to {path}.")
+    click.echo('Keep LICENSE_SIGNING_KEY_ID on the key that signs now and restart: the new key is published at '
+               '/api/license/keys. When clients have fetched it, '
+               f'set LICENSE_SIGNING_KEY_ID={key_id} to sign with it.')
@@ -8,9 +8,21 @@ class Config(object):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = bool(os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS'))
-    SQLALCHEMY_ENGINE_OPTIONS = {'pool_recycle': 280, 'pool_timeout': 100, 'pool_pre_ping': True}
+    SQLALCHEMY_REPLICA_URI = os.getenv('SQLALCHEMY_REPLICA_URI') # optional read replica for GET requests
+    SQLALCHEMY_BINDS = {'replica': SQLALCHEMY_REPLICA_URI} if SQLALCHEMY_REPLICA_URI else None
+    SQLALCHEMY_ENGINE_OPTIONS = {} # explicit overrides of the options built from the DATABASE_* settings
+    READ_REPLICA_NAMESPACES = ('software', 'application', 'license', 'search')
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 5))
+    DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 10))
+    DATABASE_POOL_TIMEOUT = int(os.getenv('DATABASE_POOL_TIMEOUT', 100))
+    DATABASE_POOL_RECYCLE = int(os.getenv('DATABASE_POOL_RECYCLE', 280))
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('DATABASE_STATEMENT_TIMEOUT', 0)) # milliseconds, 0 for none
     JWT_BLACKLIST_ENABLED = True  # enable blacklist feature
     JWT_BLACKLIST_TOKEN_CHECKS = ["access", "refresh"]
+    REVOCATION_BACKEND = os.getenv('REVOCATION_BACKEND', 'database') # database or redis
+    REVOCATION_CACHE_URL = os.getenv('REVOCATION_CACHE_URL') # redis://host:6379/1 for the redis backend
+    REVOCATION_SYNC_INTERVAL = float(os.getenv('REVOCATION_SYNC_INTERVAL', 5))
+    REVOCATION_BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', 100000))
     SECRET_KEY = os.getenv('SECRET_KEY')
     MAIL_SERVER = os.getenv('MAIL_SERVER')
     MAIL_PORT = int(os.getenv('MAIL_PORT'))
@@ -19,21 +31,74 @@ class Config(object):
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_ASCII_ATTACHMENTS = bool(os.getenv('MAIL_ASCII_ATTACHMENTS'))
     DEFAULT_MAIL_SENDER = os.getenv('DEFAULT_MAIL_SENDER')
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    MAX_LOGO_SIZE = int(os.getenv('MAX_LOGO_SIZE', 2 * 1024 * 1024))
+    LOGO_ACCEL_REDIRECT = os.getenv('LOGO_ACCEL_REDIRECT') # e.g. /logos/ when nginx serves UPLOAD_FOLDER there
+    LOGO_PIPELINE_WORKERS = int(os.getenv('LOGO_PIPELINE_WORKERS', 2)) # 0 disables thumbnail generation
+    VALIDATION_SYNC_INTERVAL = float(os.getenv('VALIDATION_SYNC_INTERVAL', 5))
+    VALIDATION_SYNC_OVERLAP = float(os.getenv('VALIDATION_SYNC_OVERLAP', 120)) # seconds of clock skew and transaction time allowed for
+    VALIDATION_REBUILD_INTERVAL = float(os.getenv('VALIDATION_REBUILD_INTERVAL', 300))
+    VALIDATION_BLOOM_CAPACITY = int(os.getenv('VALIDATION_BLOOM_CAPACITY', 1000000))
+    VALIDATION_CACHE_SIZE = int(os.getenv('VALIDATION_CACHE_SIZE', 10000))
+    VALIDATION_CACHE_TTL = float(os.getenv('VALIDATION_CACHE_TTL', 5))
+    LICENSE_SIGNING_KEYS_DIR = os.getenv('LICENSE_SIGNING_KEYS_DIR') # <kid>.pem signing keys, <kid>.pub retired ones; unset issues no license tokens
+    LICENSE_SIGNING_KEY_ID = os.getenv('LICENSE_SIGNING_KEY_ID') # the key that signs, optional with a single private key
+    LICENSE_TOKEN_LIFETIME = int(os.getenv('LICENSE_TOKEN_LIFETIME', 365)) # days
+    LICENSE_TOKEN_ISSUER = os.getenv('LICENSE_TOKEN_ISSUER')
+    CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', 'memory') # memory, redis or none
+    CATALOG_CACHE_URL = os.getenv('CATALOG_CACHE_URL') # redis://host:6379/0 for the redis backend
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60))
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 1024))
+    METRICS_ENABLED = bool(os.getenv('METRICS_ENABLED')) # per-request timings and the /metrics endpoint
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', '1') == '1'
+    METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN') # bearer token scrapers present to /metrics; unset serves no /metrics
+    WARM_UP = os.getenv('WARM_UP', '1') == '1' # prime pools and serializers before a worker takes traffic
+    SENTRY_DSN = os.getenv('SENTRY_DSN')
+    OPENAPI_DOCUMENT = os.getenv('OPENAPI_DOCUMENT') # swagger.json written by `flask write-openapi`, served when present
 
 
 class Development(Config):
     ENVIRONMENT = 'Development'
     DEBUG = True
     MAIL_DEBUG = True
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 2))
+    DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 2))
+    DATABASE_POOL_TIMEOUT = int(os.getenv('DATABASE_POOL_TIMEOUT', 10))
    
 class Testing (Config):
     ENVIRONMENT = 'Production'
     DEBUG = False
     MAIL_DEBUG = False
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 2))
+    DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 0))
+    DATABASE_POOL_TIMEOUT = int(os.getenv('DATABASE_POOL_TIMEOUT', 5))
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('DATABASE_STATEMENT_TIMEOUT', 10000))
 
     
 class Production(Config):
     ENVIRONMENT = 'Production'
     DEBUG = False
     MAIL_DEBUG = False
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 10))
+    DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 20))
+    DATABASE_POOL_TIMEOUT = int(os.getenv('DATABASE_POOL_TIMEOUT', 30))
+    DATABASE_STATEMENT_TIMEOUT = int(os.getenv('DATABASE_STATEMENT_TIMEOUT', 30000))
+    SENTRY_DSN = os.getenv('SENTRY_DSN', 'https://3991c8bcf1314bc48b49c1452e1eaca2@o431070.ingest.sentry.io/5380982')
 
+
+# Chosen by the APP_ENVIRONMENT variable
+environments = {
+    'development': Development,
+    'testing': Testing,
+    'production': Production,
+}
+
+
+def environment_config(name:str=None):
+    '''The configuration class of an environment, by default the one named by APP_ENVIRONMENT.'''
+    name = (name or os.getenv('APP_ENVIRONMENT', 'development')).lower()
+    try:
+        return environments[name]
+    except KeyError:
+        raise RuntimeError(f"Unknown APP_ENVIRONMENT '{name}', choose from: {', '.join(environments)}.")
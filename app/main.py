@@ -4,40 +4,72 @@ import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 from flask import Flask, jsonify
 from flask_cors import CORS
+from flask_migrate import Migrate
 from marshmallow import ValidationError
 
 from configurations import *
 from resources import blueprint, jwt 
 from models import db
 from schemas import ma
+from commands import register_commands
+from user_functions.catalog_cache import catalog_cache
+from blacklist import revocation_store
+from user_functions.logo_storage import logo_storage
+from user_functions.logo_variants import logo_pipeline
+from user_functions.record_user_log import log_shipper
+from user_functions.request_metrics import request_metrics
+from user_functions.license_validation import license_validator
+from user_functions.license_signing import license_signer
+from user_functions.warm_up import register_warm_up, warm_up
 
-app = Flask(__name__)
+migrate = Migrate()
 
-app.config.from_object(Development)
+basedir = os.path.abspath(os.path.dirname(__file__))
 
-sentry_sdk.init(
-    dsn="https://3991c8bcf1314bc48b49c1452e1eaca2@o431070.ingest.sentry.io/5380982",
-    integrations=[FlaskIntegration()]
-)
 
-CORS(app)
-app.register_blueprint(blueprint)
-jwt.init_app(app)
-db.init_app(app)
-ma.init_app(app)
+def create_app(config=None):
+    '''Build the app from a configuration class, an environment name or, by default, APP_ENVIRONMENT.'''
+    app = Flask(__name__)
+    app.config.from_object(config if isinstance(config, type) else environment_config(config))
 
+    if app.config.get('SENTRY_DSN'):
+        sentry_sdk.init(
+            dsn=app.config['SENTRY_DSN'],
+            integrations=[FlaskIntegration()]
+        )
 
-basedir = os.path.abspath(os.path.dirname(__file__))
+    CORS(app)
+    app.register_blueprint(blueprint)
+    jwt.init_app(app)
+    db.init_app(app)
+    ma.init_app(app)
+    catalog_cache.init_app(app)
+    revocation_store.init_app(app)
+    license_validator.init_app(app)
+    license_signer.init_app(app)
+    logo_storage.init_app(app)
+    logo_pipeline.init_app(app)
+    request_metrics.init_app(app)
+    request_metrics.add_stats('catalog_cache', catalog_cache.stats)
+    request_metrics.add_stats('log_shipper', log_shipper.stats)
+    request_metrics.add_stats('license_validation', license_validator.stats)
+    request_metrics.add_stats('license_signing', license_signer.stats)
+    request_metrics.add_info('license_signing_key', license_signer.info)
+    migrate.init_app(app, db)
+    register_commands(app)
+    app.register_error_handler(ValidationError, handle_marshmallow_validation)
+    register_warm_up(app)
+    return app
 
-@app.before_first_request
-def create_tables():
-    db.create_all()
 
-@app.errorhandler(ValidationError)
 def handle_marshmallow_validation(err):
     return jsonify(err.messages), 400
 
 
+app = create_app()
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=3101)
\ No newline at end of file
+    if app.config['WARM_UP']:
+        warm_up(app)
+    app.run(host='0.0.0.0', port=3101)
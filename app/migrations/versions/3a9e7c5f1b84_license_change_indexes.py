@@ -0,0 +1,27 @@
+"""license change indexes
+
+Revision ID: 3a9e7c5f1b84
+Revises: d4f8a1c6e925
+Create Date: 2026-10-18 10:12:47.318520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9e7c5f1b84'
+down_revision = 'd4f8a1c6e925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # License validation reads the licenses added or changed since its last sync
+    op.create_index('ix_licenses_created', 'licenses', ['created'], unique=False)
+    op.create_index('ix_licenses_updated', 'licenses', ['updated'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_licenses_updated', table_name='licenses')
+    op.drop_index('ix_licenses_created', table_name='licenses')
@@ -0,0 +1,32 @@
+"""logo variants
+
+Revision ID: 4d2a9c61f0b3
+Revises: e81f6a2d4b57
+Create Date: 2026-10-17 14:48:33.512006
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d2a9c61f0b3'
+down_revision = 'e81f6a2d4b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('logo_variants',
+    sa.Column('logo', sa.String(length=80), nullable=False),
+    sa.Column('variant', sa.String(length=20), nullable=False),
+    sa.Column('image_format', sa.String(length=10), nullable=False),
+    sa.Column('file', sa.String(length=100), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=False),
+    sa.Column('height', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('logo', 'variant', 'image_format')
+    )
+
+
+def downgrade():
+    op.drop_table('logo_variants')
@@ -0,0 +1,58 @@
+"""initial schema
+
+Revision ID: 5a1c0e2b7d41
+Revises: 
+Create Date: 2026-10-17 09:12:04.118253
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1c0e2b7d41'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables as db.create_all() used to create them; existing databases should
+    # be stamped with this revision (flask db stamp 5a1c0e2b7d41) before upgrading.
+    op.create_table('software',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.Column('logo', sa.String(length=80), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('applications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('software_id', sa.Integer(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('logo', sa.String(length=80), nullable=False),
+    sa.Column('price', sa.Float(precision=2), nullable=False),
+    sa.Column('download_link', sa.String(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['software_id'], ['software.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('licenses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('license_key', sa.String(length=80), nullable=False),
+    sa.Column('license_status', sa.String(length=25), nullable=False),
+    sa.Column('application_id', sa.Integer(), nullable=False),
+    sa.Column('created', sa.DateTime(), nullable=False),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['application_id'], ['applications.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('licenses')
+    op.drop_table('applications')
+    op.drop_table('software')
@@ -0,0 +1,28 @@
+"""record versions
+
+Revision ID: 7b3e9d2c5a10
+Revises: 4d2a9c61f0b3
+Create Date: 2026-10-17 20:05:41.318206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3e9d2c5a10'
+down_revision = '4d2a9c61f0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start at version 1 through the server default
+    for table in ('software', 'applications', 'licenses'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in ('licenses', 'applications', 'software'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,59 @@
+"""license and application indexes
+
+Revision ID: 9e4b3f1a6c28
+Revises: 5a1c0e2b7d41
+Create Date: 2026-10-17 09:40:51.602914
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b3f1a6c28'
+down_revision = '5a1c0e2b7d41'
+branch_labels = None
+depends_on = None
+
+# Duplicate keys listed when the unique index cannot be built
+REPORTED_DUPLICATES = 20
+
+
+def check_duplicate_keys():
+    '''Stop before the unique key index if keys were stored twice: which copy to keep is the operator's call.'''
+    if context.is_offline_mode():
+        return
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT license_key, COUNT(*) AS copies, MIN(id) AS first_id FROM licenses '
+        'GROUP BY license_key HAVING COUNT(*) > 1 ORDER BY first_id LIMIT :limit'
+    ), limit=REPORTED_DUPLICATES + 1).fetchall()
+    if duplicates:
+        listed = '\n'.join(f'  {row.license_key!r}: {row.copies} licenses' for row in duplicates[:REPORTED_DUPLICATES])
+        more = '\n  ...' if len(duplicates) > REPORTED_DUPLICATES else ''
+        raise RuntimeError(
+            'Cannot add the unique index ix_licenses_license_key: these license keys are stored more than once:\n'
+            f'{listed}{more}\n'
+            'Delete or re-key the extra copies (SELECT id, license_key, license_status FROM licenses '
+            'WHERE license_key IN (SELECT license_key FROM licenses GROUP BY license_key HAVING COUNT(*) > 1)), '
+            'then run the upgrade again.')
+
+
+def upgrade():
+    check_duplicate_keys()
+    op.create_index(op.f('ix_applications_software_id'), 'applications', ['software_id'], unique=False)
+    op.create_index('ix_licenses_license_key', 'licenses', ['license_key'], unique=True)
+    op.create_index('ix_licenses_application_id_id', 'licenses', ['application_id', 'id'], unique=False)
+    op.create_index('ix_licenses_application_id_license_status_id', 'licenses', ['application_id', 'license_status', 'id'], unique=False)
+    op.create_index('ix_licenses_license_status_id', 'licenses', ['license_status', 'id'], unique=False)
+    op.create_index('ix_licenses_available', 'licenses', ['application_id', 'id'], unique=False,
+                    postgresql_where=sa.text("license_status = 'available'"),
+                    sqlite_where=sa.text("license_status = 'available'"))
+
+
+def downgrade():
+    op.drop_index('ix_licenses_available', table_name='licenses')
+    op.drop_index('ix_licenses_license_status_id', table_name='licenses')
+    op.drop_index('ix_licenses_application_id_license_status_id', table_name='licenses')
+    op.drop_index('ix_licenses_application_id_id', table_name='licenses')
+    op.drop_index('ix_licenses_license_key', table_name='licenses')
+    op.drop_index(op.f('ix_applications_software_id'), table_name='applications')
@@ -0,0 +1,58 @@
+"""search indexes
+
+Revision ID: b6f1d8e4a2c7
+Revises: 7b3e9d2c5a10
+Create Date: 2026-10-17 22:14:09.550371
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f1d8e4a2c7'
+down_revision = '7b3e9d2c5a10'
+branch_labels = None
+depends_on = None
+
+# FTS5 tables mirroring a text column, kept in sync by triggers: (search table, table, column)
+SQLITE_SEARCH_TABLES = (
+    ('software_search', 'software', 'name'),
+    ('applications_search', 'applications', 'description'),
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Needs a role allowed to create the extension
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX ix_search_software_name_trgm ON software USING gin (name gin_trgm_ops)')
+        op.execute("CREATE INDEX ix_search_applications_description_fts ON applications USING gin (to_tsvector('english'::regconfig, description))")
+        # License keys in binary order, for prefix ranges whatever the database collation
+        op.execute('CREATE INDEX ix_search_licenses_license_key ON licenses (license_key COLLATE "C")')
+    elif dialect == 'sqlite':
+        for search_table, table, column in SQLITE_SEARCH_TABLES:
+            op.execute(f"CREATE VIRTUAL TABLE {search_table} USING fts5({column}, content='{table}', content_rowid='id')")
+            op.execute(f'CREATE TRIGGER {search_table}_insert AFTER INSERT ON {table} BEGIN '
+                       f'INSERT INTO {search_table}(rowid, {column}) VALUES (new.id, new.{column}); END')
+            op.execute(f'CREATE TRIGGER {search_table}_delete AFTER DELETE ON {table} BEGIN '
+                       f"INSERT INTO {search_table}({search_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END")
+            op.execute(f'CREATE TRIGGER {search_table}_update AFTER UPDATE OF {column} ON {table} BEGIN '
+                       f"INSERT INTO {search_table}({search_table}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+                       f'INSERT INTO {search_table}(rowid, {column}) VALUES (new.id, new.{column}); END')
+            op.execute(f"INSERT INTO {search_table}({search_table}) VALUES ('rebuild')")
+        # The unique index on license_key is already in binary order
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX ix_search_licenses_license_key')
+        op.execute('DROP INDEX ix_search_applications_description_fts')
+        op.execute('DROP INDEX ix_search_software_name_trgm')
+    elif dialect == 'sqlite':
+        for search_table, table, column in reversed(SQLITE_SEARCH_TABLES):
+            for trigger in ('update', 'delete', 'insert'):
+                op.execute(f'DROP TRIGGER {search_table}_{trigger}')
+            op.execute(f'DROP TABLE {search_table}')
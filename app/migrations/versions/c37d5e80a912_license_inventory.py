@@ -0,0 +1,42 @@
+"""license inventory
+
+Revision ID: c37d5e80a912
+Revises: 9e4b3f1a6c28
+Create Date: 2026-10-17 11:05:37.270431
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c37d5e80a912'
+down_revision = '9e4b3f1a6c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('license_inventory',
+    sa.Column('application_id', sa.Integer(), nullable=False),
+    sa.Column('license_status', sa.String(length=25), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['application_id'], ['applications.id'], ),
+    sa.PrimaryKeyConstraint('application_id', 'license_status')
+    )
+    # Backfill one counter per application and status from the current licenses
+    op.execute("""
+        INSERT INTO license_inventory (application_id, license_status, count)
+        SELECT applications.id, statuses.license_status,
+               (SELECT count(*) FROM licenses
+                WHERE licenses.application_id = applications.id
+                AND licenses.license_status = statuses.license_status)
+        FROM applications
+        CROSS JOIN (SELECT 'available' AS license_status
+                    UNION ALL SELECT 'on_credit'
+                    UNION ALL SELECT 'sold') AS statuses
+    """)
+
+
+def downgrade():
+    op.drop_table('license_inventory')
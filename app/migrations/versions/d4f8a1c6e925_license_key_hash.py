@@ -0,0 +1,49 @@
+"""license key hash
+
+Revision ID: d4f8a1c6e925
+Revises: b6f1d8e4a2c7
+Create Date: 2026-10-17 23:41:26.804113
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f8a1c6e925'
+down_revision = 'b6f1d8e4a2c7'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade():
+    # Filled by the model's column default from now on; kept nullable so the
+    # column can be added without rewriting the table
+    op.add_column('licenses', sa.Column('license_key_hash', sa.String(length=64), nullable=True))
+
+    licenses = sa.table('licenses', sa.column('id', sa.Integer), sa.column('license_key', sa.String),
+                        sa.column('license_key_hash', sa.String))
+    connection = op.get_bind()
+    after = 0
+    while True:
+        rows = connection.execute(sa.select([licenses.c.id, licenses.c.license_key])
+                                  .where(licenses.c.id > after).order_by(licenses.c.id).limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        connection.execute(licenses.update().where(licenses.c.id == sa.bindparam('row_id'))
+                           .values(license_key_hash=sa.bindparam('key_hash')),
+                           [{'row_id': id, 'key_hash': hashlib.sha256(license_key.encode('utf-8')).hexdigest()}
+                            for id, license_key in rows])
+        after = rows[-1][0]
+
+    op.create_index('ix_licenses_license_key_hash', 'licenses', ['license_key_hash'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_licenses_license_key_hash', table_name='licenses')
+    with op.batch_alter_table('licenses') as batch_op:
+        batch_op.drop_column('license_key_hash')
@@ -0,0 +1,33 @@
+"""revoked tokens
+
+Revision ID: e81f6a2d4b57
+Revises: c37d5e80a912
+Create Date: 2026-10-17 13:22:10.905183
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81f6a2d4b57'
+down_revision = 'c37d5e80a912'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revoked_tokens',
+    sa.Column('jti', sa.String(length=120), nullable=False),
+    sa.Column('expires', sa.DateTime(), nullable=False),
+    sa.Column('revoked', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(op.f('ix_revoked_tokens_expires'), 'revoked_tokens', ['expires'], unique=False)
+    op.create_index(op.f('ix_revoked_tokens_revoked'), 'revoked_tokens', ['revoked'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_revoked_tokens_revoked'), table_name='revoked_tokens')
+    op.drop_index(op.f('ix_revoked_tokens_expires'), table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
@@ -1,4 +1,66 @@
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import load_only
 
-db = SQLAlchemy()
+from .routing import RoutingSQLAlchemy
 
+db = RoutingSQLAlchemy()
+
+
+def fetch_keyset_page(query, id_column, after:int=None, limit:int=100):
+    '''Return (items, next_after) for a query paginated on an increasing id column.
+
+    One extra row is fetched to know whether another page exists; next_after is
+    the cursor for that page, or None when this is the last one.
+    '''
+    if after is not None:
+        query = query.filter(id_column > after)
+    items = query.order_by(id_column.asc()).limit(limit + 1).all()
+    if len(items) > limit:
+        items = items[:limit]
+        return items, items[-1].id
+    return items, None
+
+
+def load_columns(query, columns=None):
+    '''Load just the named columns of the query's model, or all of them when columns is None.'''
+    if columns is None:
+        return query
+    return query.options(load_only(*columns))
+
+
+class ConflictError(Exception):
+    '''The change is not allowed in the record's current state.'''
+
+
+class PreconditionFailedError(Exception):
+    '''The record is not at the version the client expected (If-Match).'''
+
+
+def compare_and_set(model, id:int, values:dict, version:int=None, conditions=()):
+    '''Change one row with a single conditional UPDATE and bump its version, without committing.
+
+    The row only changes while it still has `version` (when given) and matches every
+    one of `conditions`. Returns the updated row, read back through RETURNING where
+    the database supports it, or None when no row matched (see explain_unchanged).
+    '''
+    table = model.__table__
+    statement = table.update().where(table.c.id == id).values(version=table.c.version + 1, **values)
+    if version is not None:
+        statement = statement.where(table.c.version == version)
+    for condition in conditions:
+        statement = statement.where(condition)
+    if db.session.get_bind().dialect.implicit_returning:
+        return db.session.execute(statement.returning(*table.c)).first()
+    if db.session.execute(statement).rowcount != 1:
+        return None
+    return db.session.execute(table.select().where(table.c.id == id)).first()
+
+
+def explain_unchanged(model, id:int, version:int=None):
+    '''After compare_and_set matched no row: roll back and return the current row, or None
+    if there is none; raise PreconditionFailedError if it is not at `version`.'''
+    db.session.rollback()
+    table = model.__table__
+    row = db.session.execute(table.select().where(table.c.id == id)).first()
+    if row is not None and version is not None and row.version != version:
+        raise PreconditionFailedError(f'This record has changed, its current version is {row.version}.')
+    return row
@@ -1,12 +1,16 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Set, Tuple
 
-from . import db
+from sqlalchemy import func
+
+from . import db, fetch_keyset_page, load_columns, compare_and_set, explain_unchanged
+from .search import SEARCH_CONFIG, dialect_name, contains_pattern, fts5_search, search_page
+from .inventory import InventoryModel
 
 class ApplicationModel(db.Model):
     __tablename__ = 'applications'
     id = db.Column(db.Integer, primary_key =True)
-    software_id = db.Column(db.Integer, db.ForeignKey('software.id'), nullable=False)
+    software_id = db.Column(db.Integer, db.ForeignKey('software.id'), nullable=False, index=True)
     software = db.relationship('SoftwareModel')
     description = db.Column(db.String, nullable=False)
     logo = db.Column(db.String(80), nullable=False)
@@ -14,46 +18,118 @@ class ApplicationModel(db.Model):
     download_link = db.Column(db.String, nullable=False)
     created = db.Column(db.DateTime, default=datetime.utcnow(), nullable=False)
     updated = db.Column(db.DateTime, onupdate=datetime.utcnow(), nullable=True)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
 
     licenses = db.relationship('LicenseModel', lazy='dynamic')
 
     def insert_record(self) -> None:
         db.session.add(self)
+        db.session.flush()
+        InventoryModel.insert_application(self.id)
         db.session.commit()
 
     @classmethod
     def fetch_all(cls) -> List['ApplicationModel']:
         return cls.query.order_by(cls.id.asc()).all()
 
+    @classmethod
+    def fetch_page(cls, after:int=None, limit:int=100, columns:List[str]=None, software_id:int=None,
+                   created_from:datetime=None, created_to:datetime=None) -> Tuple[List['ApplicationModel'], Optional[int]]:
+        query = load_columns(cls.query, columns)
+        if software_id:
+            query = query.filter(cls.software_id == software_id)
+        if created_from:
+            query = query.filter(cls.created >= created_from)
+        if created_to:
+            query = query.filter(cls.created < created_to)
+        return fetch_keyset_page(query, cls.id, after=after, limit=limit)
+
     @classmethod
     def fetch_by_software_id(cls, software_id:int) -> List['ApplicationModel']:
         return cls.query.filter_by(software_id=software_id).all()
 
     @classmethod
-    def fetch_by_id(cls, id:int) -> 'ApplicationModel':
-        return cls.query.get(id)
+    def fetch_by_software_ids(cls, software_ids:List[int], columns:List[str]=None) -> List['ApplicationModel']:
+        if not software_ids:
+            return []
+        return load_columns(cls.query, columns).filter(cls.software_id.in_(software_ids)).order_by(cls.id.asc()).all()
+
+    @classmethod
+    def search(cls, query:str, offset:int=0, limit:int=20) -> Tuple[List['ApplicationModel'], Optional[int]]:
+        '''Applications whose description matches `query`, best match first; returns (items, next_offset).'''
+        dialect = dialect_name()
+        if dialect == 'sqlite':
+            items = fts5_search(cls, 'applications_search', query, offset, limit + 1)
+        else:
+            if dialect == 'postgresql':
+                # Same expression as the full-text index
+                document = func.to_tsvector(SEARCH_CONFIG, cls.description)
+                terms = func.plainto_tsquery(SEARCH_CONFIG, query)
+                matches = cls.query.filter(document.op('@@')(terms)).order_by(func.ts_rank(document, terms).desc())
+            else:
+                matches = cls.query.filter(cls.description.ilike(contains_pattern(query), escape='\\'))
+            items = matches.order_by(cls.id.asc()).offset(offset).limit(limit + 1).all()
+        return search_page(items, offset, limit)
+
+    @classmethod
+    def fetch_by_logo(cls, logo:str) -> List['ApplicationModel']:
+        return cls.query.filter_by(logo=logo).all()
+
+    @classmethod
+    def fetch_by_id(cls, id:int, columns:List[str]=None) -> 'ApplicationModel':
+        return load_columns(cls.query, columns).get(id)
 
     @classmethod
-    def update_application(cls, id:int, description:str=None, price:float=None, download_link:str=None) -> None:
-        record = cls.fetch_by_id(id)
+    def fetch_by_ids(cls, ids:List[int]) -> List['ApplicationModel']:
+        if not ids:
+            return []
+        return cls.query.filter(cls.id.in_(ids)).order_by(cls.id.asc()).all()
+
+    @classmethod
+    def fetch_existing_ids(cls, ids:List[int]) -> Set[int]:
+        if not ids:
+            return set()
+        rows = db.session.query(cls.id).filter(cls.id.in_(ids)).all()
+        return {id for id, in rows}
+
+    @classmethod
+    def fetch_software_ids(cls, ids:List[int]) -> List[Tuple[int, int]]:
+        '''(application id, software id) pairs for the given applications.'''
+        if not ids:
+            return []
+        return db.session.query(cls.id, cls.software_id).filter(cls.id.in_(ids)).all()
+
+    @classmethod
+    def update_application(cls, id:int, description:str=None, price:float=None, download_link:str=None, version:int=None):
+        '''Update an application in one statement; returns the updated row, or None if it does not exist.'''
+        values = {}
         if description:
-            record.description = description
+            values['description'] = description
         if price:
-            record.price = price
+            values['price'] = price
         if download_link:
-            record.download_link = download_link
-        db.session.commit()
+            values['download_link'] = download_link
+        return cls.update_values(id, values, version=version)
+
+    @classmethod
+    def update_logo(cls, id:int, logo:str=None, version:int=None):
+        '''Replace the logo of an application in one statement; returns the updated row, or None if it does not exist.'''
+        return cls.update_values(id, {'logo': logo} if logo else {}, version=version)
 
     @classmethod
-    def update_logo(cls, id:int, logo:str=None) -> None:
-        record = cls.fetch_by_id(id)
-        if logo:
-            record.logo = logo
+    def update_values(cls, id:int, values:dict, version:int=None):
+        record = compare_and_set(cls, id, values, version=version)
+        if record is None:
+            # Raises if the record exists at another version
+            explain_unchanged(cls, id, version)
+            return None
         db.session.commit()
+        return record
 
     @classmethod
     def delete_by_id(cls, id:int) -> None:
         record = cls.query.filter_by(id=id)
+        InventoryModel.delete_by_application_id(id)
         record.delete()
         db.session.commit()
 
@@ -0,0 +1,52 @@
+from typing import Dict, List, Tuple
+
+from . import db
+
+LICENSE_STATUSES = ('available', 'on_credit', 'sold')
+
+class InventoryModel(db.Model):
+    '''Per-application license counts by status, kept in step with the licenses table
+    in the same transaction as every license write.'''
+    __tablename__ = 'license_inventory'
+    application_id = db.Column(db.Integer, db.ForeignKey('applications.id'), primary_key=True)
+    license_status = db.Column(db.String(25), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    @classmethod
+    def insert_application(cls, application_id:int) -> None:
+        '''Add the zeroed counters of a new application to the current transaction.'''
+        for license_status in LICENSE_STATUSES:
+            db.session.add(cls(application_id=application_id, license_status=license_status, count=0))
+
+    @classmethod
+    def adjust(cls, deltas:Dict[Tuple[int, str], int]) -> None:
+        '''Apply {(application_id, license_status): delta} in the current transaction without committing.'''
+        for (application_id, license_status), delta in deltas.items():
+            if not delta:
+                continue
+            updated = cls.query.filter_by(application_id=application_id, license_status=license_status) \
+                .update({cls.count: cls.count + delta}, synchronize_session=False)
+            if not updated:
+                db.session.add(cls(application_id=application_id, license_status=license_status, count=delta))
+                db.session.flush()
+
+    @classmethod
+    def fetch_counts(cls, application_ids:List[int]) -> Dict[int, Dict[str, int]]:
+        counts = {application_id: dict.fromkeys(LICENSE_STATUSES, 0) for application_id in application_ids}
+        if not counts:
+            return counts
+        rows = db.session.query(cls.application_id, cls.license_status, cls.count) \
+            .filter(cls.application_id.in_(counts.keys())) \
+            .all()
+        for application_id, license_status, count in rows:
+            counts[application_id][license_status] = count
+        return counts
+
+    @classmethod
+    def lock(cls, application_ids:List[int]) -> None:
+        '''Lock the counters of some applications until the current transaction ends.'''
+        cls.query.filter(cls.application_id.in_(application_ids)).with_for_update().all()
+
+    @classmethod
+    def delete_by_application_id(cls, application_id:int) -> None:
+        cls.query.filter_by(application_id=application_id).delete()
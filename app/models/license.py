@@ -1,50 +1,405 @@
+import hashlib
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from . import db, fetch_keyset_page, load_columns, compare_and_set, explain_unchanged, ConflictError
+from .inventory import InventoryModel, LICENSE_STATUSES
+from .search import BINARY_COLLATIONS, dialect_name, prefix_upper_bound
+
+# The statuses a license may be moved to from each status
+LICENSE_TRANSITIONS = {
+    'available': ('on_credit', 'sold'),
+    'on_credit': ('sold', 'available'),
+    'sold': (),
+}
+# A status change that raced with another write gives up after this many tries
+TRANSITION_ATTEMPTS = 3
+# Rows per multi-row INSERT; SQLite builds before 3.32 take at most 999 parameters a statement
+INSERT_CHUNK_SIZE = 1000
+SQLITE_INSERT_CHUNK_SIZE = 100
+
+
+def allowed_from_statuses(license_status:str) -> List[str]:
+    '''The statuses a license can be in to be moved to `license_status`.'''
+    return [status for status, targets in LICENSE_TRANSITIONS.items() if license_status in targets]
+
+
+class LicenseConflictError(ConflictError):
+    pass
+
+
+class LicenseKeyExistsError(LicenseConflictError):
+    pass
+
+
+def hash_license_key(license_key:str) -> str:
+    '''The SHA-256 (hex) of a license key, stored in license_key_hash for lookups by key.'''
+    return hashlib.sha256(license_key.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def unique_license_keys():
+    '''Roll back and raise LicenseKeyExistsError when a write breaks the unique license key indexes.'''
+    try:
+        yield
+    except IntegrityError as e:
+        db.session.rollback()
+        # Both ix_licenses_license_key and ix_licenses_license_key_hash name the column
+        if 'license_key' not in str(e.orig):
+            raise
+        raise LicenseKeyExistsError('This license key already exists.')
+
+
+def default_license_key_hash(context) -> str:
+    # Fills the hash on every insert, ORM or multi-row Core statement alike
+    return hash_license_key(context.get_current_parameters()['license_key'])
 
-from . import db
 
 class LicenseModel(db.Model):
     __tablename__ = 'licenses'
     id = db.Column(db.Integer, primary_key =True)
     license_key = db.Column(db.String(80), nullable=False)
+    # Never returned by the API (see Fieldset and LicenseSchema)
+    license_key_hash = db.Column(db.String(64), default=default_license_key_hash, nullable=True, info={'private': True})
     license_status = db.Column(db.String(25), default='available', nullable=False) # available, on_credit, sold
     application_id = db.Column(db.Integer, db.ForeignKey('applications.id'), nullable=False)
     application = db.relationship('ApplicationModel')
-    created = db.Column(db.DateTime, default=datetime.utcnow(), nullable=False)
-    updated = db.Column(db.DateTime, onupdate=datetime.utcnow(), nullable=True)
+    # Set on every write, so license validation can take in new and changed keys
+    created = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated = db.Column(db.DateTime, onupdate=datetime.utcnow, nullable=True)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_licenses_license_key', 'license_key', unique=True),
+        db.Index('ix_licenses_license_key_hash', 'license_key_hash', unique=True),
+        db.Index('ix_licenses_application_id_id', 'application_id', 'id'),
+        db.Index('ix_licenses_application_id_license_status_id', 'application_id', 'license_status', 'id'),
+        db.Index('ix_licenses_license_status_id', 'license_status', 'id'),
+        db.Index('ix_licenses_created', 'created'),
+        db.Index('ix_licenses_updated', 'updated'),
+        # Allocation picks the lowest available ids of one application
+        db.Index('ix_licenses_available', 'application_id', 'id',
+                 postgresql_where=db.text("license_status = 'available'"),
+                 sqlite_where=db.text("license_status = 'available'")),
+    )
 
     def insert_record(self) -> None:
-        db.session.add(self)
-        db.session.commit()
+        with unique_license_keys():
+            db.session.add(self)
+            InventoryModel.adjust({(self.application_id, self.license_status or 'available'): 1})
+            db.session.commit()
+
+    @classmethod
+    def insert_batch(cls, rows:List[dict]) -> None:
+        '''Insert many licenses with multi-row INSERT ... VALUES statements, one per chunk of rows, and commit them together.'''
+        with unique_license_keys():
+            if rows:
+                # Every row of a multi-row INSERT must name the same columns
+                rows = [{'license_status': 'available', **row} for row in rows]
+                chunk_size = SQLITE_INSERT_CHUNK_SIZE if dialect_name() == 'sqlite' else INSERT_CHUNK_SIZE
+                for start in range(0, len(rows), chunk_size):
+                    db.session.execute(cls.__table__.insert().values(rows[start:start + chunk_size]))
+                deltas = {}
+                for row in rows:
+                    key = (row['application_id'], row['license_status'])
+                    deltas[key] = deltas.get(key, 0) + 1
+                InventoryModel.adjust(deltas)
+            db.session.commit()
 
     @classmethod
     def fetch_all(cls) -> List['LicenseModel']:
         return cls.query.order_by(cls.id.asc()).all()
 
+    @classmethod
+    def filter_query(cls, query, license_status:str=None, application_id:int=None,
+                     created_from:datetime=None, created_to:datetime=None):
+        if license_status:
+            query = query.filter(cls.license_status == license_status)
+        if application_id:
+            query = query.filter(cls.application_id == application_id)
+        if created_from:
+            query = query.filter(cls.created >= created_from)
+        if created_to:
+            query = query.filter(cls.created < created_to)
+        return query
+
+    @classmethod
+    def fetch_page(cls, after:int=None, limit:int=100, **filters) -> Tuple[List['LicenseModel'], Optional[int]]:
+        query = cls.filter_query(cls.query, **filters)
+        return fetch_keyset_page(query, cls.id, after=after, limit=limit)
+
+    @classmethod
+    def fetch_page_rows(cls, after:int=None, limit:int=100, columns:List[str]=None, **filters) -> Tuple[list, Optional[int]]:
+        '''Like fetch_page, but as plain tuples of `columns` (all of them by default) instead of model instances.'''
+        table_columns = cls.__table__.columns
+        selected = table_columns if columns is None else [table_columns[name] for name in columns]
+        query = cls.filter_query(db.session.query(*selected), **filters)
+        return fetch_keyset_page(query, cls.id, after=after, limit=limit)
+
+    @classmethod
+    def stream_rows(cls, columns:List[str]=('id', 'license_key', 'license_status', 'application_id', 'created', 'updated'),
+                    batch_size:int=1000, **filters):
+        '''Iterate over plain tuples of `columns`, fetched through a server-side cursor batch_size rows at a time.'''
+        query = db.session.query(*[cls.__table__.columns[name] for name in columns])
+        return cls.filter_query(query, **filters).order_by(cls.id.asc()).yield_per(batch_size)
+
+    @classmethod
+    def search_keys_query(cls, license_key:str, exact:bool=False, after:str=None):
+        '''Column tuples of the licenses whose key starts with (or, if exact, is) `license_key`,
+        after the key `after`, in key order.'''
+        collation = BINARY_COLLATIONS.get(dialect_name())
+        key = cls.license_key.collate(collation) if collation else cls.license_key
+        query = db.session.query(*cls.__table__.columns)
+        if exact:
+            query = query.filter(cls.license_key == license_key)
+        else:
+            query = query.filter(key >= license_key, key < prefix_upper_bound(license_key))
+        if after is not None:
+            query = query.filter(key > after)
+        return query.order_by(key.asc())
+
+    @classmethod
+    def search_keys(cls, license_key:str, exact:bool=False, after:str=None, limit:int=20) -> Tuple[list, Optional[str]]:
+        '''A page of search_keys_query: returns (items, next_after), where next_after is the
+        last key of the page, or None on the last page.'''
+        items = cls.search_keys_query(license_key, exact=exact, after=after).limit(limit + 1).all()
+        if len(items) > limit:
+            items = items[:limit]
+            return items, items[-1].license_key
+        return items, None
+
+    @classmethod
+    def fetch_count(cls) -> int:
+        return db.session.query(func.count(cls.id)).scalar()
+
+    @classmethod
+    def fetch_by_key_hashes(cls, key_hashes:List[str]) -> list:
+        '''Column tuples (id, license_key, license_key_hash, license_status, application_id) of the licenses with these key hashes.'''
+        if not key_hashes:
+            return []
+        return db.session.query(cls.id, cls.license_key, cls.license_key_hash, cls.license_status, cls.application_id) \
+            .filter(cls.license_key_hash.in_(key_hashes)).all()
+
+    @classmethod
+    def stream_key_hashes(cls, after:int=None, batch_size:int=10000):
+        '''Iterate over (id, license_key_hash) of the licenses after id `after`, in id order.'''
+        query = db.session.query(cls.id, cls.license_key_hash)
+        if after is not None:
+            query = query.filter(cls.id > after)
+        return query.order_by(cls.id.asc()).yield_per(batch_size)
+
+    @classmethod
+    def stream_changed_key_hashes(cls, since:datetime, batch_size:int=10000):
+        '''Iterate over (id, license_key_hash) of the licenses created or updated at or after `since`.'''
+        return db.session.query(cls.id, cls.license_key_hash) \
+            .filter(db.or_(cls.created >= since, cls.updated >= since)).yield_per(batch_size)
+
     @classmethod
     def fetch_by_application_id(cls, application_id:int) -> List['LicenseModel']:
         return cls.query.filter_by(application_id=application_id).all()
 
     @classmethod
-    def fetch_by_id(cls, id:int) -> 'LicenseModel':
-        return cls.query.get(id)
+    def fetch_by_application_ids(cls, application_ids:List[int]) -> List['LicenseModel']:
+        if not application_ids:
+            return []
+        return cls.query.filter(cls.application_id.in_(application_ids)).order_by(cls.id.asc()).all()
 
     @classmethod
-    def update_status(cls, id:int, license_status:str=None) -> None:
-        record = cls.fetch_by_id(id)
-        if license_status:
-            record.license_status = license_status
-        db.session.commit()
+    def fetch_by_id(cls, id:int, columns:List[str]=None) -> 'LicenseModel':
+        return load_columns(cls.query, columns).get(id)
+
+    @classmethod
+    def fetch_existing_keys(cls, license_keys:List[str]) -> Set[str]:
+        if not license_keys:
+            return set()
+        rows = db.session.query(cls.license_key).filter(cls.license_key.in_(license_keys)).all()
+        return {license_key for license_key, in rows}
+
+    @classmethod
+    def fetch_status_counts(cls, application_ids:List[int]) -> Dict[int, Dict[str, int]]:
+        '''Count licenses per status for each application in one grouped query.'''
+        counts = {application_id: dict.fromkeys(LICENSE_STATUSES, 0) for application_id in application_ids}
+        if not counts:
+            return counts
+        rows = db.session.query(cls.application_id, cls.license_status, func.count(cls.id)) \
+            .filter(cls.application_id.in_(counts.keys())) \
+            .group_by(cls.application_id, cls.license_status) \
+            .all()
+        for application_id, license_status, count in rows:
+            counts[application_id][license_status] = count
+        return counts
+
+    @classmethod
+    def update_status(cls, id:int, license_status:str, version:int=None):
+        '''Move one license to `license_status` if LICENSE_TRANSITIONS allows it from its current status.
+
+        Each try is a single UPDATE guarded on one allowed current status, so concurrent
+        changes of the same license cannot both succeed or count twice in the inventory.
+        Returns the updated row, or None if the license does not exist. Raises
+        LicenseConflictError for a transition that is not allowed and
+        PreconditionFailedError if the license is not at `version`.
+        '''
+        allowed = allowed_from_statuses(license_status)
+        for _ in range(TRANSITION_ATTEMPTS):
+            for from_status in allowed:
+                record = compare_and_set(cls, id, {'license_status': license_status}, version=version,
+                                         conditions=[cls.license_status == from_status])
+                if record is not None:
+                    InventoryModel.adjust({(record.application_id, from_status): -1, (record.application_id, license_status): 1})
+                    db.session.commit()
+                    return record
+            record = explain_unchanged(cls, id, version)
+            if record is None:
+                return None
+            if record.license_status not in allowed:
+                raise LicenseConflictError(f'A license that is {record.license_status} cannot become {license_status}.')
+            # It moved into an allowed status while the guarded updates ran: try again
+        raise LicenseConflictError('The license was changed by another request, please try again.')
 
     @classmethod
-    def update_license(cls, id:int, license_key:str=None) -> None:
-        record = cls.fetch_by_id(id)
-        if license_key:
-            record.license_key = license_key
+    def allocate(cls, application_id:int, count:int=1, license_status:str='sold') -> List['LicenseModel']:
+        '''Claim the next `count` available licenses of an application in one transaction.
+
+        Returns the claimed licenses, or an empty list (with nothing changed) when
+        fewer than `count` licenses are available.
+        '''
+        candidates = cls.query.with_entities(cls.id) \
+            .filter_by(application_id=application_id, license_status='available') \
+            .order_by(cls.id.asc()) \
+            .limit(count)
+
+        if db.session.get_bind().dialect.name == 'postgresql':
+            # Rows locked by a concurrent allocation are skipped instead of waited on,
+            # so parallel sellers never block on, or claim, the same license.
+            claimed_ids = [id for id, in candidates.with_for_update(skip_locked=True).all()]
+            if claimed_ids:
+                cls.query.filter(cls.id.in_(claimed_ids)) \
+                    .update({cls.license_status: license_status, cls.version: cls.version + 1}, synchronize_session=False)
+        else:
+            # No SKIP LOCKED (e.g. SQLite in tests): guard every row on its status so
+            # a license claimed by another transaction in between is not claimed twice,
+            # and take fresh candidates in place of the ones lost that way. Rows claimed
+            # here are no longer available, so they are not selected again.
+            claimed_ids = []
+            while len(claimed_ids) < count:
+                ids = [id for id, in candidates.limit(count - len(claimed_ids)).all()]
+                if not ids:
+                    break
+                for id in ids:
+                    updated = cls.query.filter_by(id=id, license_status='available') \
+                        .update({cls.license_status: license_status, cls.version: cls.version + 1}, synchronize_session=False)
+                    if updated:
+                        claimed_ids.append(id)
+
+        if len(claimed_ids) < count:
+            db.session.rollback()
+            return []
+        InventoryModel.adjust({(application_id, 'available'): -count, (application_id, license_status): count})
         db.session.commit()
+        return cls.query.filter(cls.id.in_(claimed_ids)).order_by(cls.id.asc()).all()
+
+    @classmethod
+    def transition_status(cls, license_status:str, ids:List[int]=None, application_id:int=None,
+                          from_status:str=None, limit:int=1000) -> Tuple[List[int], List[dict], Set[int]]:
+        '''Move many licenses to `license_status` with one set-based UPDATE.
+
+        The licenses are either the given `ids` or up to `limit` licenses matching
+        `application_id` and `from_status`. Only licenses whose current status may
+        move to `license_status` are changed. Returns the changed ids, the rejected ids
+        with the reason and the applications whose licenses changed.
+        '''
+        allowed = allowed_from_statuses(license_status)
+        for _ in range(TRANSITION_ATTEMPTS):
+            query = db.session.query(cls.id, cls.application_id, cls.license_status)
+            if ids is not None:
+                rows = query.filter(cls.id.in_(ids)).with_for_update().all()
+            else:
+                query = cls.filter_query(query, license_status=from_status, application_id=application_id) \
+                    .filter(cls.license_status.in_(allowed)) \
+                    .order_by(cls.id.asc()) \
+                    .limit(limit)
+                # Parallel bulk changes over the same filter take different licenses
+                skip_locked = db.session.get_bind().dialect.name == 'postgresql'
+                rows = query.with_for_update(skip_locked=skip_locked).all()
+
+            current = {id: (license_application_id, status) for id, license_application_id, status in rows}
+            changed = sorted(id for id, (_, status) in current.items() if status in allowed)
+            rejected = []
+            for id in dict.fromkeys(ids or []):
+                if id not in current:
+                    rejected.append({'id': id, 'reason': 'This license does not exist.'})
+                elif current[id][1] not in allowed:
+                    rejected.append({'id': id, 'reason': f'A license that is {current[id][1]} cannot become {license_status}.'})
+
+            if not changed:
+                db.session.rollback()
+                return changed, rejected, set()
+
+            updated = cls.query.filter(cls.id.in_(changed), cls.license_status.in_(allowed)) \
+                .update({cls.license_status: license_status, cls.version: cls.version + 1}, synchronize_session=False)
+            if updated != len(changed):
+                # Without row locks (SQLite) a concurrent write got in between the read and
+                # the update, so the inventory deltas are unknown: start over.
+                db.session.rollback()
+                continue
+
+            deltas = {}
+            for id in changed:
+                license_application_id, status = current[id]
+                deltas[(license_application_id, status)] = deltas.get((license_application_id, status), 0) - 1
+                deltas[(license_application_id, license_status)] = deltas.get((license_application_id, license_status), 0) + 1
+            InventoryModel.adjust(deltas)
+            db.session.commit()
+            return changed, rejected, {current[id][0] for id in changed}
+        raise LicenseConflictError('The licenses were changed by another request, please try again.')
+
+    @classmethod
+    def update_license(cls, id:int, license_key:str=None, version:int=None):
+        '''Change the key of a license in one statement; returns the updated row, or None if it does not exist.'''
+        values = {'license_key': license_key, 'license_key_hash': hash_license_key(license_key)} if license_key else {}
+        with unique_license_keys():
+            record = compare_and_set(cls, id, values, version=version)
+            if record is None:
+                # Raises if the record exists at another version
+                explain_unchanged(cls, id, version)
+                return None
+            db.session.commit()
+        return record
 
     @classmethod
     def delete_by_id(cls, id:int) -> None:
         record = cls.query.filter_by(id=id)
+        license = record.with_for_update().first()
+        if license:
+            InventoryModel.adjust({(license.application_id, license.license_status): -1})
         record.delete()
         db.session.commit()
+
+    @classmethod
+    def reconcile_inventory(cls, application_ids:List[int], fix:bool=True) -> List[dict]:
+        '''Recount the licenses of some applications and report, and by default fix, drifted inventory counters.'''
+        # Lock the counters before counting so that license writes committing meanwhile
+        # apply their deltas after the correction instead of being overwritten by it.
+        InventoryModel.lock(application_ids)
+        stored = InventoryModel.fetch_counts(application_ids)
+        actual = cls.fetch_status_counts(application_ids)
+
+        drift = []
+        deltas = {}
+        for application_id in application_ids:
+            for license_status, count in actual[application_id].items():
+                stored_count = stored[application_id].get(license_status, 0)
+                if count != stored_count:
+                    drift.append({'application_id': application_id, 'license_status': license_status,
+                                  'stored': stored_count, 'actual': count})
+                    deltas[(application_id, license_status)] = count - stored_count
+        if fix:
+            InventoryModel.adjust(deltas)
+            db.session.commit()
+        else:
+            db.session.rollback()
+        return drift
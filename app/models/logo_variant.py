@@ -0,0 +1,34 @@
+from typing import Dict, List
+
+from . import db
+
+class LogoVariantModel(db.Model):
+    '''Resized and re-encoded copies of a stored logo, keyed by the logo file name.'''
+    __tablename__ = 'logo_variants'
+    logo = db.Column(db.String(80), primary_key=True)
+    variant = db.Column(db.String(20), primary_key=True) # thumb, card
+    image_format = db.Column(db.String(10), primary_key=True) # png, jpg, webp
+    file = db.Column(db.String(100), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def insert_variants(cls, logo:str, variants:List[dict]) -> None:
+        cls.query.filter_by(logo=logo).delete()
+        for variant in variants:
+            db.session.add(cls(logo=logo, **variant))
+        db.session.commit()
+
+    @classmethod
+    def fetch_by_logos(cls, logos:List[str]) -> Dict[str, Dict[str, Dict[str, str]]]:
+        '''{logo: {variant: {image_format: file}}} for the given logos, in one query.'''
+        variants = {}
+        if not logos:
+            return variants
+        for record in cls.query.filter(cls.logo.in_(set(logos))).all():
+            variants.setdefault(record.logo, {}).setdefault(record.variant, {})[record.image_format] = record.file
+        return variants
+
+    @classmethod
+    def has_variants(cls, logo:str) -> bool:
+        return db.session.query(cls.logo).filter_by(logo=logo).first() is not None
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import List
+
+from . import db
+
+class RevokedTokenModel(db.Model):
+    __tablename__ = 'revoked_tokens'
+    # A revocation must be enforced as soon as it is committed
+    read_from_primary = True
+
+    jti = db.Column(db.String(120), primary_key=True)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
+    revoked = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    @classmethod
+    def revoke(cls, jti:str, expires:datetime) -> None:
+        if not cls.query.get(jti):
+            db.session.add(cls(jti=jti, expires=expires))
+        cls.delete_expired()
+        db.session.commit()
+
+    @classmethod
+    def is_revoked(cls, jti:str) -> bool:
+        return db.session.query(cls.jti).filter(cls.jti == jti, cls.expires > datetime.utcnow()).first() is not None
+
+    @classmethod
+    def fetch_revoked_since(cls, since:datetime=None) -> List[str]:
+        query = db.session.query(cls.jti).filter(cls.expires > datetime.utcnow())
+        if since:
+            query = query.filter(cls.revoked >= since)
+        return [jti for jti, in query.all()]
+
+    @classmethod
+    def delete_expired(cls) -> None:
+        cls.query.filter(cls.expires <= datetime.utcnow()).delete(synchronize_session=False)
@@ -0,0 +1,94 @@
+"""
+routing.py
+
+Read replica routing and per-environment engine options for the db extension.
+
+When SQLALCHEMY_BINDS has a 'replica' database, the statements of GET and
+HEAD requests to the READ_REPLICA_NAMESPACES of the api blueprint read from
+it. Everything else uses the primary: other methods, CLI commands and
+background threads, locking reads (FOR UPDATE), every write, and every read
+that follows a write or a pin_to_primary() call in the same request, so a
+request always sees its own writes. Models with `read_from_primary = True`
+(revoked tokens) are always read from the primary.
+
+A GET request may see data as old as the replica's lag, and so may what the
+catalog cache stores from it until its entries expire.
+"""
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND = 'replica'
+DEFAULT_REPLICA_NAMESPACES = ('software', 'application', 'license', 'search')
+READ_METHODS = ('GET', 'HEAD')
+
+
+def pin_to_primary() -> None:
+    '''Send the rest of the current request's statements to the primary.'''
+    if has_request_context():
+        g.read_replica = False
+
+
+def reads_from_replica() -> bool:
+    return has_request_context() and g.get('read_replica', False)
+
+
+def is_write(clause) -> bool:
+    '''Whether a statement may change data or take row locks.'''
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        # Raw SQL is only sent to the replica when it is a plain SELECT
+        return not clause.text.lstrip().upper().startswith('SELECT')
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if reads_from_replica():
+            if self._flushing or is_write(clause):
+                pin_to_primary()
+            elif mapper is None or self._replica_readable(mapper):
+                return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    @staticmethod
+    def _replica_readable(mapper) -> bool:
+        if getattr(mapper.class_, 'read_from_primary', False):
+            return False
+        # Models bound to another database keep their own bind
+        return mapper.persist_selectable.info.get('bind_key') is None
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def init_app(self, app):
+        super().init_app(app)
+        namespaces = app.config.get('READ_REPLICA_NAMESPACES', DEFAULT_REPLICA_NAMESPACES)
+        self.replica_endpoints = tuple(f'api.{namespace}_' for namespace in namespaces)
+        if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            app.before_request_funcs.setdefault('api', []).append(self._route_request)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def _route_request(self) -> None:
+        g.read_replica = request.method in READ_METHODS and (request.endpoint or '').startswith(self.replica_endpoints)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        '''Pool sizing and statement timeout from the DATABASE_* settings of the environment.'''
+        config = app.config
+        if not sa_url.drivername.startswith('sqlite'):
+            # SQLite files are opened per checkout; pools only apply to server databases
+            options.update(
+                pool_size=config.get('DATABASE_POOL_SIZE', 5),
+                max_overflow=config.get('DATABASE_MAX_OVERFLOW', 10),
+                pool_timeout=config.get('DATABASE_POOL_TIMEOUT', 30),
+                pool_recycle=config.get('DATABASE_POOL_RECYCLE', 280),
+                pool_pre_ping=True,
+            )
+        statement_timeout = config.get('DATABASE_STATEMENT_TIMEOUT')
+        if statement_timeout and sa_url.drivername.startswith('postgresql'):
+            options.setdefault('connect_args', {})['options'] = f'-c statement_timeout={statement_timeout}'
+        return super().apply_driver_hacks(app, sa_url, options)
@@ -0,0 +1,63 @@
+"""
+search.py
+
+Shared pieces of the catalog and license key searches. Postgres matches
+software names through a pg_trgm index and application descriptions through a
+full-text index; SQLite goes through FTS5 tables kept in sync by triggers (see
+the search migration). License keys are matched by prefix on an index in
+binary order, so a page of keys is one index range scan whatever the size of
+the table.
+"""
+import re
+
+from sqlalchemy import literal_column, text
+
+from . import db
+
+# Text search configuration of the Postgres full-text index
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+# Collation of the license key index on each dialect; others compare in their default order
+BINARY_COLLATIONS = {'postgresql': 'C', 'sqlite': 'BINARY'}
+
+WORD = re.compile(r'\w+')
+
+
+def dialect_name() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def contains_pattern(query:str) -> str:
+    '''A LIKE pattern (escape character \\) matching values that contain `query`.'''
+    return '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def prefix_upper_bound(prefix:str) -> str:
+    '''The smallest string greater than every string starting with `prefix`, in binary order.'''
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def fts5_terms(query:str) -> str:
+    '''Each word of `query` as a quoted FTS5 prefix term, so input cannot use the query syntax.'''
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def fts5_search(model, search_table:str, query:str, offset:int, limit:int) -> list:
+    '''Rows of `model` whose entry in the FTS5 `search_table` matches `query`, best bm25 rank first.'''
+    terms = fts5_terms(query)
+    if not terms:
+        return []
+    table = model.__tablename__
+    columns = model.__table__.columns
+    statement = text(f"SELECT {', '.join(f'{table}.{column.name}' for column in columns)} "
+                     f'FROM {search_table} JOIN {table} ON {table}.id = {search_table}.rowid '
+                     f'WHERE {search_table} MATCH :terms ORDER BY {search_table}.rank, {table}.id LIMIT :limit OFFSET :offset')
+    # Typed columns, so values such as datetimes are converted as in any other query
+    statement = statement.columns(*columns)
+    return model.query.from_statement(statement).params(terms=terms, limit=limit, offset=offset).all()
+
+
+def search_page(items:list, offset:int, limit:int):
+    '''(items, next_offset) from up to limit + 1 ranked rows fetched at `offset`.'''
+    if len(items) > limit:
+        return items[:limit], offset + limit
+    return items, None
@@ -1,7 +1,10 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 
-from . import db
+from sqlalchemy import func
+
+from . import db, fetch_keyset_page, load_columns, compare_and_set, explain_unchanged
+from .search import dialect_name, contains_pattern, fts5_search, search_page
 
 class SoftwareModel(db.Model):
     __tablename__ = 'software'
@@ -10,6 +13,7 @@ class SoftwareModel(db.Model):
     logo = db.Column(db.String(80), nullable=False)
     created = db.Column(db.DateTime, default=datetime.utcnow(), nullable=False)
     updated = db.Column(db.DateTime, onupdate=datetime.utcnow(), nullable=True)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
 
     applications = db.relationship('ApplicationModel', lazy='dynamic')
 
@@ -22,26 +26,60 @@ class SoftwareModel(db.Model):
         return cls.query.order_by(cls.id.asc()).all()
 
     @classmethod
-    def fetch_by_id(cls, id:int) -> 'SoftwareModel':
-        return cls.query.get(id)
+    def fetch_page(cls, after:int=None, limit:int=100, columns:List[str]=None,
+                   created_from:datetime=None, created_to:datetime=None) -> Tuple[List['SoftwareModel'], Optional[int]]:
+        query = load_columns(cls.query, columns)
+        if created_from:
+            query = query.filter(cls.created >= created_from)
+        if created_to:
+            query = query.filter(cls.created < created_to)
+        return fetch_keyset_page(query, cls.id, after=after, limit=limit)
+
+    @classmethod
+    def search(cls, query:str, offset:int=0, limit:int=20) -> Tuple[List['SoftwareModel'], Optional[int]]:
+        '''Software whose name matches `query`, best match first; returns (items, next_offset).'''
+        dialect = dialect_name()
+        if dialect == 'sqlite':
+            items = fts5_search(cls, 'software_search', query, offset, limit + 1)
+        else:
+            matches = cls.query.filter(cls.name.ilike(contains_pattern(query), escape='\\'))
+            if dialect == 'postgresql':
+                # The trigram index serves the ILIKE; the closest names rank first
+                matches = matches.order_by(func.similarity(cls.name, query).desc())
+            items = matches.order_by(cls.id.asc()).offset(offset).limit(limit + 1).all()
+        return search_page(items, offset, limit)
+
+    @classmethod
+    def fetch_by_logo(cls, logo:str) -> List['SoftwareModel']:
+        return cls.query.filter_by(logo=logo).all()
+
+    @classmethod
+    def fetch_by_id(cls, id:int, columns:List[str]=None) -> 'SoftwareModel':
+        return load_columns(cls.query, columns).get(id)
 
     @classmethod
     def fetch_by_name(cls, name:str) -> 'SoftwareModel':
         return cls.query.filter_by(name=name).first()
 
     @classmethod
-    def update_name(cls, id:int, name:str=None, logo:str=None) -> None:
-        record = cls.fetch_by_id(id)
-        if name:
-            record.name = name
-        db.session.commit()       
+    def update_name(cls, id:int, name:str=None, version:int=None):
+        '''Rename a software in one statement; returns the updated row, or None if it does not exist.'''
+        return cls.update_values(id, {'name': name} if name else {}, version=version)
 
     @classmethod
-    def update_logo(cls, id:int, logo:str=None) -> None:
-        record = cls.fetch_by_id(id)
-        if logo:
-            record.logo = logo
-        db.session.commit()       
+    def update_logo(cls, id:int, logo:str=None, version:int=None):
+        '''Replace the logo of a software in one statement; returns the updated row, or None if it does not exist.'''
+        return cls.update_values(id, {'logo': logo} if logo else {}, version=version)
+
+    @classmethod
+    def update_values(cls, id:int, values:dict, version:int=None):
+        record = compare_and_set(cls, id, values, version=version)
+        if record is None:
+            # Raises if the record exists at another version
+            explain_unchanged(cls, id, version)
+            return None
+        db.session.commit()
+        return record
 
     @classmethod
     def delete_by_id(cls, id:int) -> None:
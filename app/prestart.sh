@@ -0,0 +1,9 @@
+#! /usr/bin/env bash
+
+# Run by the uwsgi-nginx-flask image before the server starts:
+# bring the database schema up to date. Workers never create or
+# reflect the schema themselves.
+cd /app
+FLASK_APP=main.py flask setup-schema
+# render the OpenAPI document once for this deploy (OPENAPI_DOCUMENT)
+FLASK_APP=main.py flask write-openapi
@@ -1,11 +1,13 @@
 from flask import Blueprint
-from flask_restx import Api
 from flask_jwt_extended import JWTManager
 
-from blacklist import BLACKLIST
+from blacklist import revocation_store
+from user_functions.openapi import CachedSpecsApi
 from .software import api as software
 from .application import api as application
 from .license import api as license
+from .logo import api as logo
+from .search import api as search
 
 jwt = JWTManager()
 
@@ -19,11 +21,13 @@ authorizations = {
 }
 
 blueprint = Blueprint('api', __name__, url_prefix='/api')
-api = Api(blueprint, doc='/documentation', title='License management API', version='0.1', description='An API to manage Antivirus Licenses', authorizations=authorizations, security='apikey')
+api = CachedSpecsApi(blueprint, doc='/documentation', title='License management API', version='0.1', description='An API to manage Antivirus Licenses', authorizations=authorizations, security='apikey')
 
 api.add_namespace(software)
 api.add_namespace(application)
 api.add_namespace(license)
+api.add_namespace(logo)
+api.add_namespace(search)
 
 @jwt.user_claims_loader
 # Remember identity is what we define when creating the access token
@@ -36,7 +40,7 @@ def add_claims_to_jwt(identity):
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
     # Here we blacklist particular JWTs that have been created in the past.
-    return (decrypted_token["jti"] in BLACKLIST)
+    return revocation_store.is_revoked(decrypted_token["jti"])
 
 # The following callbacks are used for customizing jwt response/error messages.
 # The original ones may not be in a very pretty format (opinionated)
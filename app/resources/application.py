@@ -1,22 +1,24 @@
-import os
-
-from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_claims, get_jwt_identity, jwt_optional
 
+from models import PreconditionFailedError
 from models.application import ApplicationModel
 from models.software import SoftwareModel
-from schemas.application import ApplicationSchema
+from schemas.application import (ApplicationSchema, application_serializer, application_count_serializer, application_context,
+                                 application_count_context, APPLICATION_RELATIONS, APPLICATION_COUNT_RELATIONS)
 from user_functions.record_user_log import record_user_log
 from user_functions.validate_logo import allowed_file
+from user_functions.logo_storage import logo_storage, LogoError
+from user_functions.logo_variants import logo_pipeline
+from user_functions.pagination import add_page_arguments, page_response
+from user_functions.fieldsets import Fieldset, FieldsetError, add_fieldset_arguments
+from user_functions.catalog_cache import catalog_cache, invalidate_application
+from user_functions.preconditions import if_match_version, etag
 
 api = Namespace('application', description='Manage Antivirus Applications')
 
-application_schema = ApplicationSchema()
-application_schemas = ApplicationSchema(many=True)
-
 upload_parser = api.parser()
 upload_parser.add_argument('logo', location='files', type=FileStorage, required=True, help='Application Logo') # location='headers'
 upload_parser.add_argument('description', location='form', type=str, required=True, help='Description')
@@ -28,6 +30,12 @@ upload_parser.add_argument('software_id', location='form', type=int, required=Tr
 logo_parser = api.parser()
 logo_parser.add_argument('logo', location='files', type=FileStorage, required=True, help='Application Logo') # location='headers'
 
+# Admins get the licenses themselves, everyone else their counts
+application_fieldset = Fieldset(ApplicationModel, relations=APPLICATION_RELATIONS)
+application_count_fieldset = Fieldset(ApplicationModel, relations=APPLICATION_COUNT_RELATIONS)
+page_parser = add_fieldset_arguments(add_page_arguments(api.parser()), application_count_fieldset)
+detail_parser = add_fieldset_arguments(api.parser(), application_count_fieldset)
+
 application_model = api.model('Application', {
     'description': fields.String(required=True, description='Description'),
     'download_link': fields.String(required=True, description='Download Link'),
@@ -39,23 +47,28 @@ class ApplicationList(Resource):
     @classmethod
     @jwt_optional
     @api.doc('Get all applications')
+    @api.expect(page_parser)
+    @catalog_cache.cached('application:list', unless=lambda: get_jwt_claims().get('is_admin'))
     def get(cls):
         '''Get All Applications'''
+        args = page_parser.parse_args()
+        claims = get_jwt_claims()
+        is_admin = bool(claims and claims['is_admin'])
         try:
-            claims = get_jwt_claims()
-            if claims:
-                if claims['is_admin']:
-                    applications = ApplicationModel.fetch_all()
-                    if applications:
-                        return application_schemas.dump(applications), 200
-                    return {'message': 'There are no antivirus applications yet.'}, 404
-            applications = ApplicationModel.fetch_all()
+            selection = (application_fieldset if is_admin else application_count_fieldset).select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
+        try:
+            applications, next_after = ApplicationModel.fetch_page(columns=selection.columns, **args)
+            if is_admin:
+                if applications:
+                    context = application_context(applications) if 'licenses' in selection.include else {}
+                    return page_response(application_serializer.dump(applications, context=context, only=selection.only), next_after), 200
+                return {'message': 'There are no antivirus applications yet.'}, 404
             if applications:
-                application_list = application_schemas.dump(applications)
-                for application in application_list:
-                    license_count = len(application['licenses'])
-                    application['licenses'] = license_count
-                return application_list, 200
+                context = application_count_context(applications, include=selection.include)
+                application_counts = application_count_serializer.dump(applications, context=context, only=selection.only)
+                return page_response(application_counts, next_after), 200
             return {'message': 'There are no antivirus applications yet.'}, 404
                 
         except Exception as e:
@@ -93,11 +106,15 @@ class ApplicationList(Resource):
                     return {'message':'No logo was found.'}, 400
                         
                 if image_file and allowed_file(image_file.filename):
-                    logo = secure_filename(image_file.filename)
-                    image_file.save(os.path.join( 'uploads', logo))
+                    try:
+                        logo = logo_storage.save(image_file)
+                    except LogoError as e:
+                        return {'message': str(e)}, 400
+                    logo_pipeline.submit(logo)
 
                     new_application = ApplicationModel(logo=logo,description=description, download_link=download_link, price=price, software_id=software_id)
                     new_application.insert_record()
+                    invalidate_application(new_application.id, software_id)
 
                     # Record this event in user's logs
                     log_method = 'post'
@@ -124,15 +141,20 @@ class ApplicationDetail(Resource):
     @classmethod
     @api.doc('Get single application')
     # include the count of application licenses
+    @api.expect(detail_parser)
+    @catalog_cache.cached('application:{id}')
     def get(cls, id:int):
         '''Get Single Application'''
+        args = detail_parser.parse_args()
         try:
-            application = ApplicationModel.fetch_by_id(id)
+            selection = application_count_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
+        try:
+            application = ApplicationModel.fetch_by_id(id, columns=selection.columns)
             if application:
-                app = application_schema.dump(application)
-                license_count = len(app['licenses'])
-                app['licenses'] = license_count
-                return app, 200
+                context = application_count_context([application], include=selection.include)
+                return application_count_serializer.dump([application], context=context, only=selection.only)[0], 200
             return {'message': 'This antivirus application does not exist.'}, 404
         except Exception as e:
             print('========================================')
@@ -159,9 +181,11 @@ class ApplicationDetail(Resource):
             # download_link = data['download_link']
             # price = data['price']
 
-            application = ApplicationModel.fetch_by_id(id)
+            application = ApplicationModel.update_application(
+                id=id, description=data.get('description'), download_link=data.get('download_link'), price=data.get('price'),
+                version=if_match_version())
             if application:
-                ApplicationModel.update_application(id=id, **data) # description=description, download_link=download_link, price=price)
+                invalidate_application(id, application.software_id)
 
                 # Record this event in user's logs
                 log_method = 'put'
@@ -169,8 +193,11 @@ class ApplicationDetail(Resource):
                 authorization = request.headers.get('Authorization')
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
-                return application_schema.dump(application), 200
+                application_schema = ApplicationSchema(context=application_context([application]))
+                return application_schema.dump(application), 200, etag(application.version)
             return {'message': 'This record does not exist.'}, 404
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -190,6 +217,7 @@ class ApplicationDetail(Resource):
             application = ApplicationModel.fetch_by_id(id)
             if application:
                 ApplicationModel.delete_by_id(id)
+                invalidate_application(id, application.software_id)
 
                 # Record this event in user's logs
                 log_method = 'delete'
@@ -222,28 +250,35 @@ class LogoDetail(Resource):
 
             args = logo_parser.parse_args()
             image_file = args.get('logo')  # This is FileStorage instance
+            version = if_match_version()
 
-            application = ApplicationModel.fetch_by_id(id)
-            if application:
-                if image_file.filename == '':
-                    return {'message':'No logo was found.'}, 400
-                    
-                if image_file and allowed_file(image_file.filename):
-                    logo = secure_filename(image_file.filename)
-                    image_file.save(os.path.join( 'uploads', logo))
+            if image_file.filename == '':
+                return {'message':'No logo was found.'}, 400
 
-                    ApplicationModel.update_logo(id=id, logo=logo)
+            if image_file and allowed_file(image_file.filename):
+                try:
+                    logo = logo_storage.save(image_file)
+                except LogoError as e:
+                    return {'message': str(e)}, 400
 
-                    # Record this event in user's logs
-                    log_method = 'put'
-                    log_description = f'Updated logo for application <{id}>'
-                    authorization = request.headers.get('Authorization')
-                    auth_token  = { "Authorization": authorization}
-                    record_user_log(auth_token, log_method, log_description)
-                    return application_schema.dump(application), 200
-                return {'message':'The logo you uploaded is not recognised.'}, 400
-            return {'message': 'This record does not exist!'}, 404
-        
+                application = ApplicationModel.update_logo(id=id, logo=logo, version=version)
+                if not application:
+                    return {'message': 'This record does not exist!'}, 404
+                logo_pipeline.submit(logo)
+                invalidate_application(id, application.software_id)
+
+                # Record this event in user's logs
+                log_method = 'put'
+                log_description = f'Updated logo for application <{id}>'
+                authorization = request.headers.get('Authorization')
+                auth_token  = { "Authorization": authorization}
+                record_user_log(auth_token, log_method, log_description)
+                application_schema = ApplicationSchema(context=application_context([application]))
+                return application_schema.dump(application), 200, etag(application.version)
+            return {'message':'The logo you uploaded is not recognised.'}, 400
+
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -255,16 +290,21 @@ class LogoDetail(Resource):
 class SoftwareApplicationList(Resource):
     @classmethod
     @api.doc('Get applications by software')
+    @api.expect(page_parser)
+    @catalog_cache.cached('application:software:{software_id}')
     def get(cls, software_id:int):
         '''Get Application by software'''
+        args = page_parser.parse_args()
+        try:
+            selection = application_count_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
         try:
-            applications = ApplicationModel.fetch_by_software_id(software_id)
+            applications, next_after = ApplicationModel.fetch_page(software_id=software_id, columns=selection.columns, **args)
             if applications:
-                application_list = application_schemas.dump(applications)
-                for application in application_list:
-                    license_count = len(application['licenses'])
-                    application['licenses'] = license_count
-                return application_list, 200   
+                context = application_count_context(applications, include=selection.include)
+                application_counts = application_count_serializer.dump(applications, context=context, only=selection.only)
+                return page_response(application_counts, next_after), 200
             return {'message': 'These records do not exist.'}, 404         
         except Exception as e:
             print('========================================')
@@ -1,17 +1,32 @@
 import requests
-from flask import request
+from flask import request, Response, stream_with_context
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_claims, get_jwt_identity
 
 from models.application import ApplicationModel
-from models.license import LicenseModel 
-from schemas.license import LicenseSchema
+from models import PreconditionFailedError
+from models.license import LicenseModel, LicenseConflictError, LICENSE_STATUSES
+from schemas.license import LicenseSchema, license_serializer, license_context, LICENSE_RELATIONS
 from user_functions.record_user_log import record_user_log
+from user_functions.pagination import add_page_arguments, page_response
+from user_functions.fieldsets import Fieldset, FieldsetError, add_fieldset_arguments
+from user_functions.license_import import LicenseImporter, read_csv_rows, read_ndjson_rows
+from user_functions.license_export import export_chunks, EXPORT_COLUMNS, EXPORT_MIMETYPES
+from user_functions.catalog_cache import invalidate_applications
+from user_functions.license_validation import license_validator
+from user_functions.license_signing import license_signer
+from user_functions.preconditions import if_match_version, etag
 
 api = Namespace('license', description='Manage Application Licenses')
 
-license_schema = LicenseSchema()
-license_schemas = LicenseSchema(many=True)
+MAX_ALLOCATION = 1000
+MAX_STATUS_CHANGE = 1000
+MAX_VALIDATION = 1000
+MAX_KEY_LENGTH = LicenseModel.license_key.property.columns[0].type.length
+# Clients fetch the signing keys when they meet an unknown key id, so a day is plenty
+SIGNING_KEYS_CACHE_CONTROL = 'public, max-age=86400'
+
+license_schema = LicenseSchema(exclude=('application',))
 
 license_model = api.model('License', {
     'application_id': fields.Integer(required=True, description='Application ID'),
@@ -21,6 +36,50 @@ update_license_model = api.model('LicenseKey', {
     'license_key': fields.String(required=True, description='License Key')
 })
 
+allocate_license_model = api.model('AllocateLicenses', {
+    'count': fields.Integer(required=False, default=1, min=1, max=MAX_ALLOCATION, description='Number of licenses to claim'),
+    'license_status': fields.String(required=False, default='sold', enum=['sold', 'on_credit'], description='Status to give the claimed licenses')
+})
+
+license_status_change_model = api.model('LicenseStatusChange', {
+    'license_status': fields.String(required=True, enum=list(LICENSE_STATUSES), description='Status to move the licenses to'),
+    'ids': fields.List(fields.Integer, required=False, description=f'License IDs to change (at most {MAX_STATUS_CHANGE}), or use the filter fields instead'),
+    'application_id': fields.Integer(required=False, description='Filter: licenses of this application'),
+    'from_status': fields.String(required=False, enum=list(LICENSE_STATUSES), description='Filter: licenses currently in this status'),
+    'limit': fields.Integer(required=False, default=MAX_STATUS_CHANGE, min=1, max=MAX_STATUS_CHANGE, description='Filter: number of licenses to change at most')
+})
+
+validate_license_model = api.model('LicenseValidation', {
+    'license_key': fields.String(required=False, description='License key to check'),
+    'license_keys': fields.List(fields.String, required=False, description=f'License keys to check at once (at most {MAX_VALIDATION}), instead of license_key')
+})
+
+license_fieldset = Fieldset(LicenseModel, relations=LICENSE_RELATIONS, default_include=())
+# The single license also shows its application's price and an ETag of its version
+license_detail_fieldset = Fieldset(LicenseModel, relations=LICENSE_RELATIONS, default_include=(), extra=('_links', 'price'),
+                                   required=('id', 'version', 'application_id'))
+export_fieldset = Fieldset(LicenseModel, extra=(), required=())
+
+application_license_page_parser = add_fieldset_arguments(add_page_arguments(api.parser()), license_fieldset)
+application_license_page_parser.add_argument('license_status', location='args', type=str, choices=LICENSE_STATUSES, help='License Status')
+
+license_page_parser = application_license_page_parser.copy()
+license_page_parser.add_argument('application_id', location='args', type=int, help='Application ID')
+
+export_parser = add_page_arguments(api.parser())
+export_parser.remove_argument('after')
+export_parser.remove_argument('limit')
+export_parser.add_argument('format', location='args', type=str, choices=tuple(EXPORT_MIMETYPES), default='ndjson', help='Export format')
+export_parser.add_argument('license_status', location='args', type=str, choices=LICENSE_STATUSES, help='License Status')
+export_parser.add_argument('application_id', location='args', type=int, help='Application ID')
+add_fieldset_arguments(export_parser, export_fieldset)
+
+detail_parser = add_fieldset_arguments(api.parser(), license_detail_fieldset)
+
+import_parser = api.parser()
+import_parser.add_argument('format', location='args', type=str, choices=('csv', 'ndjson'), help='Body format, defaults to the Content-Type')
+import_parser.add_argument('application_id', location='args', type=int, help='Application ID for rows that do not name one')
+
 # ''
 # get all licenses - Admin
 # post new license - Admin
@@ -28,15 +87,21 @@ update_license_model = api.model('LicenseKey', {
 class LicenseList(Resource):
     @classmethod
     @api.doc('Get all licenses')
+    @api.expect(license_page_parser)
     @jwt_required
     def get(cls):
         '''Get All Licenses'''
+        args = license_page_parser.parse_args()
+        try:
+            selection = license_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
         try:
             claims = get_jwt_claims()
             if not claims['is_admin']:
                 return {'message': 'You are not authorised to use this resource'}, 403
 
-            licenses = LicenseModel.fetch_all()
+            licenses, next_after = LicenseModel.fetch_page_rows(columns=selection.columns, **args)
             if licenses:
                 # Record this event in user's logs
                 log_method = 'get'
@@ -44,7 +109,8 @@ class LicenseList(Resource):
                 authorization = request.headers.get('Authorization')
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
-                return license_schemas.dump(licenses), 200
+                context = license_context(licenses, include=selection.include)
+                return page_response(license_serializer.dump(licenses, context=context, only=selection.only), next_after), 200
             return {'message': 'There are no licenses yet.'}, 404            
         except Exception as e:
             print('========================================')
@@ -77,6 +143,8 @@ class LicenseList(Resource):
             if application:
                 new_license = LicenseModel(application_id=application_id, license_key=license_key)
                 new_license.insert_record()
+                invalidate_applications([application_id])
+                license_validator.add([license_key])
 
                 # Record this event in user's logs
                 log_method = 'post'
@@ -87,6 +155,8 @@ class LicenseList(Resource):
 
                 return {'message': 'Successfully added license'}, 201
             return {'message': 'The specified application does not exist.'}, 400
+        except LicenseConflictError as e:
+            return {'message': str(e)}, 409
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -94,6 +164,93 @@ class LicenseList(Resource):
             return{'message':'Could not fetch licenses.'}, 500
         
 
+# '/import'
+# bulk import licenses from a CSV or NDJSON body - Admin
+@api.route('/import')
+class LicenseImport(Resource):
+    @classmethod
+    @api.doc('Import licenses', description='Stream a CSV (license_key,application_id header) or NDJSON body of licenses.')
+    @api.expect(import_parser)
+    @jwt_required
+    def post(cls):
+        '''Import licenses'''
+        claims = get_jwt_claims()
+        if not claims['is_admin']:
+            return {'message': 'You are not authorised to use this resource'}, 403
+
+        args = import_parser.parse_args()
+        body_format = args['format']
+        if not body_format:
+            body_format = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+
+        try:
+            # Read the body line by line straight off the socket instead of loading it
+            lines = (line.decode('utf-8-sig') for line in request.stream)
+            rows = read_csv_rows(lines) if body_format == 'csv' else read_ndjson_rows(lines)
+            importer = LicenseImporter(default_application_id=args['application_id'])
+            report = importer.run(rows)
+            invalidate_applications(importer.application_ids)
+            license_validator.expire()
+
+            # Record this event in user's logs
+            log_method = 'post'
+            log_description = f"Imported {report['inserted']} licenses"
+            authorization = request.headers.get('Authorization')
+            auth_token  = {"Authorization": authorization}
+            record_user_log(auth_token, log_method, log_description)
+
+            return report, 201 if report['inserted'] else 200
+        except UnicodeDecodeError:
+            return {'message': 'The uploaded file is not UTF-8 text.'}, 400
+        except LicenseConflictError:
+            # Earlier batches are stored; importing the file again skips their keys as duplicates
+            return {'message': 'Other writers kept storing keys of this file during the import, import it again.'}, 409
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not import licenses.'}, 500
+
+
+# '/export'
+# stream all licenses as NDJSON or CSV - Admin
+@api.route('/export')
+class LicenseExport(Resource):
+    @classmethod
+    @api.doc('Export licenses')
+    @api.expect(export_parser)
+    @jwt_required
+    def get(cls):
+        '''Export licenses'''
+        claims = get_jwt_claims()
+        if not claims['is_admin']:
+            return {'message': 'You are not authorised to use this resource'}, 403
+
+        args = export_parser.parse_args()
+        export_format = args.pop('format')
+        try:
+            columns = export_fieldset.select(args).columns or EXPORT_COLUMNS
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
+        try:
+            rows = LicenseModel.stream_rows(columns=columns, **args)
+
+            # Record this event in user's logs
+            log_method = 'get'
+            log_description = 'Exported licenses'
+            authorization = request.headers.get('Authorization')
+            auth_token  = {"Authorization": authorization}
+            record_user_log(auth_token, log_method, log_description)
+
+            headers = {'Content-Disposition': f'attachment; filename=licenses.{export_format}'}
+            return Response(stream_with_context(export_chunks(rows, export_format, columns=columns)), mimetype=EXPORT_MIMETYPES[export_format], headers=headers)
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not export licenses.'}, 500
+
+
 # '<int:id>'
 # get single license - jwt_required(if sales.user_id = authorised_user['id']) or claims = Admin
 # delete - claims- Admin
@@ -102,11 +259,17 @@ class LicenseList(Resource):
 class LicenseDetail(Resource): # enable user who has bought the license to get
     @classmethod
     @api.doc('Get single license key')
+    @api.expect(detail_parser)
     @jwt_required
     def get(cls, id:int):
         '''Get single license key'''
         claims = get_jwt_claims()
         authorised_user = get_jwt_identity()
+        args = detail_parser.parse_args()
+        try:
+            selection = license_detail_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
         try:
 
             # Check if user is authorised to use this route
@@ -124,18 +287,20 @@ class LicenseDetail(Resource): # enable user who has bought the license to get
 
             # return {'message': 'You are not authorised to use this resource.'}, 403
 
-            license_key = LicenseModel.fetch_by_id(id)
+            license_key = LicenseModel.fetch_by_id(id, columns=selection.columns)
             if license_key:
-                license_item = license_schema.dump(license_key)
+                context = license_context([license_key], include=selection.include)
+                license_item = license_serializer.dump([license_key], context=context, only=selection.only)[0]
 
-                price = license_key.application.price
-                license_item['price'] = price
+                if 'price' in selection.only:
+                    price = ApplicationModel.fetch_by_id(license_key.application_id, columns=['price']).price
+                    license_item['price'] = price
 
                 # Record this event in user's logs
                 log_method = 'get'
                 log_description = f'Fetched license <{id}>'
                 record_user_log(auth_token, log_method, log_description)
-                return license_item, 200
+                return license_item, 200, etag(license_key.version)
             return {'message':'This license does not exist.'}, 404
         except Exception as e:
             print('========================================')
@@ -163,9 +328,10 @@ class LicenseDetail(Resource): # enable user who has bought the license to get
             if license_key == '':
                 return {'message': 'You have not specified any key.'}, 400
 
-            license_key = LicenseModel.fetch_by_id(id)
-            if license_key:
-                LicenseModel.update_license(id, license_key=license_key)
+            license = LicenseModel.update_license(id, license_key=license_key, version=if_match_version())
+            if license:
+                license_validator.invalidate([id])
+                license_validator.add([license_key])
 
                 # Record this event in user's logs
                 log_method = 'put'
@@ -174,8 +340,12 @@ class LicenseDetail(Resource): # enable user who has bought the license to get
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
 
-                return license_schema.dump(license_key), 200
+                return license_schema.dump(license), 200, etag(license.version)
             return {'message': 'This license does not exist.'}, 404
+        except LicenseConflictError as e:
+            return {'message': str(e)}, 409
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -195,6 +365,8 @@ class LicenseDetail(Resource): # enable user who has bought the license to get
             license_key = LicenseModel.fetch_by_id(id)
             if license_key:
                 LicenseModel.delete_by_id(id)
+                invalidate_applications([license_key.application_id])
+                license_validator.invalidate([id])
 
                 # Record this event in user's logs
                 log_method = 'delete'
@@ -218,6 +390,7 @@ class LicenseDetail(Resource): # enable user who has bought the license to get
 class ApplicationLicenses(Resource):
     @classmethod
     @api.doc('Get licenses by application')
+    @api.expect(application_license_page_parser)
     @jwt_required
     def get(cls, application_id:int):
         '''Get licenses by application'''
@@ -225,8 +398,13 @@ class ApplicationLicenses(Resource):
         if not claims['is_admin']:
             return {'message': 'You are not authorised to use this resource.'}, 403
 
+        args = application_license_page_parser.parse_args()
         try:
-            licenses = LicenseModel.fetch_by_application_id(application_id)
+            selection = license_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
+        try:
+            licenses, next_after = LicenseModel.fetch_page_rows(application_id=application_id, columns=selection.columns, **args)
             if licenses:
                 # Record this event in user's logs
                 log_method = 'get'
@@ -235,7 +413,8 @@ class ApplicationLicenses(Resource):
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
 
-                return license_schemas.dump(licenses), 200
+                context = license_context(licenses, include=selection.include)
+                return page_response(license_serializer.dump(licenses, context=context, only=selection.only), next_after), 200
             return {'message':'There are no licenses under this application.'}, 404
         except Exception as e:
             print('========================================')
@@ -259,10 +438,11 @@ class CreditLicense(Resource):
             if not claims['is_admin']:
                 return {'message': 'You are not authorised to use this resource'}, 403
 
-            license_key = LicenseModel.fetch_by_id(id)
+            license_status = 'on_credit'
+            license_key = LicenseModel.update_status(id, license_status, version=if_match_version())
             if license_key:
-                license_status = 'on_credit'
-                LicenseModel.update_status(id, license_status=license_status)
+                invalidate_applications([license_key.application_id])
+                license_validator.invalidate([id])
 
                 # Record this event in user's logs
                 log_method = 'put'
@@ -271,8 +451,12 @@ class CreditLicense(Resource):
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
 
-                return license_schema.dump(license_key), 200
-            return {'message': 'This record does not exist.'}, 404           
+                return license_schema.dump(license_key), 200, etag(license_key.version)
+            return {'message': 'This record does not exist.'}, 404
+        except LicenseConflictError as e:
+            return {'message': str(e)}, 409
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -291,10 +475,11 @@ class SellLicense(Resource):
         '''Update status to sold'''
         try:
 
-            license_key = LicenseModel.fetch_by_id(id)
+            license_status = 'sold'
+            license_key = LicenseModel.update_status(id, license_status, version=if_match_version())
             if license_key:
-                license_status = 'sold'
-                LicenseModel.update_status(id, license_status=license_status)
+                invalidate_applications([license_key.application_id])
+                license_validator.invalidate([id])
 
                 # Record this event in user's logs
                 log_method = 'put'
@@ -303,8 +488,16 @@ class SellLicense(Resource):
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
 
-                return license_schema.dump(license_key), 200
-            return {'message': 'This record does not exist.'}, 404           
+                license = license_schema.dump(license_key)
+                license_token = license_signer.issue(license_key)
+                if license_token:
+                    license['license_token'] = license_token
+                return license, 200, etag(license_key.version)
+            return {'message': 'This record does not exist.'}, 404
+        except LicenseConflictError as e:
+            return {'message': str(e)}, 409
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -326,10 +519,11 @@ class AvailLicense(Resource):
             if not claims['is_admin']:
                 return {'message': 'You are not authorised to use this resource'}, 403
 
-            license_key = LicenseModel.fetch_by_id(id)
+            license_status = 'available'
+            license_key = LicenseModel.update_status(id, license_status, version=if_match_version())
             if license_key:
-                license_status = 'available'
-                LicenseModel.update_status(id, license_status=license_status)
+                invalidate_applications([license_key.application_id])
+                license_validator.invalidate([id])
                 
                 # Record this event in user's logs
                 log_method = 'put'
@@ -338,10 +532,178 @@ class AvailLicense(Resource):
                 auth_token  = {"Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
 
-                return license_schema.dump(license_key), 200
-            return {'message': 'This record does not exist.'}, 404            
+                return license_schema.dump(license_key), 200, etag(license_key.version)
+            return {'message': 'This record does not exist.'}, 404
+        except LicenseConflictError as e:
+            return {'message': str(e)}, 409
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
             print('========================================')
-            return{'message':'Could not update license status.'}, 500
\ No newline at end of file
+            return{'message':'Could not update license status.'}, 500
+
+# '/status'
+# move many licenses to a status at once - claims - Admin, or jwt_required to sell licenses by id
+@api.route('/status')
+class LicenseStatusChange(Resource):
+    @classmethod
+    @api.doc('Change the status of many licenses', description='Give either ids or a filter (application_id and/or from_status). Licenses whose current status cannot move to the new one are left alone.')
+    @api.expect(license_status_change_model)
+    @jwt_required
+    def put(cls):
+        '''Change the status of many licenses'''
+        try:
+            data = api.payload or {}
+            license_status = data.get('license_status')
+            ids = data.get('ids')
+            application_id = data.get('application_id')
+            from_status = data.get('from_status')
+            limit = data.get('limit', MAX_STATUS_CHANGE)
+
+            if license_status not in LICENSE_STATUSES:
+                return {'message': f"The license status must be one of {', '.join(LICENSE_STATUSES)}."}, 400
+            if ids is not None:
+                if application_id or from_status:
+                    return {'message': 'Give either license ids or a filter, not both.'}, 400
+                if not isinstance(ids, list) or not ids or not all(isinstance(id, int) for id in ids):
+                    return {'message': 'The license ids must be a non-empty list of integers.'}, 400
+                if len(ids) > MAX_STATUS_CHANGE:
+                    return {'message': f'You can change at most {MAX_STATUS_CHANGE} licenses at once.'}, 400
+            else:
+                if not application_id and not from_status:
+                    return {'message': 'Give either license ids or a filter.'}, 400
+                if from_status and from_status not in LICENSE_STATUSES:
+                    return {'message': f"The filter status must be one of {', '.join(LICENSE_STATUSES)}."}, 400
+                if not isinstance(limit, int) or not 1 <= limit <= MAX_STATUS_CHANGE:
+                    return {'message': f'You can change between 1 and {MAX_STATUS_CHANGE} licenses at once.'}, 400
+
+            claims = get_jwt_claims()
+            if not claims['is_admin'] and (license_status != 'sold' or ids is None):
+                return {'message': 'You are not authorised to use this resource'}, 403
+
+            changed, rejected, application_ids = LicenseModel.transition_status(
+                license_status, ids=ids, application_id=application_id, from_status=from_status, limit=limit)
+            if changed:
+                invalidate_applications(application_ids)
+                license_validator.invalidate(changed)
+
+                # Record this event in user's logs
+                log_method = 'put'
+                log_description = f'Updated {len(changed)} license(s) to {license_status}'
+                authorization = request.headers.get('Authorization')
+                auth_token  = {"Authorization": authorization}
+                record_user_log(auth_token, log_method, log_description)
+
+            return {'license_status': license_status, 'changed': changed, 'rejected': rejected}, 200
+        except LicenseConflictError as e:
+            return {'message': str(e)}, 409
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not update license status.'}, 500
+
+# '/application/<int:application_id>/allocate'
+# claim the next available licenses - jwt_required, claims - Admin to put on credit
+@api.route('/application/<int:application_id>/allocate')
+@api.param('application_id', 'The application identifier')
+class AllocateLicenses(Resource):
+    @classmethod
+    @api.doc('Allocate available licenses')
+    @api.expect(allocate_license_model)
+    @jwt_required
+    def post(cls, application_id:int):
+        '''Allocate available licenses'''
+        try:
+            data = api.payload or {}
+            count = data.get('count', 1)
+            license_status = data.get('license_status', 'sold')
+
+            if not isinstance(count, int) or not 1 <= count <= MAX_ALLOCATION:
+                return {'message': f'You can allocate between 1 and {MAX_ALLOCATION} licenses.'}, 400
+            if license_status not in ('sold', 'on_credit'):
+                return {'message': 'Licenses can only be allocated as sold or on credit.'}, 400
+
+            claims = get_jwt_claims()
+            if license_status == 'on_credit' and not claims['is_admin']:
+                return {'message': 'You are not authorised to use this resource'}, 403
+
+            application = ApplicationModel.fetch_by_id(id=application_id)
+            if not application:
+                return {'message': 'The specified application does not exist.'}, 404
+
+            licenses = LicenseModel.allocate(application_id, count=count, license_status=license_status)
+            if licenses:
+                invalidate_applications([application_id])
+                license_validator.invalidate([license.id for license in licenses])
+                # Record this event in user's logs
+                log_method = 'post'
+                log_description = f'Allocated {count} license(s) of application <{application_id}> as {license_status}'
+                authorization = request.headers.get('Authorization')
+                auth_token  = {"Authorization": authorization}
+                record_user_log(auth_token, log_method, log_description)
+
+                allocated = license_serializer.dump(licenses)
+                for license, row in zip(allocated, licenses):
+                    license_token = license_signer.issue(row)
+                    if license_token:
+                        license['license_token'] = license_token
+                return allocated, 200
+            return {'message': 'There are not enough available licenses for this application.'}, 409
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not allocate licenses.'}, 500
+
+# '/validate'
+# check license keys at activation time - jwt_required
+@api.route('/validate')
+class ValidateLicenses(Resource):
+    @classmethod
+    @api.doc('Validate license keys', description=f'Give license_key to check one key, or license_keys to check up to {MAX_VALIDATION} at once. Each answer says whether the key exists and, if it does, its application and status.')
+    @api.expect(validate_license_model)
+    @jwt_required
+    def post(cls):
+        '''Validate license keys'''
+        data = api.payload or {}
+        license_key = data.get('license_key')
+        license_keys = data.get('license_keys')
+        if (license_key is None) == (license_keys is None):
+            return {'message': 'Give either license_key or license_keys.'}, 400
+        keys = [license_key] if license_key is not None else license_keys
+        if not isinstance(keys, list) or not keys or len(keys) > MAX_VALIDATION:
+            return {'message': f'You can validate between 1 and {MAX_VALIDATION} license keys at once.'}, 400
+        if not all(isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH for key in keys):
+            return {'message': f'License keys must be strings of 1 to {MAX_KEY_LENGTH} characters.'}, 400
+
+        try:
+            results = license_validator.validate(keys)
+
+            # Record this event in user's logs
+            log_method = 'post'
+            log_description = f'Validated {len(keys)} license key(s)'
+            authorization = request.headers.get('Authorization')
+            auth_token  = {"Authorization": authorization}
+            record_user_log(auth_token, log_method, log_description)
+
+            if license_key is not None:
+                return results[0], 200
+            return {'results': results}, 200
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not validate license keys.'}, 500
+
+# '/keys'
+# public keys that sign license tokens, as a JWK set - public
+@api.route('/keys')
+class LicenseSigningKeys(Resource):
+    @classmethod
+    @api.doc('License token signing keys', description='The Ed25519 public keys that sign the license_token of sold licenses, by key id (kid). Verify tokens offline with any JOSE library that supports EdDSA, or with user_functions/license_tokens.py.')
+    def get(cls):
+        '''License token signing keys'''
+        return license_signer.jwks(), 200, {'Cache-Control': SIGNING_KEYS_CACHE_CONTROL}
@@ -0,0 +1,51 @@
+import os
+import mimetypes
+
+from flask import request, Response, send_from_directory
+from flask_restx import Namespace, Resource
+from werkzeug.utils import secure_filename
+
+from user_functions.logo_storage import logo_storage
+
+mimetypes.add_type('image/webp', '.webp')
+
+api = Namespace('logo', description='Serve software and application logos')
+
+# Content-addressed logos never change, so clients and proxies may keep them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+LEGACY_CACHE_CONTROL = 'public, max-age=3600'
+
+
+@api.route('/<string:name>')
+@api.param('name', 'The logo file name')
+class Logo(Resource):
+    @classmethod
+    @api.doc('Get logo')
+    def get(cls, name:str):
+        '''Get logo'''
+        name = secure_filename(name)
+        if not name or not os.path.isfile(logo_storage.path(name)):
+            return {'message': 'This logo does not exist.'}, 404
+
+        if logo_storage.is_stored_name(name):
+            etag = name.split('.', 1)[0]
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+                return response
+
+            if logo_storage.accel_redirect:
+                # Let nginx send the file itself; only these headers come from Python
+                response = Response(mimetype=mimetypes.guess_type(name)[0])
+                response.headers['X-Accel-Redirect'] = logo_storage.accel_redirect + name
+            else:
+                response = send_from_directory(os.path.abspath(logo_storage.folder), name, add_etags=False, conditional=True, cache_timeout=31536000)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response
+
+        # Logos uploaded before content addressing keep their original, mutable names
+        response = send_from_directory(os.path.abspath(logo_storage.folder), name, conditional=True, cache_timeout=3600)
+        response.headers['Cache-Control'] = LEGACY_CACHE_CONTROL
+        return response
@@ -0,0 +1,153 @@
+from flask import request
+from flask_restx import Namespace, Resource, inputs
+from flask_jwt_extended import jwt_required, get_jwt_claims
+
+from models.software import SoftwareModel
+from models.application import ApplicationModel
+from models.license import LicenseModel
+from schemas.software import software_count_serializer, software_count_context, SOFTWARE_COUNT_RELATIONS
+from schemas.application import application_count_serializer, application_count_context, APPLICATION_COUNT_RELATIONS
+from schemas.license import license_serializer, license_context, LICENSE_RELATIONS
+from user_functions.record_user_log import record_user_log
+from user_functions.pagination import page_response
+from user_functions.fieldsets import Fieldset, FieldsetError, add_fieldset_arguments
+
+api = Namespace('search', description='Search software, applications and license keys')
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Ranked results are not paged past this many
+MAX_SEARCH_OFFSET = 1000
+MAX_QUERY_LENGTH = 100
+
+# Search results nest no relations unless they are asked for
+software_fieldset = Fieldset(SoftwareModel, relations=SOFTWARE_COUNT_RELATIONS, default_include=())
+application_fieldset = Fieldset(ApplicationModel, relations=APPLICATION_COUNT_RELATIONS, default_include=())
+license_fieldset = Fieldset(LicenseModel, relations=LICENSE_RELATIONS, default_include=())
+
+
+def add_search_arguments(parser):
+    parser.add_argument('q', location='args', type=str, required=True, help='Search text')
+    parser.add_argument('after', location='args', type=str, help="Cursor of the next page, from the 'next' link")
+    parser.add_argument('limit', location='args', type=inputs.int_range(1, MAX_SEARCH_LIMIT), default=DEFAULT_SEARCH_LIMIT, help=f'Page size (max {MAX_SEARCH_LIMIT})')
+    return parser
+
+
+software_search_parser = add_fieldset_arguments(add_search_arguments(api.parser()), software_fieldset)
+application_search_parser = add_fieldset_arguments(add_search_arguments(api.parser()), application_fieldset)
+license_search_parser = add_fieldset_arguments(add_search_arguments(api.parser()), license_fieldset)
+license_search_parser.add_argument('match', location='args', type=str, choices=('prefix', 'exact'), default='prefix', help='Match license keys by prefix or exactly')
+
+
+def search_text(args) -> str:
+    text = args['q'].strip()
+    if not text or len(text) > MAX_QUERY_LENGTH:
+        raise ValueError(f'The search text must have between 1 and {MAX_QUERY_LENGTH} characters.')
+    return text
+
+
+def search_offset(args) -> int:
+    '''The offset of a ranked results page, from its cursor.'''
+    try:
+        offset = int(args['after'] or 0)
+    except ValueError:
+        raise ValueError('Invalid cursor.')
+    if not 0 <= offset <= MAX_SEARCH_OFFSET:
+        raise ValueError('Invalid cursor.')
+    return offset
+
+
+def next_offset(offset:int):
+    return offset if offset is not None and offset < MAX_SEARCH_OFFSET else None
+
+
+@api.route('/software')
+class SoftwareSearch(Resource):
+    @classmethod
+    @api.doc('Search software by name')
+    @api.expect(software_search_parser)
+    def get(cls):
+        '''Search software by name, best match first'''
+        args = software_search_parser.parse_args()
+        try:
+            selection = software_fieldset.select(args)
+            text, offset = search_text(args), search_offset(args)
+        except (FieldsetError, ValueError) as e:
+            return {'message': str(e)}, 400
+        try:
+            software, next_after = SoftwareModel.search(text, offset=offset, limit=args['limit'])
+            if software:
+                context = software_count_context(software, include=selection.include)
+                items = software_count_serializer.dump(software, context=context, only=selection.only)
+                return page_response(items, next_offset(next_after)), 200
+            return {'message': 'No software matches this search.'}, 404
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not search software.'}, 500
+
+
+@api.route('/application')
+class ApplicationSearch(Resource):
+    @classmethod
+    @api.doc('Search applications by description')
+    @api.expect(application_search_parser)
+    def get(cls):
+        '''Search applications by description, best match first'''
+        args = application_search_parser.parse_args()
+        try:
+            selection = application_fieldset.select(args)
+            text, offset = search_text(args), search_offset(args)
+        except (FieldsetError, ValueError) as e:
+            return {'message': str(e)}, 400
+        try:
+            applications, next_after = ApplicationModel.search(text, offset=offset, limit=args['limit'])
+            if applications:
+                context = application_count_context(applications, include=selection.include)
+                items = application_count_serializer.dump(applications, context=context, only=selection.only)
+                return page_response(items, next_offset(next_after)), 200
+            return {'message': 'No antivirus applications match this search.'}, 404
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not search applications.'}, 500
+
+
+@api.route('/license')
+class LicenseSearch(Resource):
+    @classmethod
+    @api.doc('Search licenses by key')
+    @api.expect(license_search_parser)
+    @jwt_required
+    def get(cls):
+        '''Search licenses by key prefix or exact key, in key order'''
+        claims = get_jwt_claims()
+        if not claims['is_admin']:
+            return {'message': 'You are not authorised to use this resource'}, 403
+
+        args = license_search_parser.parse_args()
+        try:
+            selection = license_fieldset.select(args)
+            text = search_text(args)
+        except (FieldsetError, ValueError) as e:
+            return {'message': str(e)}, 400
+        try:
+            licenses, next_after = LicenseModel.search_keys(text, exact=args['match'] == 'exact', after=args['after'], limit=args['limit'])
+            if licenses:
+                # Record this event in user's logs
+                log_method = 'get'
+                log_description = 'Searched licenses'
+                authorization = request.headers.get('Authorization')
+                auth_token  = {"Authorization": authorization}
+                record_user_log(auth_token, log_method, log_description)
+
+                context = license_context(licenses, include=selection.include)
+                return page_response(license_serializer.dump(licenses, context=context, only=selection.only), next_after), 200
+            return {'message': 'No licenses match this search.'}, 404
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return{'message':'Could not search licenses.'}, 500
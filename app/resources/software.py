@@ -1,19 +1,22 @@
-import os
-
-from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_claims, get_jwt_identity
 
+from models import PreconditionFailedError
 from models.software import SoftwareModel
-from schemas.software import SoftwareSchema
+from schemas.software import SoftwareSchema, software_count_serializer, software_context, software_count_context, SOFTWARE_COUNT_RELATIONS
 from user_functions.record_user_log import record_user_log
 from user_functions.validate_logo import allowed_file
+from user_functions.logo_storage import logo_storage, LogoError
+from user_functions.logo_variants import logo_pipeline
+from user_functions.pagination import add_page_arguments, page_response
+from user_functions.fieldsets import Fieldset, FieldsetError, add_fieldset_arguments
+from user_functions.catalog_cache import catalog_cache, invalidate_software
+from user_functions.preconditions import if_match_version, etag
 
 api = Namespace('software', description='Manage antiviruses')
 
-software_schema = SoftwareSchema()
 software_schemas = SoftwareSchema(many=True)
 
 upload_parser = api.parser()
@@ -23,6 +26,9 @@ upload_parser.add_argument('name', location='form', type=str, required=True, hel
 logo_parser = api.parser()
 logo_parser.add_argument('logo', location='files', type=FileStorage, required=True, help='Software Logo') # location='headers'
 
+software_fieldset = Fieldset(SoftwareModel, relations=SOFTWARE_COUNT_RELATIONS)
+page_parser = add_fieldset_arguments(add_page_arguments(api.parser()), software_fieldset)
+detail_parser = add_fieldset_arguments(api.parser(), software_fieldset)
 
 software_model = api.model('Software', {
     'name': fields.String(required=True, description='Name')
@@ -33,19 +39,21 @@ software_model = api.model('Software', {
 class SoftwareList(Resource):
     @classmethod
     @api.doc('Get all Software')
+    @api.expect(page_parser)
+    @catalog_cache.cached('software:list')
     def get(cls):
         '''Get all Software'''
+        args = page_parser.parse_args()
+        try:
+            selection = software_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
         try:
-            software = SoftwareModel.fetch_all()
+            software, next_after = SoftwareModel.fetch_page(columns=selection.columns, **args)
             if software:
-                software_list = software_schemas.dump(software)
-                for software_item in software_list:
-                    application_count = len(software_item['applications'])
-                    software_item['application_count'] = application_count
-                    for application in software_item['applications']:
-                        license_count = len(application['licenses'])
-                        application['licenses'] = license_count
-                return software_list, 200
+                context = software_count_context(software, include=selection.include)
+                software_counts = software_count_serializer.dump(software, context=context, only=selection.only)
+                return page_response(software_counts, next_after), 200
             return {'message': 'There are no antivirus software yet.'}, 404
         except Exception as e:
             print('========================================')
@@ -79,10 +87,14 @@ class SoftwareList(Resource):
                 return {'message':'No logo was found.'}, 400
                     
             if image_file and allowed_file(image_file.filename):
-                logo = secure_filename(image_file.filename)
-                image_file.save(os.path.join( 'uploads', logo))
-                new_software = Software(logo=logo,name=name)
+                try:
+                    logo = logo_storage.save(image_file)
+                except LogoError as e:
+                    return {'message': str(e)}, 400
+                logo_pipeline.submit(logo)
+                new_software = SoftwareModel(logo=logo,name=name)
                 new_software.insert_record()
+                invalidate_software(new_software.id)
 
                 # Record this event in user's logs
                 log_method = 'post'
@@ -103,19 +115,20 @@ class SoftwareList(Resource):
 class SoftwareDetail(Resource):
     @classmethod
     @api.doc('Get Single Software')
+    @api.expect(detail_parser)
+    @catalog_cache.cached('software:{id}')
     def get(cls, id:int):
         '''Get Single Software'''
+        args = detail_parser.parse_args()
         try:
-            software = SoftwareModel.fetch_by_id(id)
+            selection = software_fieldset.select(args)
+        except FieldsetError as e:
+            return {'message': str(e)}, 400
+        try:
+            software = SoftwareModel.fetch_by_id(id, columns=selection.columns)
             if software:
-                software_item = software_schema.dump(software)
-                application_count = len(software_item['applications'])
-                software_item['application_count'] = application_count
-                for application in software_item['applications']:
-                    license_count = len(application['licenses'])
-                    application['licenses'] = license_count
-                
-                return software_item, 200
+                context = software_count_context([software], include=selection.include)
+                return software_count_serializer.dump([software], context=context, only=selection.only)[0], 200
             return {'message':'This software does not exist!'}, 404 
         except Exception as e:
             print('========================================')
@@ -143,14 +156,14 @@ class SoftwareDetail(Resource):
             if name == '':
                 return {'message':'You never included a name.'}, 400
             
-            software = SoftwareModel.fetch_by_id(id)
-            if software:
-                software_by_name = SoftwareModel.fetch_by_name(name)
-                if software_by_name:
-                    if software_by_name.id != id:
-                        return {'message':'This record already exists in the database!'}, 400
+            software_by_name = SoftwareModel.fetch_by_name(name)
+            if software_by_name:
+                if software_by_name.id != id:
+                    return {'message':'This record already exists in the database!'}, 400
 
-                SoftwareModel.update_name(id=id, name=name)
+            software = SoftwareModel.update_name(id=id, name=name, version=if_match_version())
+            if software:
+                invalidate_software(id)
 
                 # Record this event in user's logs
                 log_method = 'put'
@@ -158,9 +171,12 @@ class SoftwareDetail(Resource):
                 authorization = request.headers.get('Authorization')
                 auth_token  = { "Authorization": authorization}
                 record_user_log(auth_token, log_method, log_description)
-                return software_schema.dump(software), 200
+                software_schema = SoftwareSchema(context=software_context([software]))
+                return software_schema.dump(software), 200, etag(software.version)
             return {'message':'This record does not exist!'}, 404
 
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
@@ -180,6 +196,7 @@ class SoftwareDetail(Resource):
             software = SoftwareModel.fetch_by_id(id)
             if software:              
                 SoftwareModel.delete_by_id(id)
+                invalidate_software(id)
 
                 # Record this event in user's logs
                 log_method = 'delete'
@@ -213,32 +230,35 @@ class LogoDetail(Resource):
 
             args = logo_parser.parse_args()
             image_file = args.get('logo')  # This is FileStorage instance
+            version = if_match_version()
 
+            if image_file.filename == '':
+                return {'message':'No logo was found.'}, 400
 
-            software = SoftwareModel.fetch_by_id(id)
-            if software:
-                if image_file.filename == '':
-                    return {'message':'No logo was found.'}, 400
-                    
-                if image_file and allowed_file(image_file.filename):
-                    logo = secure_filename(image_file.filename)
-                    image_file.save(os.path.join( 'uploads', logo))
-
-                    SoftwareModel.update_logo(id=id, logo=logo)
-
-                    new_db_software = SoftwareModel.fetch_by_id(id)
-                    new_software = software_schema.dump(new_db_software)
-
-                    # Record this event in user's logs
-                    log_method = 'put'
-                    log_description = f'Updated logo for software <{id}>'
-                    authorization = request.headers.get('Authorization')
-                    auth_token  = { "Authorization": authorization}
-                    record_user_log(auth_token, log_method, log_description)
-                    return software_schema.dump(software), 200
-                return {'message':'The logo you uploaded is not recognised.'}, 400
-            return {'message': 'This record does not exist!'}, 404
-        
+            if image_file and allowed_file(image_file.filename):
+                try:
+                    logo = logo_storage.save(image_file)
+                except LogoError as e:
+                    return {'message': str(e)}, 400
+
+                software = SoftwareModel.update_logo(id=id, logo=logo, version=version)
+                if not software:
+                    return {'message': 'This record does not exist!'}, 404
+                logo_pipeline.submit(logo)
+                invalidate_software(id)
+
+                # Record this event in user's logs
+                log_method = 'put'
+                log_description = f'Updated logo for software <{id}>'
+                authorization = request.headers.get('Authorization')
+                auth_token  = { "Authorization": authorization}
+                record_user_log(auth_token, log_method, log_description)
+                software_schema = SoftwareSchema(context=software_context([software]))
+                return software_schema.dump(software), 200, etag(software.version)
+            return {'message':'The logo you uploaded is not recognised.'}, 400
+
+        except PreconditionFailedError as e:
+            return {'message': str(e)}, 412
         except Exception as e:
             print('========================================')
             print('Error description: ', e)
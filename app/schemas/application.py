@@ -2,14 +2,23 @@ from . import ma
 from models.software import SoftwareModel
 from models.application import ApplicationModel
 from models.license import LicenseModel
-from .license import LicenseSchema
+from models.inventory import InventoryModel
+from models.logo_variant import LogoVariantModel
+from .license import license_serializer
+from .compiled import CompiledSerializer
+
+# Relations an application can nest with ?include= and the columns they are built from
+APPLICATION_RELATIONS = {'licenses': ('id',)}
+APPLICATION_COUNT_RELATIONS = {'licenses': ('id',), 'license_counts': ('id',), 'logo_variants': ('logo',)}
 
 class ApplicationSchema(ma.SQLAlchemyAutoSchema):
-    licenses = ma.Nested(LicenseSchema, many=True)
+    # Licenses are read from the 'licenses' context when it is given (see
+    # application_context) instead of one query per application.
+    licenses = ma.Method('get_licenses')
     class Meta:
         model = ApplicationModel
         load_only = ('software',)
-        dump_only = ('id', 'created', 'updated',)
+        dump_only = ('id', 'created', 'updated', 'version',)
         include_fk = True
 
     _links = ma.Hyperlinks({
@@ -18,6 +27,61 @@ class ApplicationSchema(ma.SQLAlchemyAutoSchema):
         'collection': ma.URLFor('api.application_application_list')
     })
 
+    def get_licenses(self, application):
+        if 'licenses' in self.context:
+            return license_serializer.dump(self.context['licenses'].get(application.id, []))
+        return license_serializer.dump(application.licenses)
+
+
+application_serializer = CompiledSerializer(ApplicationSchema)
+
+
+def application_context(applications):
+    '''Build the ApplicationSchema context: the licenses of all the applications in one query.'''
+    licenses = {}
+    for license in LicenseModel.fetch_by_application_ids([application.id for application in applications]):
+        licenses.setdefault(license.application_id, []).append(license)
+    return {'licenses': licenses}
+
+
+class ApplicationCountSchema(ma.SQLAlchemyAutoSchema):
+    # Catalog view of an application: license totals are read from the
+    # 'license_counts' context (see InventoryModel.fetch_counts)
+    # instead of dumping every nested license.
+    licenses = ma.Method('get_license_total')
+    license_counts = ma.Method('get_license_counts')
+    logo_variants = ma.Method('get_logo_variants')
+    class Meta:
+        model = ApplicationModel
+        load_only = ('software',)
+        dump_only = ('id', 'created', 'updated', 'version',)
+        include_fk = True
+
+    _links = ma.Hyperlinks({
+        'self': ma.URLFor('api.application_application_detail', id='<id>'),
+        'logo': ma.URLFor('api.application_logo_detail', id='<id>'),
+        'collection': ma.URLFor('api.application_application_list')
+    })
+
+    def get_license_counts(self, application):
+        return self.context['license_counts'][application.id]
+
+    def get_license_total(self, application):
+        return sum(self.get_license_counts(application).values())
+
+    def get_logo_variants(self, application):
+        return self.context['logo_variants'].get(application.logo, {})
+
 
+application_count_serializer = CompiledSerializer(ApplicationCountSchema)
 
 
+def application_count_context(applications, include=APPLICATION_COUNT_RELATIONS):
+    '''Build the ApplicationCountSchema context for the relations in `include`: license
+    counts from the inventory and logo variants, one query each.'''
+    context = {}
+    if 'licenses' in include or 'license_counts' in include:
+        context['license_counts'] = InventoryModel.fetch_counts([application.id for application in applications])
+    if 'logo_variants' in include:
+        context['logo_variants'] = LogoVariantModel.fetch_by_logos([application.logo for application in applications])
+    return context
@@ -1,15 +1,20 @@
-
 from . import ma
 from models.license import LicenseModel
 from models.application import ApplicationModel
+from .compiled import CompiledSerializer
 
+# Relations a license can nest with ?include= and the columns they are built from
+LICENSE_RELATIONS = {'application': ('application_id',)}
 
 
 class LicenseSchema(ma.SQLAlchemyAutoSchema):
+    # The application is only nested when asked for (see license_context);
+    # dump with exclude=('application',) otherwise.
+    application = ma.Method('get_application')
     class Meta:
         model =LicenseModel
-        load_only = ('application',)
-        dump_only = ('id', 'created', 'updated',)
+        dump_only = ('id', 'created', 'updated', 'version',)
+        exclude = ('license_key_hash',)
         include_fk = True
 
     _links = ma.Hyperlinks({
@@ -17,3 +22,32 @@ class LicenseSchema(ma.SQLAlchemyAutoSchema):
         'collection': ma.URLFor('api.license_license_list')
     })
 
+    def get_application(self, license):
+        return self.context['applications'].get(license.application_id)
+
+
+class LicenseApplicationSchema(ma.SQLAlchemyAutoSchema):
+    # The application of a license, without its own relations
+    class Meta:
+        model = ApplicationModel
+        dump_only = ('id', 'created', 'updated', 'version',)
+        include_fk = True
+
+    _links = ma.Hyperlinks({
+        'self': ma.URLFor('api.application_application_detail', id='<id>'),
+        'logo': ma.URLFor('api.application_logo_detail', id='<id>'),
+        'collection': ma.URLFor('api.application_application_list')
+    })
+
+
+license_serializer = CompiledSerializer(LicenseSchema, exclude=('application',))
+license_application_serializer = CompiledSerializer(LicenseApplicationSchema)
+
+
+def license_context(licenses, include=LICENSE_RELATIONS) -> dict:
+    '''Build the LicenseSchema context for the relations in `include`: the applications in one query.'''
+    context = {}
+    if 'application' in include:
+        applications = ApplicationModel.fetch_by_ids(list({license.application_id for license in licenses}))
+        context['applications'] = {application.id: item for application, item in zip(applications, license_application_serializer.dump(applications))}
+    return context
@@ -1,13 +1,56 @@
 from . import ma
 from models.software import SoftwareModel
 from models.application import ApplicationModel
-from .application import ApplicationSchema
+from models.logo_variant import LogoVariantModel
+from .application import application_serializer, application_count_serializer, application_context, application_count_context
+from .compiled import CompiledSerializer
+
+# Relations software can nest with ?include= and the columns they are built from
+SOFTWARE_COUNT_RELATIONS = {'applications': ('id',), 'application_count': ('id',), 'logo_variants': ('logo',)}
 
 class SoftwareSchema(ma.SQLAlchemyAutoSchema):
-    applications = ma.Nested(ApplicationSchema, many=True)
+    # Applications and their licenses are read from the context when it is
+    # given (see software_context) instead of one query per row.
+    applications = ma.Method('get_applications')
+    class Meta:
+        model = SoftwareModel
+        dump_only = ('id', 'created', 'updated', 'version',)
+        include_fk = True
+
+    _links = ma.Hyperlinks({
+        'self': ma.URLFor('api.software_software_detail', id='<id>'),
+        'logo': ma.URLFor('api.software_logo_detail', id='<id>'),
+        'collection': ma.URLFor('api.software_software_list')
+    })
+
+    def get_applications(self, software):
+        if 'applications' in self.context:
+            applications = self.context['applications'].get(software.id, [])
+        else:
+            applications = software.applications
+        return application_serializer.dump(applications, context=self.context)
+
+
+def software_context(software):
+    '''Build the SoftwareSchema context with two queries: the applications and their licenses.'''
+    applications = ApplicationModel.fetch_by_software_ids([item.id for item in software])
+    grouped_applications = {}
+    for application in applications:
+        grouped_applications.setdefault(application.software_id, []).append(application)
+    context = application_context(applications)
+    context['applications'] = grouped_applications
+    return context
+
+
+class SoftwareCountSchema(ma.SQLAlchemyAutoSchema):
+    # Catalog view of software: applications come from the 'applications'
+    # context (grouped by software id) and are dumped with license counts only.
+    applications = ma.Method('get_applications')
+    application_count = ma.Method('get_application_count')
+    logo_variants = ma.Method('get_logo_variants')
     class Meta:
         model = SoftwareModel
-        dump_only = ('id', 'created', 'updated',)
+        dump_only = ('id', 'created', 'updated', 'version',)
         include_fk = True
 
     _links = ma.Hyperlinks({
@@ -15,3 +58,34 @@ class SoftwareSchema(ma.SQLAlchemyAutoSchema):
         'logo': ma.URLFor('api.software_logo_detail', id='<id>'),
         'collection': ma.URLFor('api.software_software_list')
     })
+
+    def get_applications(self, software):
+        return application_count_serializer.dump(self.context['applications'].get(software.id, []), context=self.context)
+
+    def get_application_count(self, software):
+        return len(self.context['applications'].get(software.id, []))
+
+    def get_logo_variants(self, software):
+        return self.context['software_logo_variants'].get(software.logo, {})
+
+
+software_count_serializer = CompiledSerializer(SoftwareCountSchema)
+
+
+def software_count_context(software, include=SOFTWARE_COUNT_RELATIONS):
+    '''Build the SoftwareCountSchema context for the relations in `include` with a fixed
+    number of queries: the applications, their license counts and the logo variants of both.'''
+    context = {}
+    if 'applications' in include or 'application_count' in include:
+        # Counting the applications only needs their ids
+        columns = None if 'applications' in include else ['id', 'software_id']
+        applications = ApplicationModel.fetch_by_software_ids([item.id for item in software], columns=columns)
+        grouped_applications = {}
+        for application in applications:
+            grouped_applications.setdefault(application.software_id, []).append(application)
+        if 'applications' in include:
+            context.update(application_count_context(applications))
+        context['applications'] = grouped_applications
+    if 'logo_variants' in include:
+        context['software_logo_variants'] = LogoVariantModel.fetch_by_logos([item.logo for item in software])
+    return context
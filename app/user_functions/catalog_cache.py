@@ -0,0 +1,194 @@
+"""
+catalog_cache.py
+
+Read-through cache for the public software/application catalog routes.
+
+Cached responses are grouped under tags ('software:list', 'software:<id>',
+'application:<id>', ...). A write invalidates the tags it affects by bumping
+their generation number, which makes every cached variant of those tags
+(one per query string) unreachable at once; stale entries then simply age out.
+
+The default backend is a per-process LRU with a TTL. With several uWSGI
+workers each worker only sees its own invalidations, so use the shared
+'redis' backend when stale reads for up to CATALOG_CACHE_TTL are not acceptable.
+"""
+import functools
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+from models.application import ApplicationModel
+
+
+class MemoryBackend(object):
+    def __init__(self, max_size:int=1024, ttl:int=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # tag -> (generation, bumped at), least recently bumped first
+        self._generations = OrderedDict()
+        # Generations are never reused, even by a tag that was forgotten and bumped again
+        self._next_generation = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, key:str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key:str, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generation(self, tag:str) -> int:
+        generation = self._generations.get(tag)
+        return generation[0] if generation else 0
+
+    def bump(self, tag:str) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._generations.pop(tag, None)
+            self._generations[tag] = (next(self._next_generation), now)
+            # Whatever was cached before a tag's last bump has expired a TTL later, so
+            # the tag can be forgotten and read as generation 0 again.
+            while self._generations:
+                oldest, (_, bumped) = next(iter(self._generations.items()))
+                if bumped > now - self.ttl:
+                    break
+                del self._generations[oldest]
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend(object):
+    def __init__(self, url:str, ttl:int=60):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CATALOG_CACHE_BACKEND 'redis' needs the redis package installed.")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        # Redis evicts on its own; its counters live in INFO stats
+        self.evictions = 0
+
+    def get(self, key:str):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key:str, value) -> None:
+        self.client.setex(key, self.ttl, json.dumps(value))
+
+    def generation(self, tag:str) -> int:
+        return int(self.client.get(f'catalog-generation:{tag}') or 0)
+
+    def bump(self, tag:str) -> None:
+        self.client.incr(f'catalog-generation:{tag}')
+
+    def size(self) -> int:
+        return None
+
+
+class CatalogCache(object):
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        backend = app.config.get('CATALOG_CACHE_BACKEND', 'memory')
+        ttl = app.config.get('CATALOG_CACHE_TTL', 60)
+        if backend == 'memory':
+            self.backend = MemoryBackend(max_size=app.config.get('CATALOG_CACHE_SIZE', 1024), ttl=ttl)
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['CATALOG_CACHE_URL'], ttl=ttl)
+        else:
+            self.backend = None
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions if self.backend else 0,
+            'size': self.backend.size() if self.backend else 0,
+        }
+
+    def invalidate(self, *tags:str) -> None:
+        if self.backend is None:
+            return
+        for tag in set(tags):
+            self.backend.bump(tag)
+
+    def cached(self, tag_template:str, unless=None):
+        '''Cache a GET handler's 200 responses under a tag formatted from the view arguments.
+
+        `unless` is an optional callable; when it returns True the handler runs uncached.
+        '''
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or (unless and unless()):
+                    return func(*args, **kwargs)
+
+                tag = tag_template.format(**kwargs)
+                key = f'catalog:{tag}:{self.backend.generation(tag)}:{request.query_string.decode()}'
+                body = self.backend.get(key)
+                if body is not None:
+                    self.hits += 1
+                    return body, 200
+
+                self.misses += 1
+                response = func(*args, **kwargs)
+                if isinstance(response, tuple) and len(response) == 2 and response[1] == 200:
+                    self.backend.set(key, response[0])
+                return response
+            return wrapper
+        return decorator
+
+
+catalog_cache = CatalogCache()
+
+
+def invalidate_software(software_id:int) -> None:
+    if catalog_cache.backend is None:
+        return
+    # Software deleted where foreign keys are not enforced (SQLite) leaves its
+    # applications behind, still listed and readable on their own
+    application_tags = [f'application:{application.id}'
+                        for application in ApplicationModel.fetch_by_software_ids([software_id], columns=['id'])]
+    catalog_cache.invalidate('software:list', f'software:{software_id}', f'application:software:{software_id}',
+                             'application:list', *application_tags)
+
+
+def invalidate_application(application_id:int, software_id:int) -> None:
+    # Software entries embed their applications and every application shows its license counts
+    catalog_cache.invalidate(
+        'software:list', f'software:{software_id}',
+        'application:list', f'application:{application_id}', f'application:software:{software_id}')
+
+
+def invalidate_applications(application_ids) -> None:
+    '''Invalidate the catalog entries of applications whose licenses changed.'''
+    if catalog_cache.backend is None or not application_ids:
+        return
+    for application_id, software_id in ApplicationModel.fetch_software_ids(list(application_ids)):
+        invalidate_application(application_id, software_id)
@@ -0,0 +1,66 @@
+"""
+fieldsets.py
+
+Sparse fieldsets for the GET routes. ?fields= names the columns to return and
+?include= the nested relations to add to them. Each relation declares the
+columns it is built from, so a route can load just the columns it returns and
+run only the queries of the relations that were asked for.
+
+Without ?fields= every column is returned; without ?include= a route returns
+the relations it has always returned.
+"""
+from collections import namedtuple
+
+# only: output keys to dump, include: relations to build, columns: model columns to load (None for all)
+Selection = namedtuple('Selection', ('only', 'include', 'columns'))
+
+
+class FieldsetError(ValueError):
+    pass
+
+
+class Fieldset(object):
+    def __init__(self, model, relations:dict=None, default_include=None, extra=('_links',), required=('id',)):
+        '''`relations` maps each relation name to the columns it needs; `extra` are
+        output keys that are not columns and `required` columns are always loaded.'''
+        # Columns marked info={'private': True} are neither returned nor selectable
+        self.columns = tuple(column.key for column in model.__table__.columns if not column.info.get('private'))
+        self.relations = relations or {}
+        self.default_include = tuple(self.relations if default_include is None else default_include)
+        self.extra = tuple(extra)
+        self.required = tuple(required)
+
+    def select(self, args) -> Selection:
+        '''Read the ?fields= and ?include= arguments, removing them from the parsed `args`.'''
+        fields = split_names(args.pop('fields', None))
+        include = split_names(args.pop('include', None))
+        choices = self.columns + self.extra
+        if fields is not None and not fields <= set(choices):
+            raise FieldsetError(f"Unknown fields: {', '.join(sorted(fields - set(choices)))}. Choose from: {', '.join(choices)}.")
+        if include is None:
+            include = set(self.default_include)
+        elif not include <= set(self.relations):
+            raise FieldsetError(f"Unknown relations: {', '.join(sorted(include - set(self.relations)))}. Choose from: {', '.join(self.relations) or 'none'}.")
+
+        if fields is None:
+            return Selection(set(choices) | include, include, None)
+        needed = set(self.required) | fields
+        for relation in include:
+            needed.update(self.relations[relation])
+        columns = [column for column in self.columns if column in needed]
+        return Selection(fields | include, include, columns)
+
+
+def split_names(value:str):
+    '''The set of comma separated names in a query argument, or None when it was not given.'''
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def add_fieldset_arguments(parser, fieldset:Fieldset):
+    '''Add the ?fields= and ?include= arguments of a fieldset to a request parser.'''
+    parser.add_argument('fields', location='args', type=str, help=f"Comma separated fields to return, defaults to all: {', '.join(fieldset.columns + fieldset.extra)}")
+    if fieldset.relations:
+        parser.add_argument('include', location='args', type=str, help=f"Comma separated relations to nest: {', '.join(fieldset.relations)}; defaults to {', '.join(fieldset.default_include) or 'none'}")
+    return parser
@@ -0,0 +1,46 @@
+"""
+license_export.py
+
+Renders license rows as NDJSON or CSV chunks for a streamed response, without
+building model objects or schema output for every row.
+"""
+import csv
+import io
+import json
+
+EXPORT_COLUMNS = ('id', 'license_key', 'license_status', 'application_id', 'created', 'updated')
+DATE_COLUMNS = ('created', 'updated')
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def export_chunks(rows, export_format:str='ndjson', chunk_size:int=1000, columns=EXPORT_COLUMNS):
+    '''Yield text chunks of about chunk_size rows each from tuples of `columns`.'''
+    buffer = io.StringIO()
+    writer = None
+    if export_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+    dates = [index for index, column in enumerate(columns) if column in DATE_COLUMNS]
+    pending = 0
+    for row in rows:
+        values = list(row)
+        for index in dates:
+            values[index] = _isoformat(values[index])
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values))) + '\n')
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,135 @@
+"""
+license_import.py
+
+Streams licenses out of an uploaded CSV or NDJSON body and inserts them in
+batches, so a vendor file of any size is imported with a bounded amount of
+memory and one transaction per batch.
+"""
+import csv
+import json
+
+from models.application import ApplicationModel
+from models.license import LicenseModel, LicenseKeyExistsError
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+# Inserts of a batch when other writers keep storing some of its keys first
+INSERT_ATTEMPTS = 3
+MAX_KEY_LENGTH = LicenseModel.license_key.property.columns[0].type.length
+
+
+def read_csv_rows(lines):
+    '''Yield (line_number, row) from CSV text lines with a license_key[,application_id] header.'''
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson_rows(lines):
+    '''Yield (line_number, row) from newline-delimited JSON objects; unparseable lines yield None.'''
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+class LicenseImporter(object):
+    def __init__(self, default_application_id:int=None, batch_size:int=IMPORT_BATCH_SIZE):
+        self.default_application_id = default_application_id
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = []
+        self.application_ids = set()
+
+    def report(self) -> dict:
+        return {
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'rejected': self.rejected,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'errors_truncated': self.duplicates + self.rejected > len(self.errors),
+        }
+
+    def run(self, rows) -> dict:
+        batch = []
+        for line_number, row in rows:
+            record = self._validate(line_number, row)
+            if record:
+                batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        self._import_batch(batch)
+        return self.report()
+
+    def _error(self, line_number:int, error:str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line_number, 'error': error})
+
+    def _duplicate(self, line_number:int) -> None:
+        self.duplicates += 1
+        self._error(line_number, 'This key already exists.')
+
+    def _reject(self, line_number:int, error:str) -> None:
+        self.rejected += 1
+        self._error(line_number, error)
+
+    def _validate(self, line_number:int, row):
+        if row is None:
+            return self._reject(line_number, 'Could not parse this row.')
+
+        license_key = row.get('license_key')
+        if not isinstance(license_key, str) or license_key.strip() == '':
+            return self._reject(line_number, 'You have not specified any key.')
+        license_key = license_key.strip()
+        if len(license_key) > MAX_KEY_LENGTH:
+            return self._reject(line_number, f'The key is longer than {MAX_KEY_LENGTH} characters.')
+
+        application_id = row.get('application_id') or self.default_application_id
+        try:
+            application_id = int(application_id)
+        except (TypeError, ValueError):
+            return self._reject(line_number, 'You have not specified a valid application.')
+
+        return line_number, application_id, license_key
+
+    def _import_batch(self, batch:list) -> None:
+        if not batch:
+            return
+
+        # One lookup per batch for the applications and the already stored keys
+        application_ids = ApplicationModel.fetch_existing_ids(list({application_id for _, application_id, _ in batch}))
+        existing_keys = LicenseModel.fetch_existing_keys(list({license_key for _, _, license_key in batch}))
+
+        rows = []
+        for line_number, application_id, license_key in batch:
+            if application_id not in application_ids:
+                self._reject(line_number, 'The specified application does not exist.')
+            elif license_key in existing_keys:
+                self._duplicate(line_number)
+            else:
+                existing_keys.add(license_key)
+                rows.append((line_number, application_id, license_key))
+
+        for attempt in range(1, INSERT_ATTEMPTS + 1):
+            try:
+                LicenseModel.insert_batch([{'application_id': application_id, 'license_key': license_key}
+                                           for _, application_id, license_key in rows])
+                break
+            except LicenseKeyExistsError:
+                if attempt == INSERT_ATTEMPTS:
+                    raise
+                # Another writer stored some of these keys since the lookup; count them and insert the rest
+                existing_keys = LicenseModel.fetch_existing_keys([license_key for _, _, license_key in rows])
+                for line_number, _, license_key in rows:
+                    if license_key in existing_keys:
+                        self._duplicate(line_number)
+                rows = [row for row in rows if row[2] not in existing_keys]
+        self.application_ids.update(application_id for _, application_id, _ in rows)
+        self.inserted += len(rows)
@@ -0,0 +1,110 @@
+"""
+license_signing.py
+
+Issues the signed license tokens of license_tokens.py when licenses are sold,
+so client software can check a license offline instead of calling
+/license/validate on every activation.
+
+Signing keys live in LICENSE_SIGNING_KEYS_DIR: `<kid>.pem` holds a PKCS#8
+Ed25519 private key, `<kid>.pub` the public key of a retired one whose private
+half has been destroyed. Every key in the directory is published at
+/api/license/keys; only LICENSE_SIGNING_KEY_ID signs. To rotate, run
+`flask generate-signing-key`, deploy so clients fetch the new public key, then
+point LICENSE_SIGNING_KEY_ID at it. Keep a retired key published until the
+tokens it signed have expired. Without a keys directory no tokens are issued.
+"""
+import os
+import time
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+from user_functions.license_tokens import hash_license_key, public_jwk, sign_license_token
+
+
+def load_signing_keys(directory:str):
+    '''(private keys, public keys), each key id -> key, from a keys directory.'''
+    private_keys = {}
+    public_keys = {}
+    for file_name in sorted(os.listdir(directory)):
+        key_id, extension = os.path.splitext(file_name)
+        with open(os.path.join(directory, file_name), 'rb') as key_file:
+            data = key_file.read()
+        if extension == '.pem':
+            key = serialization.load_pem_private_key(data, password=None, backend=default_backend())
+            if not isinstance(key, Ed25519PrivateKey):
+                raise RuntimeError(f'Signing key {file_name} is not an Ed25519 key.')
+            private_keys[key_id] = key
+            public_keys[key_id] = key.public_key()
+        elif extension == '.pub':
+            key = serialization.load_pem_public_key(data, backend=default_backend())
+            if not isinstance(key, Ed25519PublicKey):
+                raise RuntimeError(f'Public key {file_name} is not an Ed25519 key.')
+            public_keys.setdefault(key_id, key)
+    return private_keys, public_keys
+
+
+class LicenseSigner(object):
+    def __init__(self, app=None):
+        self.key_id = None
+        self.private_key = None
+        self.public_keys = {}
+        self.lifetime = 365 * 24 * 3600
+        self.issuer = None
+        self.issued = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.lifetime = int(app.config.get('LICENSE_TOKEN_LIFETIME', 365)) * 24 * 3600
+        self.issuer = app.config.get('LICENSE_TOKEN_ISSUER')
+        directory = app.config.get('LICENSE_SIGNING_KEYS_DIR')
+        if not directory:
+            return
+
+        private_keys, self.public_keys = load_signing_keys(directory)
+        key_id = app.config.get('LICENSE_SIGNING_KEY_ID')
+        if key_id is None and len(private_keys) == 1:
+            key_id, = private_keys
+        if key_id is not None and key_id not in private_keys:
+            raise RuntimeError(f"No private signing key '{key_id}' in {directory}.")
+        if key_id is None and private_keys:
+            raise RuntimeError(f'Several signing keys in {directory}: set LICENSE_SIGNING_KEY_ID.')
+        self.key_id = key_id
+        self.private_key = private_keys.get(key_id)
+
+    @property
+    def enabled(self) -> bool:
+        return self.private_key is not None
+
+    def stats(self) -> dict:
+        return {'published_keys': len(self.public_keys), 'issued': self.issued}
+
+    def info(self) -> dict:
+        '''The key that signs now, published as the labels of an info metric.'''
+        return {'key_id': self.key_id} if self.enabled else {}
+
+    def issue(self, license, now:float=None):
+        '''A signed token for a sold license, else None.'''
+        if not self.enabled or license.license_status != 'sold':
+            return None
+        issued_at = int(time.time() if now is None else now)
+        claims = {
+            'license_id': license.id,
+            'license_key_hash': hash_license_key(license.license_key),
+            'application_id': license.application_id,
+            'license_status': license.license_status,
+            'iat': issued_at,
+            'exp': issued_at + self.lifetime,
+        }
+        if self.issuer:
+            claims['iss'] = self.issuer
+        self.issued += 1
+        return sign_license_token(self.private_key, self.key_id, claims)
+
+    def jwks(self) -> dict:
+        return {'keys': [public_jwk(key_id, public_key) for key_id, public_key in self.public_keys.items()]}
+
+
+license_signer = LicenseSigner()
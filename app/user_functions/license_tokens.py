@@ -0,0 +1,98 @@
+"""
+license_tokens.py
+
+Signed license tokens, verifiable offline. A token is a compact JWS (RFC 7515)
+signed with Ed25519 ("alg": "EdDSA", RFC 8037). Its claims are the license id,
+the SHA-256 of the license key, the application id, the license status and
+the expiry. The "kid" header names the signing key among the keys published at
+/api/license/keys (a JWK set), so signing keys can be rotated.
+
+This module only needs the standard library and the cryptography package, so
+client software and partner services can copy it and verify tokens locally:
+
+    public_keys = public_keys_from_jwks(requests.get(f'{service}/api/license/keys').json())
+    claims = verify_license_token(token, public_keys, license_key=entered_key)
+
+Any JOSE library that supports EdDSA can verify the tokens as well.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+ALGORITHM = 'EdDSA'
+TOKEN_TYPE = 'license+jwt'
+
+
+class LicenseTokenError(ValueError):
+    '''The token is malformed, not signed by a known key, expired or for another license key.'''
+
+
+def b64encode(data:bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def b64decode(text:str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def hash_license_key(license_key:str) -> str:
+    '''The SHA-256 (hex) of a license key, as in the license_key_hash claim.'''
+    return hashlib.sha256(license_key.encode('utf-8')).hexdigest()
+
+
+def sign_license_token(private_key:Ed25519PrivateKey, key_id:str, claims:dict) -> str:
+    header = {'alg': ALGORITHM, 'typ': TOKEN_TYPE, 'kid': key_id}
+    signing_input = '.'.join(b64encode(json.dumps(part, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+                             for part in (header, claims))
+    return f'{signing_input}.{b64encode(private_key.sign(signing_input.encode("ascii")))}'
+
+
+def verify_license_token(token:str, public_keys:dict, license_key:str=None, now:float=None, leeway:int=60) -> dict:
+    '''The claims of a token signed by one of `public_keys` (key id -> Ed25519PublicKey).
+
+    With `license_key`, the token must also be for that key. Raises LicenseTokenError.
+    '''
+    try:
+        encoded_header, encoded_claims, encoded_signature = token.split('.')
+        header = json.loads(b64decode(encoded_header))
+        claims = json.loads(b64decode(encoded_claims))
+        signature = b64decode(encoded_signature)
+    except (AttributeError, ValueError):
+        raise LicenseTokenError('Malformed license token.')
+    if not isinstance(header, dict) or not isinstance(claims, dict) or header.get('alg') != ALGORITHM:
+        raise LicenseTokenError('Malformed license token.')
+
+    public_key = public_keys.get(header.get('kid'))
+    if public_key is None:
+        raise LicenseTokenError('The license token is signed by an unknown key.')
+    try:
+        public_key.verify(signature, f'{encoded_header}.{encoded_claims}'.encode('ascii'))
+    except InvalidSignature:
+        raise LicenseTokenError('Invalid license token signature.')
+
+    expires = claims.get('exp')
+    if not isinstance(expires, (int, float)) or expires + leeway < (time.time() if now is None else now):
+        raise LicenseTokenError('The license token has expired.')
+    if license_key is not None and not hmac.compare_digest(str(claims.get('license_key_hash')), hash_license_key(license_key)):
+        raise LicenseTokenError('The license token is for another license key.')
+    return claims
+
+
+def public_jwk(key_id:str, public_key:Ed25519PublicKey) -> dict:
+    raw = public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return {'kty': 'OKP', 'crv': 'Ed25519', 'kid': key_id, 'use': 'sig', 'alg': ALGORITHM, 'x': b64encode(raw)}
+
+
+def public_keys_from_jwks(jwks:dict) -> dict:
+    '''Key id -> Ed25519PublicKey from a JWK set such as /api/license/keys.'''
+    return {
+        jwk['kid']: Ed25519PublicKey.from_public_bytes(b64decode(jwk['x']))
+        for jwk in jwks.get('keys', [])
+        if jwk.get('kty') == 'OKP' and jwk.get('crv') == 'Ed25519'
+    }
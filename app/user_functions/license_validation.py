@@ -0,0 +1,168 @@
+"""
+license_validation.py
+
+Answers "is this license key valid, and for which application and status" for
+client installations at activation time. Keys are looked up by their SHA-256
+in the indexed license_key_hash column, never by scanning keys.
+
+Every worker keeps a Bloom filter of the key hashes that exist, so an unknown
+key is answered without a query, and a small LRU of recent positive answers.
+Every VALIDATION_SYNC_INTERVAL seconds the filter takes in the licenses
+created or updated since the previous sync, give or take VALIDATION_SYNC_OVERLAP
+seconds for clock skew between hosts and writes that commit late, and it is
+rebuilt every VALIDATION_REBUILD_INTERVAL seconds to drop deleted and replaced
+keys. A key added or changed by another worker can be reported invalid until
+the next sync. Cached answers live VALIDATION_CACHE_TTL seconds at most, and
+status changes, key changes and deletions made by this worker drop them at once.
+
+An answer only ever describes the key that was asked about.
+"""
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from models.license import LicenseModel, hash_license_key
+from user_functions.bloom_filter import BloomFilter
+
+
+def invalid(license_key:str) -> dict:
+    return {'license_key': license_key, 'valid': False}
+
+
+def valid(license_key:str, license_status:str, application_id:int) -> dict:
+    return {'license_key': license_key, 'valid': True, 'license_status': license_status, 'application_id': application_id}
+
+
+class LicenseValidator(object):
+    def __init__(self, app=None):
+        self.sync_interval = 5.0
+        self.sync_overlap = 120.0
+        self.rebuild_interval = 300.0
+        self.bloom_capacity = 1000000
+        self.cache_size = 10000
+        self.cache_ttl = 5.0
+        self.bloom_rejections = 0
+        self.cache_hits = 0
+        self.lookups = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # key hash -> (id, license_key, license_status, application_id, expires)
+        self._cache = OrderedDict()
+        self._cached_ids = {}
+        self._bloom = None
+        self._changed_since = None
+        self._next_sync = 0.0
+        self._next_rebuild = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.sync_interval = app.config.get('VALIDATION_SYNC_INTERVAL', 5.0)
+        self.sync_overlap = app.config.get('VALIDATION_SYNC_OVERLAP', 120.0)
+        self.rebuild_interval = app.config.get('VALIDATION_REBUILD_INTERVAL', 300.0)
+        self.bloom_capacity = app.config.get('VALIDATION_BLOOM_CAPACITY', 1000000)
+        self.cache_size = app.config.get('VALIDATION_CACHE_SIZE', 10000)
+        self.cache_ttl = app.config.get('VALIDATION_CACHE_TTL', 5.0)
+
+    def stats(self) -> dict:
+        return {
+            'bloom_rejections': self.bloom_rejections,
+            'cache_hits': self.cache_hits,
+            'lookups': self.lookups,
+            'cache_size': len(self._cache),
+        }
+
+    def validate(self, license_keys:list) -> list:
+        '''One answer per key, in order; needs an app context.'''
+        self.sync()
+        now = time.monotonic()
+        answers = {}
+        missing = {}
+        key_hashes = [(license_key, hash_license_key(license_key)) for license_key in license_keys]
+        with self._lock:
+            for license_key, key_hash in key_hashes:
+                if key_hash not in self._bloom:
+                    self.bloom_rejections += 1
+                    answers[license_key] = invalid(license_key)
+                    continue
+                cached = self._cache.get(key_hash)
+                if cached is not None and cached[4] > now and hmac.compare_digest(cached[1].encode('utf-8'), license_key.encode('utf-8')):
+                    self.cache_hits += 1
+                    self._cache.move_to_end(key_hash)
+                    answers[license_key] = valid(license_key, cached[2], cached[3])
+                else:
+                    missing[key_hash] = license_key
+
+        if missing:
+            self.lookups += 1
+            rows = LicenseModel.fetch_by_key_hashes(list(missing))
+            with self._lock:
+                for id, license_key, key_hash, license_status, application_id in rows:
+                    # The hash matched; the key itself must too (as bytes: str only compares ASCII)
+                    if not hmac.compare_digest(license_key.encode('utf-8'), missing[key_hash].encode('utf-8')):
+                        continue
+                    answers[license_key] = valid(license_key, license_status, application_id)
+                    self._remember(key_hash, (id, license_key, license_status, application_id, now + self.cache_ttl))
+        return [answers.get(license_key) or invalid(license_key) for license_key in license_keys]
+
+    def invalidate(self, ids) -> None:
+        '''Drop the cached answers of licenses whose status or key changed, or that were deleted.'''
+        with self._lock:
+            for id in ids:
+                key_hash = self._cached_ids.pop(id, None)
+                if key_hash is not None:
+                    self._cache.pop(key_hash, None)
+
+    def add(self, license_keys) -> None:
+        '''Make keys just added or changed by this worker valid here at once.'''
+        if self._bloom is not None:
+            for license_key in license_keys:
+                self._bloom.add(hash_license_key(license_key))
+
+    def expire(self) -> None:
+        '''Take in licenses added by this worker at the next validation instead of after the sync interval.'''
+        self._next_sync = 0.0
+
+    def sync(self) -> None:
+        '''Bring the Bloom filter up to date, at most once per sync interval; needs an app context.'''
+        if time.monotonic() < self._next_sync:
+            return
+        # While one thread syncs, the others go on with the current filter
+        if not self._sync_lock.acquire(blocking=self._bloom is None):
+            return
+        try:
+            now = time.monotonic()
+            if now < self._next_sync:
+                return
+            # Rows written from here on are read by the next sync, with an overlap
+            changed_since = datetime.utcnow() - timedelta(seconds=self.sync_overlap)
+            rebuild = self._bloom is None or self._bloom.saturated or now >= self._next_rebuild
+            if rebuild:
+                bloom = BloomFilter(max(self.bloom_capacity, 2 * LicenseModel.fetch_count()))
+                rows = LicenseModel.stream_key_hashes()
+            else:
+                bloom = self._bloom
+                rows = LicenseModel.stream_changed_key_hashes(self._changed_since)
+            for id, key_hash in rows:
+                if key_hash is not None:
+                    bloom.add(key_hash)
+            self._bloom = bloom
+            self._changed_since = changed_since
+            if rebuild:
+                self._next_rebuild = now + self.rebuild_interval
+            self._next_sync = now + self.sync_interval
+        finally:
+            self._sync_lock.release()
+
+    def _remember(self, key_hash:str, entry:tuple) -> None:
+        self._cache[key_hash] = entry
+        self._cache.move_to_end(key_hash)
+        self._cached_ids[entry[0]] = key_hash
+        while len(self._cache) > self.cache_size:
+            _, (id, *_) = self._cache.popitem(last=False)
+            self._cached_ids.pop(id, None)
+
+
+license_validator = LicenseValidator()
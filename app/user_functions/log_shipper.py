@@ -0,0 +1,249 @@
+"""
+log_shipper.py
+
+Ships user log events to the log service off the request path. Events are put
+on a bounded in-process queue and a worker thread posts them in batches over a
+pooled keep-alive session. Batches that cannot be delivered are appended to a
+local spool file and replayed once the log service answers again.
+
+Events carry the caller's bearer token, which is never written to disk: the
+spool keeps events without it, and replays them with the service's own token
+(their user_id still names the user). Without a service token, batches that
+cannot be delivered are dropped instead of spooled.
+
+Every uWSGI worker shares the spool file: appends and taking the spool aside
+hold an exclusive lock on `<spool>.lock`, and one worker at a time replays,
+holding `<spool>.replay.lock`, so no event is posted twice. Spool lines that
+do not decode to an event (e.g. torn by a crash mid-append) are skipped and
+counted, so they never hold up the rest of the spool.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def without_authorization(event:dict) -> dict:
+    return {key: value for key, value in event.items() if key != 'authorization'}
+
+
+class LogShipper(object):
+    def __init__(self, url, max_queue_size=10000, batch_size=200, flush_interval=1.0,
+                 replay_interval=30.0, timeout=5.0, spool_path='spool/user_logs.ndjson', service_token=None):
+        self.url = url
+        self.service_token = service_token
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.replay_interval = replay_interval
+        self.timeout = timeout
+        self.spool_path = spool_path
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.shipped = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.corrupt = 0
+
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._session = None
+        self._last_replay = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'shipped': self.shipped,
+            'dropped': self.dropped,
+            'spooled': self.spooled,
+            'replayed': self.replayed,
+            'corrupt': self.corrupt,
+        }
+
+    def submit(self, event:dict) -> bool:
+        '''Queue an event without blocking; returns False if it had to be dropped.'''
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout:float=5.0) -> None:
+        '''Flush hook for shutdown: stop the worker and ship or spool what is left.'''
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        batch = self._drain()
+        while batch:
+            self._ship(batch)
+            batch = self._drain()
+
+    def _ensure_worker(self) -> None:
+        # uWSGI forks workers after import, so a thread started in the master
+        # does not exist in the worker; start one per process.
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._session = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+            self._thread.start()
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def _drain(self, first=None) -> list:
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                try:
+                    first = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    if time.monotonic() - self._last_replay >= self.replay_interval:
+                        self._replay_spool()
+                    continue
+                self._ship(self._drain(first))
+            except Exception as e:
+                # A spool that cannot be written or read must not stop the shipping
+                print('Error: log shipper:', e)
+
+    def _post(self, batch:list, headers:dict=None) -> bool:
+        try:
+            res = self._get_session().post(self.url, json=batch, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print('Error: could not reach log service:', e)
+            return False
+        if res.status_code not in (200, 201):
+            print('Error:', res.status_code)
+            print(res.text)
+            return False
+        return True
+
+    def _ship(self, batch:list) -> None:
+        if self._post(batch):
+            self.shipped += len(batch)
+            if time.monotonic() - self._last_replay >= self.replay_interval:
+                self._replay_spool()
+        else:
+            self._spool(batch)
+
+    @contextlib.contextmanager
+    def _file_lock(self, path:str, blocking:bool=True):
+        '''Hold an exclusive lock on `path` across processes; yields False if it is taken and not `blocking`.'''
+        spool_dir = os.path.dirname(path)
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        with open(path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _spool(self, batch:list) -> None:
+        if not self.service_token:
+            self.dropped += len(batch)
+            print(f'Error: no service token to replay them with, dropped {len(batch)} log(s)')
+            return
+        batch = [without_authorization(event) for event in batch]
+        with self._spool_lock, self._file_lock(self.spool_path + '.lock'):
+            with open(self.spool_path, 'a') as spool:
+                for event in batch:
+                    spool.write(json.dumps(event) + '\n')
+        self.spooled += len(batch)
+
+    def _replay_spool(self) -> None:
+        self._last_replay = time.monotonic()
+        if not self.service_token:
+            return
+        replay_path = self.spool_path + '.replay'
+        with self._file_lock(replay_path + '.lock', blocking=False) as locked:
+            # Left to the worker that is already replaying
+            if locked:
+                self._replay(replay_path)
+
+    def _replay(self, replay_path:str) -> None:
+        with self._spool_lock, self._file_lock(self.spool_path + '.lock'):
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spool_path):
+                    return
+                # Take the spool aside so new failures keep appending to a fresh file.
+                os.replace(self.spool_path, replay_path)
+
+        headers = {'Authorization': f'Bearer {self.service_token}'}
+        with open(replay_path) as spool:
+            batch = []
+            for line in spool:
+                if line.strip():
+                    event = self._decode(line)
+                    if event is not None:
+                        batch.append(without_authorization(event))
+                if len(batch) >= self.batch_size:
+                    if not self._post(batch, headers):
+                        self._keep_unreplayed(replay_path, batch, spool)
+                        return
+                    self.replayed += len(batch)
+                    batch = []
+            if batch:
+                if not self._post(batch, headers):
+                    self._keep_unreplayed(replay_path, batch, spool)
+                    return
+                self.replayed += len(batch)
+        os.remove(replay_path)
+
+    def _decode(self, line:str):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            self.corrupt += 1
+            print('Error: skipped a corrupt log spool line:', line[:200].rstrip())
+            return None
+        return event
+
+    def _keep_unreplayed(self, replay_path:str, batch:list, spool) -> None:
+        # The log service went away mid-replay: keep only what was not delivered
+        # so the next attempt does not post the same events twice.
+        with open(replay_path + '.tmp', 'w') as remaining:
+            for event in batch:
+                remaining.write(json.dumps(event) + '\n')
+            for line in spool:
+                remaining.write(line)
+        os.replace(replay_path + '.tmp', replay_path)
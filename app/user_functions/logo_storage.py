@@ -0,0 +1,88 @@
+"""
+logo_storage.py
+
+Content-addressed storage for uploaded logos. An upload is streamed to disk in
+chunks while it is hashed, its type is checked from its leading bytes and its
+size is capped. It is stored as '<sha256>.<ext>', so identical logos are kept
+once and a stored file never changes, which lets it be cached forever.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from .validate_logo import UPLOAD_FOLDER, detect_image_type
+
+CHUNK_SIZE = 64 * 1024
+# Stored logos and their variants (<sha256>-<width>x<height>.<ext>)
+STORED_NAME = re.compile(r'^[0-9a-f]{64}(-\d+x\d+)?\.(png|jpg|webp)$')
+
+
+class LogoError(ValueError):
+    pass
+
+
+class LogoStorage(object):
+    def __init__(self, app=None):
+        self.folder = UPLOAD_FOLDER
+        self.max_size = 2 * 1024 * 1024
+        self.accel_redirect = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.folder = app.config.get('UPLOAD_FOLDER', UPLOAD_FOLDER)
+        self.max_size = app.config.get('MAX_LOGO_SIZE', self.max_size)
+        self.accel_redirect = app.config.get('LOGO_ACCEL_REDIRECT')
+
+    def save(self, file_storage) -> str:
+        '''Store an uploaded logo and return its content-addressed file name.'''
+        os.makedirs(self.folder, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        extension = None
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.folder, suffix='.upload')
+        try:
+            with os.fdopen(descriptor, 'wb') as temporary_file:
+                while True:
+                    chunk = file_storage.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if extension is None:
+                        extension = detect_image_type(chunk)
+                        if extension is None:
+                            raise LogoError('The logo you uploaded is not recognised.')
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise LogoError(f'The logo is larger than {self.max_size // 1024} KB.')
+                    digest.update(chunk)
+                    temporary_file.write(chunk)
+
+            if extension is None:
+                raise LogoError('No logo was found.')
+
+            name = f'{digest.hexdigest()}.{extension}'
+            path = os.path.join(self.folder, name)
+            if os.path.exists(path):
+                # Already stored: same content, same name
+                os.remove(temporary_path)
+            else:
+                os.chmod(temporary_path, 0o644)
+                os.replace(temporary_path, path)
+            return name
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def path(self, name:str) -> str:
+        return os.path.join(self.folder, name)
+
+    @staticmethod
+    def is_stored_name(name:str) -> bool:
+        '''True for content-addressed names, whose files never change.'''
+        return bool(STORED_NAME.match(name))
+
+
+logo_storage = LogoStorage()
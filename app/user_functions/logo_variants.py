@@ -0,0 +1,128 @@
+"""
+logo_variants.py
+
+Generates fixed-size thumbnails of uploaded logos, in the logo's own format and
+as WebP, in a process pool off the request path, and records them in
+logo_variants so catalog responses can point clients at the smaller files.
+"""
+import atexit
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from models.application import ApplicationModel
+from models.logo_variant import LogoVariantModel
+from models.software import SoftwareModel
+from .catalog_cache import invalidate_application, invalidate_software
+from .validate_logo import UPLOAD_FOLDER, ALLOWED_EXTENSIONS
+
+VARIANT_SIZES = {'thumb': (64, 64), 'card': (256, 256)}
+VARIANT_NAME = re.compile(r'-\d+x\d+\.\w+$')
+SAVE_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+
+def render_variants(folder:str, logo:str) -> list:
+    '''Write every variant of a logo next to it and describe them. Runs in a pool process.'''
+    from PIL import Image
+
+    stem, extension = logo.rsplit('.', 1)
+    extension = extension.lower()
+    variants = []
+    with Image.open(os.path.join(folder, logo)) as image:
+        image.load()
+        for variant, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            for image_format in (extension, 'webp'):
+                file = f'{stem}-{size[0]}x{size[1]}.{image_format}'
+                path = os.path.join(folder, file)
+                if not os.path.exists(path):
+                    output = resized
+                    if SAVE_FORMATS[image_format] == 'JPEG' and output.mode not in ('RGB', 'L'):
+                        output = output.convert('RGB')
+                    descriptor, temporary_path = tempfile.mkstemp(dir=folder, suffix='.variant')
+                    with os.fdopen(descriptor, 'wb') as temporary_file:
+                        output.save(temporary_file, SAVE_FORMATS[image_format])
+                    os.chmod(temporary_path, 0o644)
+                    os.replace(temporary_path, path)
+                variants.append({'variant': variant, 'image_format': image_format, 'file': file,
+                                 'width': resized.width, 'height': resized.height})
+    return variants
+
+
+class LogoPipeline(object):
+    def __init__(self, app=None):
+        self.app = None
+        self.folder = UPLOAD_FOLDER
+        self.workers = 2
+        self._executor = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.folder = app.config.get('UPLOAD_FOLDER', UPLOAD_FOLDER)
+        self.workers = app.config.get('LOGO_PIPELINE_WORKERS', 2)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # One pool per uWSGI worker: a pool created before the fork is unusable after it
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, logo:str):
+        '''Queue variant generation for a freshly stored logo; returns the future, or None when disabled.'''
+        if not self.workers:
+            return None
+        future = self._get_executor().submit(render_variants, os.path.abspath(self.folder), logo)
+        future.add_done_callback(partial(self._record, logo))
+        return future
+
+    def _record(self, logo:str, future) -> None:
+        # Runs on a pool management thread, outside any request
+        error = future.exception()
+        if error:
+            print(f'Error: could not generate variants for logo {logo}:', error)
+            return
+        with self.app.app_context():
+            record_variants(logo, future.result())
+
+    def originals(self):
+        '''Logo files in the upload folder that are not themselves variants.'''
+        for name in sorted(os.listdir(self.folder)):
+            extension = name.rsplit('.', 1)[-1].lower()
+            if extension in ALLOWED_EXTENSIONS and not VARIANT_NAME.search(name):
+                yield name
+
+    def backfill(self, logos):
+        '''Generate and record variants for existing logos; yields (logo, error) as each finishes.'''
+        executor = ProcessPoolExecutor(max_workers=max(1, self.workers))
+        try:
+            futures = [(logo, executor.submit(render_variants, os.path.abspath(self.folder), logo)) for logo in logos]
+            for logo, future in futures:
+                error = future.exception()
+                if not error:
+                    record_variants(logo, future.result())
+                yield logo, error
+        finally:
+            executor.shutdown()
+
+    def shutdown(self) -> None:
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+
+
+def record_variants(logo:str, variants:list) -> None:
+    LogoVariantModel.insert_variants(logo, variants)
+    for software in SoftwareModel.fetch_by_logo(logo):
+        invalidate_software(software.id)
+    for application in ApplicationModel.fetch_by_logo(logo):
+        invalidate_application(application.id, application.software_id)
+
+
+logo_pipeline = LogoPipeline()
+atexit.register(logo_pipeline.shutdown)
@@ -0,0 +1,92 @@
+"""
+openapi.py
+
+Serves the Swagger/OpenAPI document of the api as pre-rendered JSON. The
+document is rendered once per process (or read once from the file that
+`flask write-openapi` wrote at deploy time, when OPENAPI_DOCUMENT names it)
+and served with an ETag, so clients that poll it get a 304 until the next
+deploy changes it. Keys are sorted, so every worker renders the same bytes and
+the same ETag.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from flask import Response, current_app, request
+from flask_restx import Api, Resource
+
+
+def render_document(api) -> bytes:
+    '''The api's Swagger document as JSON; needs a request context for its base path.'''
+    schema = api.__schema__
+    if 'error' in schema:
+        raise RuntimeError(schema['error'])
+    return json.dumps(schema, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def document_etag(document:bytes) -> str:
+    return hashlib.sha256(document).hexdigest()[:32]
+
+
+class OpenApiDocument(object):
+    def __init__(self, api):
+        self.api = api
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        '''(document, etag) for the current script root, rendered or loaded on first use.'''
+        key = request.script_root
+        cached = self._documents.get(key)
+        if cached is None:
+            with self._lock:
+                cached = self._documents.get(key)
+                if cached is None:
+                    # The deploy-time file is rendered for the root script path
+                    document = (None if key else self._load()) or render_document(self.api)
+                    cached = self._documents[key] = (document, document_etag(document))
+        return cached
+
+    def _load(self):
+        path = current_app.config.get('OPENAPI_DOCUMENT')
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, 'rb') as document_file:
+            return document_file.read()
+
+
+class OpenApiView(Resource):
+    '''Render the Swagger specifications as JSON'''
+    def __init__(self, api=None, *args, **kwargs):
+        super().__init__(api, *args, **kwargs)
+        self.document = api.document
+
+    def get(self):
+        try:
+            document, etag = self.document.get()
+        except Exception as e:
+            print('========================================')
+            print('Error description: ', e)
+            print('========================================')
+            return {'message': 'Could not render the API document.'}, 500
+        response = Response(document, mimetype='application/json')
+        response.set_etag(etag)
+        # Clients may keep it, but must revalidate: a deploy can change it
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+class CachedSpecsApi(Api):
+    '''An Api whose swagger.json is rendered once and served with an ETag.'''
+    def __init__(self, *args, **kwargs):
+        self.document = OpenApiDocument(self)
+        super().__init__(*args, **kwargs)
+
+    def _register_specs(self, app_or_blueprint):
+        if self._add_specs:
+            endpoint = 'specs'
+            self._register_view(app_or_blueprint, OpenApiView, self.default_namespace, '/swagger.json',
+                                endpoint=endpoint, resource_class_args=(self,))
+            self.endpoints.add(endpoint)
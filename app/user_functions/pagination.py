@@ -0,0 +1,28 @@
+from flask import request, url_for
+from flask_restx import inputs
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+
+def add_page_arguments(parser):
+    '''Add the keyset pagination and created-range arguments to a request parser.'''
+    parser.add_argument('after', location='args', type=int, help='Return records with an id greater than this cursor')
+    parser.add_argument('limit', location='args', type=inputs.int_range(1, MAX_PAGE_LIMIT), default=DEFAULT_PAGE_LIMIT, help=f'Page size (max {MAX_PAGE_LIMIT})')
+    parser.add_argument('created_from', location='args', type=inputs.datetime_from_iso8601, help='Only records created at or after this ISO 8601 time')
+    parser.add_argument('created_to', location='args', type=inputs.datetime_from_iso8601, help='Only records created before this ISO 8601 time')
+    return parser
+
+
+def next_page_link(next_after):
+    '''URL of the next page for the current request, or None on the last page.'''
+    if next_after is None:
+        return None
+    args = request.args.to_dict()
+    args['after'] = next_after
+    # A query argument named like a path argument cannot go into the URL twice
+    return url_for(request.endpoint, **{**request.view_args, **{key: value for key, value in args.items() if key not in request.view_args}})
+
+
+def page_response(items, next_after):
+    return {'items': items, 'next': next_page_link(next_after)}
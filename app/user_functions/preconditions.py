@@ -0,0 +1,31 @@
+"""
+preconditions.py
+
+Optimistic concurrency over HTTP. Records carry a version that every update
+bumps. It is sent as the ETag, and a client that sends it back in If-Match
+only changes the record if nobody else changed it in between; otherwise it
+gets 412 Precondition Failed.
+"""
+from typing import Optional
+
+from flask import request
+
+from models import PreconditionFailedError
+
+
+def if_match_version() -> Optional[int]:
+    '''The version the client sent in If-Match ("3", W/"3" or 3); None when it sent none or '*'.'''
+    value = request.headers.get('If-Match', '').strip()
+    if not value or value == '*':
+        return None
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise PreconditionFailedError('If-Match must be the ETag of the record.')
+
+
+def etag(version:int) -> dict:
+    '''Response headers carrying a record's version.'''
+    return {'ETag': f'"{version}"'}
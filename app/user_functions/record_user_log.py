@@ -1,10 +1,26 @@
-import requests
+import atexit
+import os
+
+from flask_jwt_extended import get_jwt_identity
+
+from .log_shipper import LogShipper
+
 log_submission_url = 'http://172.18.0.1:3100/api/logs' # 'http://0.0.0.0:3100/api/logs' # 172.18.0.3
+log_bulk_submission_url = log_submission_url + '/bulk'
+
+# Replays spooled logs, which do not keep the callers' tokens
+log_service_token = os.getenv('LOG_SERVICE_TOKEN')
+
+log_shipper = LogShipper(log_bulk_submission_url, service_token=log_service_token)
+atexit.register(log_shipper.close)
 
 def record_user_log(auth_token, method, description):
-    payload = {'method': method, 'description': description}
-    res = requests.post(log_submission_url, json=payload, headers=auth_token)
-    if res.status_code != 201:
-        print ("Error:", res.status_code)
-        print(res.text)
-        return {'Message': description + ', but log was never recorded in database.'}, 400 
\ No newline at end of file
+    # Queued and shipped in batches by a background thread, so the log service
+    # never adds latency to the request. Each event keeps the caller's token so
+    # the log service can attribute it to the right user, and the user's id for
+    # when it is replayed from the spool without the token.
+    identity = get_jwt_identity()
+    event = {'method': method, 'description': description, 'authorization': auth_token.get('Authorization'),
+             'user_id': identity.get('id') if isinstance(identity, dict) else identity}
+    if not log_shipper.submit(event):
+        print('Error: log queue is full, dropped log:', description)
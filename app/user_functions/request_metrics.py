@@ -0,0 +1,244 @@
+"""
+request_metrics.py
+
+Per-request instrumentation for the api blueprint. Every request is timed end
+to end, together with the SQL statements it ran (count and time, via
+SQLAlchemy engine events) and the serialization it did (marshmallow schemas and
+compiled serializers). User logs are shipped off the request path, so requests
+make no outbound HTTP calls; the log shipper publishes its own stats. The
+numbers are returned in a Server-Timing header and aggregated per route into
+histograms, which /metrics publishes in the Prometheus text format to scrapers
+presenting METRICS_TOKEN as a bearer token.
+
+Nothing is hooked in unless METRICS_ENABLED is set, and /metrics is only
+served when METRICS_TOKEN is set too. Each uWSGI worker keeps
+its own histograms, labelled with its pid. Wall time stops when the response
+is returned, so it does not include the body of a streamed export.
+Serialization time includes any lazy loads the schemas trigger.
+"""
+import functools
+import hmac
+import os
+import threading
+import time
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+LABELS = ('worker', 'route', 'method')
+
+_local = threading.local()
+
+
+def current_timings():
+    '''The timings of the request running on this thread, or None.'''
+    return getattr(_local, 'timings', None)
+
+
+class RequestTimings(object):
+    __slots__ = ('started', 'db_time', 'db_statements', 'serialize_time', 'serializing', 'observed')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_statements = 0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.observed = False
+
+
+class Histogram(object):
+    def __init__(self, name:str, description:str, buckets:tuple):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels:tuple, value:float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # one count per bucket, then +Inf, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = format_labels(zip(LABELS, labels))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {values[-2]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values[-2]}')
+        return lines
+
+
+def format_labels(pairs) -> str:
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs)
+
+
+class RequestMetrics(object):
+    def __init__(self, app=None):
+        self.enabled = False
+        self.server_timing = False
+        self.token = None
+        self.requests = {}
+        self.stats_sources = {}
+        self.info_sources = {}
+        self._lock = threading.Lock()
+        self.histograms = {
+            'total': Histogram('license_api_request_duration_seconds', 'Wall time of api requests.', DURATION_BUCKETS),
+            'db': Histogram('license_api_db_duration_seconds', 'Time spent running SQL statements per request.', DURATION_BUCKETS),
+            'statements': Histogram('license_api_db_statements', 'SQL statements per request.', STATEMENT_BUCKETS),
+            'serialize': Histogram('license_api_serialization_duration_seconds', 'Time spent serializing responses per request.', DURATION_BUCKETS),
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, blueprint:str='api') -> None:
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        if not self.enabled:
+            return
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', True)
+        install_hooks()
+        app.before_request_funcs.setdefault(blueprint, []).append(self._start)
+        app.after_request_funcs.setdefault(blueprint, []).append(self._finish)
+        app.teardown_request_funcs.setdefault(blueprint, []).append(self._teardown)
+        self.token = app.config.get('METRICS_TOKEN')
+        if not self.token:
+            print('Warning: METRICS_TOKEN is not set, so /metrics is not served.')
+            return
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics_view)
+
+    def add_stats(self, name:str, stats) -> None:
+        '''Publish the numbers returned by a `stats()` callable as license_api_<name>_<key> gauges.'''
+        self.stats_sources[name] = stats
+
+    def add_info(self, name:str, info) -> None:
+        '''Publish the labels returned by an `info()` callable as a license_api_<name>_info metric of value 1.'''
+        self.info_sources[name] = info
+
+    def _start(self) -> None:
+        _local.timings = RequestTimings()
+
+    def _finish(self, response):
+        timings = current_timings()
+        if timings is not None:
+            total = self._observe(timings, response.status_code)
+            if self.server_timing:
+                response.headers['Server-Timing'] = (
+                    f'db;dur={1000 * timings.db_time:.2f};desc="{timings.db_statements} statements", '
+                    f'serialize;dur={1000 * timings.serialize_time:.2f}, '
+                    f'total;dur={1000 * total:.2f}')
+        return response
+
+    def _teardown(self, exc=None) -> None:
+        timings = current_timings()
+        if timings is not None and not timings.observed:
+            # An unhandled exception skipped after_request
+            self._observe(timings, 500)
+        _local.timings = None
+
+    def _observe(self, timings:RequestTimings, status:int) -> float:
+        total = time.perf_counter() - timings.started
+        timings.observed = True
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (os.getpid(), rule, request.method)
+        self.histograms['total'].observe(labels, total)
+        self.histograms['db'].observe(labels, timings.db_time)
+        self.histograms['statements'].observe(labels, timings.db_statements)
+        self.histograms['serialize'].observe(labels, timings.serialize_time)
+        with self._lock:
+            key = labels + (status,)
+            self.requests[key] = self.requests.get(key, 0) + 1
+        return total
+
+    def render(self) -> str:
+        lines = ['# HELP license_api_requests_total Api requests by route, method and status.',
+                 '# TYPE license_api_requests_total counter']
+        with self._lock:
+            requests_total = dict(self.requests)
+        for key, count in sorted(requests_total.items()):
+            lines.append(f"license_api_requests_total{{{format_labels(zip(LABELS + ('status',), key))}}} {count}")
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        worker = format_labels([('worker', os.getpid())])
+        for source, stats in self.stats_sources.items():
+            for key, value in stats().items():
+                if value is None:
+                    continue
+                name = f'license_api_{source}_{key}'
+                lines.extend([f'# TYPE {name} gauge', f'{name}{{{worker}}} {value}'])
+        for source, info in self.info_sources.items():
+            labels = info()
+            if labels:
+                name = f'license_api_{source}_info'
+                lines.extend([f'# TYPE {name} gauge', f"{name}{{{worker},{format_labels(sorted(labels.items()))}}} 1"])
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {self.token}'.encode('utf-8')):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain', headers={'WWW-Authenticate': 'Bearer'})
+        return Response(self.render(), mimetype='text/plain', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+_hooks_installed = False
+
+
+def install_hooks() -> None:
+    '''Hook the SQLAlchemy engine and the serializers once per process.'''
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    import marshmallow
+    from schemas.compiled import CompiledSerializer
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_timings() is not None:
+            conn.info['statement_started'] = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = current_timings()
+        started = conn.info.pop('statement_started', None)
+        if timings is not None and started is not None:
+            timings.db_time += time.perf_counter() - started
+            timings.db_statements += 1
+
+    marshmallow.Schema.dump = timed_dump(marshmallow.Schema.dump)
+    CompiledSerializer.dump = timed_dump(CompiledSerializer.dump)
+
+
+def timed_dump(dump):
+    @functools.wraps(dump)
+    def wrapper(schema, *args, **kwargs):
+        timings = current_timings()
+        # Nested schemas dump inside their parent; only time the outermost call
+        if timings is None or timings.serializing:
+            return dump(schema, *args, **kwargs)
+        timings.serializing = True
+        started = time.perf_counter()
+        try:
+            return dump(schema, *args, **kwargs)
+        finally:
+            timings.serialize_time += time.perf_counter() - started
+            timings.serializing = False
+    return wrapper
+
+
+request_metrics = RequestMetrics()
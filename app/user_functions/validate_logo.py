@@ -2,6 +2,19 @@
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# Leading bytes of each accepted image type, mapped to the extension we store it under
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+)
+
 def allowed_file(filename):
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
\ No newline at end of file
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def detect_image_type(header):
+    '''Return the extension for an image's leading bytes, or None if it is not an accepted type.'''
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
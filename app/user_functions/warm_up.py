@@ -0,0 +1,94 @@
+"""
+warm_up.py
+
+Primes a worker before it takes traffic, so its first requests do not pay for
+work that is the same for every request: connecting the database pools (primary
+and replica), syncing the token revocation and license key filters, building
+the URL map, the compiled serializers with the URL templates of their links,
+and the OpenAPI document.
+
+Under uWSGI the warm-up runs in each worker right after the fork, before it
+accepts requests; connections opened in the master would be shared by every
+worker. With `python main.py` it runs before the development server starts.
+Set WARM_UP=0 to turn it off.
+"""
+import time
+from functools import partial
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from blacklist import revocation_store
+from models import db
+from resources import api
+from schemas.compiled import compiled_serializers
+from user_functions.license_validation import license_validator
+
+
+def engines(app) -> list:
+    binds = app.config.get('SQLALCHEMY_BINDS') or {}
+    return [db.get_engine(app)] + [db.get_engine(app, bind=bind) for bind in binds]
+
+
+def prime_pool(engine) -> int:
+    '''Open the pool's steady connections at once and check that they work.'''
+    size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+    connections = [engine.connect() for _ in range(size)]
+    try:
+        for connection in connections:
+            connection.execute(text('SELECT 1'))
+    finally:
+        for connection in connections:
+            connection.close()
+    return size
+
+
+def warm_up(app) -> dict:
+    '''Run every warm-up step; returns the milliseconds each one took.'''
+    timings = {}
+
+    def step(name:str, started:float) -> float:
+        now = time.perf_counter()
+        timings[name] = round(1000 * (now - started), 2)
+        return now
+
+    started = time.perf_counter()
+    with app.app_context():
+        for engine in engines(app):
+            prime_pool(engine)
+        started = step('database_pools', started)
+        revocation_store.sync()
+        started = step('revocation_store', started)
+        license_validator.sync()
+        started = step('license_validation', started)
+
+    app.url_map.update()
+    with app.test_request_context('/'):
+        for serializer in compiled_serializers:
+            serializer.warm_up()
+        started = step('serializers', started)
+        api.document.get()
+    step('openapi', started)
+    return timings
+
+
+def register_warm_up(app) -> bool:
+    '''Warm up each uWSGI worker after the fork; False when not running under uWSGI or disabled.'''
+    if not app.config.get('WARM_UP', True):
+        return False
+    try:
+        from uwsgidecorators import postfork
+    except ImportError:
+        return False
+    postfork(partial(warm_up_worker, app))
+    return True
+
+
+def warm_up_worker(app) -> None:
+    # A worker that could not warm up still serves requests, just slower at first
+    try:
+        print('Worker warmed up:', warm_up(app))
+    except Exception as e:
+        print('========================================')
+        print('Error description: ', e)
+        print('========================================')
@@ -0,0 +1,108 @@
+"""
+cold_start.py
+
+Measures what a fresh worker costs before and during its first requests: the
+import of main (app factory included), the warm-up, and the first and second
+requests to a few catalog routes, with and without the warm-up. Each sample
+runs in a new Python process against a seeded database; the report gives the
+median of the samples as JSON.
+
+    python benchmarks/cold_start.py --database-url sqlite:////tmp/cold.db --samples 5 --max-import-ms 1500
+
+With --max-import-ms or --max-first-request-ms it exits with status 1 when a
+median goes over that budget, so cold-start regressions can fail a build.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROUTES = ('/api/software', '/api/application', '/api/software/1')
+
+
+def sample(database_url:str, warm:bool) -> dict:
+    '''One cold start, in this process: run as `cold_start.py --sample`.'''
+    started = time.perf_counter()
+    from seed import create_app
+    app = create_app(database_url)
+    timings = {'import_ms': 1000 * (time.perf_counter() - started)}
+
+    if warm:
+        from user_functions.warm_up import warm_up
+
+        started = time.perf_counter()
+        warm_up(app)
+        timings['warm_up_ms'] = 1000 * (time.perf_counter() - started)
+
+    client = app.test_client()
+    for label in ('first', 'second'):
+        started = time.perf_counter()
+        for route in ROUTES:
+            response = client.get(route)
+            if response.status_code != 200:
+                raise SystemExit(f'GET {route} answered {response.status_code}')
+        timings[f'{label}_request_ms'] = 1000 * (time.perf_counter() - started) / len(ROUTES)
+    return timings
+
+
+def run_samples(database_url:str, warm:bool, samples:int) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), '--sample', '--database-url', database_url]
+    if warm:
+        command.append('--warm')
+    runs = []
+    for _ in range(samples):
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/license_cold_start.db')
+    parser.add_argument('--samples', type=int, default=5, help='Fresh processes per mode')
+    parser.add_argument('--max-import-ms', type=float, help='Budget for the median import of main')
+    parser.add_argument('--max-first-request-ms', type=float, help='Budget for the median first request of a warmed-up worker')
+    parser.add_argument('--sample', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--warm', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # configurations reads these at import time; the catalog routes run their queries
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='license-cold-start-'))
+    os.environ.setdefault('LOGO_PIPELINE_WORKERS', '0')
+    os.environ['CATALOG_CACHE_BACKEND'] = 'none'
+
+    if args.sample:
+        print(json.dumps(sample(args.database_url, args.warm)))
+        return
+
+    from seed import create_app, migrate, seed
+
+    app = create_app(args.database_url)
+    migrate(app)
+    seed(app, software=10, applications=5, licenses=100)
+
+    report = {
+        'database': args.database_url.split('://')[0],
+        'samples': args.samples,
+        'cold': run_samples(args.database_url, False, args.samples),
+        'warmed_up': run_samples(args.database_url, True, args.samples),
+    }
+    print(json.dumps(report, indent=2))
+
+    over_budget = []
+    if args.max_import_ms is not None and report['warmed_up']['import_ms'] > args.max_import_ms:
+        over_budget.append(f"import took {report['warmed_up']['import_ms']} ms, budget {args.max_import_ms} ms")
+    if args.max_first_request_ms is not None and report['warmed_up']['first_request_ms'] > args.max_first_request_ms:
+        over_budget.append(f"first request took {report['warmed_up']['first_request_ms']} ms, budget {args.max_first_request_ms} ms")
+    for message in over_budget:
+        print('Over budget:', message, file=sys.stderr)
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+license_tokens.py
+
+Measures the throughput of the signed license tokens: how many tokens a worker
+signs per second when licenses are sold, and how many a client verifies per
+second with user_functions/license_tokens.py, against a JWK set of several
+published keys as during a key rotation. Every token is verified once before
+timing, and a tampered token must be rejected. The report is JSON.
+
+    python benchmarks/license_tokens.py --tokens 20000 --published-keys 3
+
+Exits with status 1 if a token does not verify or a tampered one does.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import seed # puts app/ on sys.path
+
+
+class License(object):
+    '''Stands in for a sold LicenseModel row.'''
+    def __init__(self, id:int):
+        self.id = id
+        self.license_key = f'KEY-{id % 1000:06d}-{id:010d}'
+        self.application_id = 1 + id % 1000
+        self.license_status = 'sold'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=20000, help='Tokens to sign and verify')
+    parser.add_argument('--published-keys', type=int, default=3, help='Keys in the JWK set, the last one signs')
+    args = parser.parse_args()
+
+    from flask import Flask
+    from commands.signing_keys import write_signing_key
+    from user_functions.license_signing import LicenseSigner
+    from user_functions.license_tokens import LicenseTokenError, public_keys_from_jwks, verify_license_token
+
+    directory = tempfile.mkdtemp(prefix='license-signing-keys-')
+    key_ids = [f'key-{n}' for n in range(args.published_keys)]
+    for key_id in key_ids:
+        write_signing_key(directory, key_id)
+    app = Flask(__name__)
+    app.config.update(LICENSE_SIGNING_KEYS_DIR=directory, LICENSE_SIGNING_KEY_ID=key_ids[-1])
+    signer = LicenseSigner(app)
+    # What a client does once: fetch /api/license/keys and load the keys
+    public_keys = public_keys_from_jwks(json.loads(json.dumps(signer.jwks())))
+
+    licenses = [License(id) for id in range(1, args.tokens + 1)]
+    started = time.perf_counter()
+    tokens = [signer.issue(license) for license in licenses]
+    sign_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for token in tokens:
+        verify_license_token(token, public_keys)
+    verify_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for token, license in zip(tokens, licenses):
+        verify_license_token(token, public_keys, license_key=license.license_key)
+    verify_key_seconds = time.perf_counter() - started
+
+    failures = []
+    claims = verify_license_token(tokens[0], public_keys, license_key=licenses[0].license_key)
+    if claims['license_id'] != licenses[0].id or claims['application_id'] != licenses[0].application_id:
+        failures.append('the claims do not describe the license')
+    header, payload, signature = tokens[0].split('.')
+    tampered = f"{header}.{payload[:-2]}{'AA' if payload[-2:] != 'AA' else 'BB'}.{signature}"
+    for label, token, license_key in (('tampered token', tampered, None),
+                                      ('token for another key', tokens[0], licenses[1].license_key)):
+        try:
+            verify_license_token(token, public_keys, license_key=license_key)
+            failures.append(f'a {label} verified')
+        except LicenseTokenError:
+            pass
+
+    report = {
+        'tokens': args.tokens,
+        'published_keys': len(public_keys),
+        'token_bytes': len(tokens[0]),
+        'sign_per_second': round(args.tokens / sign_seconds),
+        'verify_per_second': round(args.tokens / verify_seconds),
+        'verify_with_key_per_second': round(args.tokens / verify_key_seconds),
+        'failures': failures,
+    }
+    print(json.dumps(report, indent=2))
+    for file_name in os.listdir(directory):
+        os.remove(os.path.join(directory, file_name))
+    os.rmdir(directory)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
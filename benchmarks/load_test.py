@@ -0,0 +1,357 @@
+"""
+load_test.py
+
+Seeds a database, then drives every route of the software, application and
+license namespaces at a fixed concurrency. Prints throughput, latency
+percentiles and SQL statements per request for each route as JSON.
+
+    python benchmarks/load_test.py --database-url sqlite:////tmp/load.db --licenses 1000 --concurrency 8 --requests 200
+
+Requests go through the WSGI app in process. Each request thread has its own
+test client, so the numbers measure the application and the database, not an
+HTTP server. User logs are shipped to a local stub of the log service. Writes
+work on fixture rows created before timing starts, so every route can be run
+repeatedly against the same seeded database.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from seed import create_app, migrate, seed
+
+# 1x1 transparent PNG, accepted by the logo type check
+LOGO = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+IMPORT_BATCH = 10
+STATUS_CHANGE_BATCH = 10
+
+
+class LogServiceStub(ThreadingHTTPServer):
+    '''Accepts log batches on any path and counts the events it received.
+
+    Set `status` to another code to have batches refused; `received` keeps the
+    Authorization header and events of every accepted batch.
+    '''
+    daemon_threads = True
+
+    def __init__(self):
+        self.events = 0
+        self.status = 201
+        self.received = []
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), LogServiceHandler)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/api/logs/bulk'
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, name='log-service-stub', daemon=True).start()
+
+
+class LogServiceHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        events = json.loads(body or b'[]')
+        status = self.server.status
+        if status in (200, 201):
+            with self.server.lock:
+                self.server.events += len(events) if isinstance(events, list) else 1
+                self.server.received.append((self.headers.get('Authorization'), events))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryCounter(object):
+    '''Records the SQL statements the current thread sends to the engine.'''
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def reset(self) -> None:
+        self._local.statements = []
+
+    @property
+    def statements(self) -> list:
+        if not hasattr(self._local, 'statements'):
+            self._local.statements = []
+        return self._local.statements
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+class Route(object):
+    '''One route to drive; `build(i)` returns the path and test client keyword arguments of the i-th request.'''
+    def __init__(self, method:str, template:str, build, token:str=None, expect=(200,)):
+        self.method = method
+        self.name = f'{method} /api/{template}'
+        self.build = build
+        self.token = token
+        self.expect = expect
+
+
+def logo_form(**fields) -> dict:
+    fields['logo'] = (io.BytesIO(LOGO), 'logo.png')
+    return {'data': fields, 'content_type': 'multipart/form-data'}
+
+
+def create_fixtures(app, count:int) -> dict:
+    '''Create the rows the write routes consume, `count` of each, and return their ids.'''
+    from models import db
+    from models.software import SoftwareModel
+    from models.application import ApplicationModel
+    from models.license import LicenseModel
+
+    marker = f'{time.time_ns():x}'
+    with app.app_context():
+        # Catalog reads rotate over a few of the seeded rows
+        catalog_software = [id for id, in SoftwareModel.query.with_entities(SoftwareModel.id).order_by(SoftwareModel.id).limit(5)]
+        catalog_applications = [id for id, in ApplicationModel.query.with_entities(ApplicationModel.id).order_by(ApplicationModel.id).limit(5)]
+
+        software = [SoftwareModel(name=f'Load Fixture {marker} {i}', logo='software.png') for i in range(count + 1)]
+        db.session.add_all(software)
+        db.session.flush()
+        owner = software[-1].id
+
+        applications = [
+            ApplicationModel(software_id=owner, description=f'Load fixture {marker} {i}', logo='application.png',
+                             price=1.0, download_link='https://example.com/download')
+            for i in range(count + 2)
+        ]
+        db.session.add_all(applications)
+        db.session.commit()
+        transitions, allocation = applications[-2].id, applications[-1].id
+
+        fixtures = {'marker': marker, 'software': [row.id for row in software[:-1]], 'owner': owner,
+                    'applications': [row.id for row in applications[:-2]],
+                    'transition_application': transitions, 'allocation_application': allocation,
+                    'catalog_software': catalog_software, 'catalog_applications': catalog_applications}
+        for purpose, application_id, license_status, rows in (
+                ('delete', transitions, 'available', count), ('update', transitions, 'available', count),
+                ('credit', transitions, 'available', count), ('sell', transitions, 'on_credit', count),
+                ('avail', transitions, 'on_credit', count), ('allocate', allocation, 'available', count),
+                ('status', transitions, 'available', count * STATUS_CHANGE_BATCH)):
+            LicenseModel.insert_batch([
+                {'application_id': application_id, 'license_key': f'LOAD-{marker}-{purpose}-{i}', 'license_status': license_status}
+                for i in range(rows)
+            ])
+            keys = [f'LOAD-{marker}-{purpose}-{i}' for i in range(rows)]
+            fixtures[purpose] = [row.id for row in LicenseModel.query.with_entities(LicenseModel.id)
+                                 .filter(LicenseModel.license_key.in_(keys)).order_by(LicenseModel.id)]
+        LicenseModel.reconcile_inventory([transitions, allocation])
+    return fixtures
+
+
+def build_routes(fixtures:dict) -> list:
+    marker = fixtures['marker']
+    catalog_software, catalog_applications = fixtures['catalog_software'], fixtures['catalog_applications']
+
+    def ndjson_import(i):
+        lines = [json.dumps({'license_key': f'LOAD-{marker}-import-{i}-{k}', 'application_id': fixtures['transition_application']})
+                 for k in range(IMPORT_BATCH)]
+        return 'license/import', {'data': '\n'.join(lines), 'content_type': 'application/x-ndjson'}
+
+    return [
+        # software
+        Route('GET', 'software', lambda i: ('software', {})),
+        Route('POST', 'software', lambda i: ('software', logo_form(name=f'Load Software {marker} {i}')), 'admin', (201,)),
+        Route('GET', 'software/<id>', lambda i: (f'software/{catalog_software[i % len(catalog_software)]}', {})),
+        Route('PUT', 'software/<id>', lambda i: (f'software/{fixtures["owner"]}',
+                                                 {'json': {'name': f'Load Renamed {marker} {i}'}}), 'admin'),
+        Route('PUT', 'software/logo/<id>', lambda i: (f'software/logo/{fixtures["owner"]}', logo_form()), 'admin'),
+        # application
+        Route('GET', 'application', lambda i: ('application', {})),
+        Route('POST', 'application', lambda i: ('application', logo_form(
+            description=f'Load application {marker} {i}', download_link='https://example.com/download',
+            price='9.99', software_id=str(fixtures['owner']))), 'admin', (201,)),
+        Route('GET', 'application/<id>', lambda i: (f'application/{catalog_applications[i % len(catalog_applications)]}', {})),
+        Route('PUT', 'application/<id>', lambda i: (f'application/{fixtures["transition_application"]}', {'json': {
+            'description': f'Load updated {marker} {i}', 'download_link': 'https://example.com/download', 'price': 5.0}}), 'admin'),
+        Route('PUT', 'application/logo/<id>', lambda i: (f'application/logo/{fixtures["transition_application"]}', logo_form()), 'admin'),
+        Route('GET', 'application/software/<software_id>', lambda i: (f'application/software/{catalog_software[i % len(catalog_software)]}', {})),
+        # license
+        Route('GET', 'license', lambda i: ('license?limit=100', {}), 'admin'),
+        Route('POST', 'license', lambda i: ('license', {'json': {
+            'application_id': fixtures['transition_application'], 'license_key': f'LOAD-{marker}-post-{i}'}}), 'admin', (201,)),
+        Route('POST', 'license/import', ndjson_import, 'admin', (201,)),
+        Route('GET', 'license/export', lambda i: (f'license/export?application_id={catalog_applications[i % len(catalog_applications)]}', {}), 'admin'),
+        Route('GET', 'license/<id>', lambda i: (f'license/{1 + i}', {}), 'user'),
+        Route('PUT', 'license/<id>', lambda i: (f'license/{fixtures["update"][i]}',
+                                                {'json': {'license_key': f'LOAD-{marker}-updated-{i}'}}), 'admin'),
+        Route('GET', 'license/application/<application_id>', lambda i: (f'license/application/{catalog_applications[i % len(catalog_applications)]}?limit=100', {}), 'admin'),
+        Route('PUT', 'license/credit/<id>', lambda i: (f'license/credit/{fixtures["credit"][i]}', {}), 'admin'),
+        Route('PUT', 'license/sell/<id>', lambda i: (f'license/sell/{fixtures["sell"][i]}', {}), 'user'),
+        Route('PUT', 'license/avail/<id>', lambda i: (f'license/avail/{fixtures["avail"][i]}', {}), 'admin'),
+        Route('PUT', 'license/status', lambda i: ('license/status', {'json': {
+            'license_status': 'on_credit',
+            'ids': fixtures['status'][i * STATUS_CHANGE_BATCH:(i + 1) * STATUS_CHANGE_BATCH]}}), 'admin'),
+        Route('POST', 'license/application/<application_id>/allocate', lambda i: (
+            f'license/application/{fixtures["allocation_application"]}/allocate', {'json': {'count': 1}}), 'user'),
+        Route('POST', 'license/validate', lambda i: ('license/validate', {'json': {
+            'license_key': f'KEY-{catalog_applications[i % len(catalog_applications)]:06d}-{i:010d}'}}), 'user'),
+        Route('POST', 'license/validate (batch)', lambda i: ('license/validate', {'json': {
+            'license_keys': [f'KEY-{application_id:06d}-{i:010d}' for application_id in catalog_applications]}}), 'user'),
+        Route('GET', 'license/keys', lambda i: ('license/keys', {})),
+        # search
+        Route('GET', 'search/software', lambda i: ('search/software?q=Software', {})),
+        Route('GET', 'search/application', lambda i: ('search/application?q=Application', {})),
+        Route('GET', 'search/license', lambda i: (f'search/license?q=KEY-{catalog_applications[i % len(catalog_applications)]:06d}-', {}), 'admin'),
+        # Deletes last, they remove the rows the other routes point at
+        Route('DELETE', 'license/<id>', lambda i: (f'license/{fixtures["delete"][i]}', {}), 'admin'),
+        Route('DELETE', 'application/<id>', lambda i: (f'application/{fixtures["applications"][i]}', {}), 'admin'),
+        Route('DELETE', 'software/<id>', lambda i: (f'software/{fixtures["software"][i]}', {}), 'admin'),
+    ]
+
+
+def mint_tokens(app) -> dict:
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        return {
+            'admin': {'Authorization': 'Bearer ' + create_access_token({'id': 1, 'privileges': 'Admin'}, expires_delta=False)},
+            'user': {'Authorization': 'Bearer ' + create_access_token({'id': 2, 'privileges': 'User'}, expires_delta=False)},
+        }
+
+
+def percentile(ordered:list, fraction:float) -> float:
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run_route(app, route:Route, tokens:dict, counter:QueryCounter, offset:int, requests:int, concurrency:int) -> dict:
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        path, kwargs = route.build(offset + i)
+        headers = dict(tokens[route.token]) if route.token else {}
+        counter.reset()
+        started = time.perf_counter()
+        response = local.client.open('/api/' + path, method=route.method, headers=headers, **kwargs)
+        response.get_data()  # drain streamed bodies inside the timing
+        elapsed = time.perf_counter() - started
+        return elapsed, counter.count, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    wall_time = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _, _ in results)
+    queries = [count for _, count, _ in results]
+    statuses = Counter(status for _, _, status in results)
+    return {
+        'requests': requests,
+        'errors': sum(count for status, count in statuses.items() if status not in route.expect),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(requests / wall_time, 1),
+        'latency_ms': {
+            'mean': round(1000 * sum(latencies) / len(latencies), 2),
+            'p50': round(1000 * percentile(latencies, 0.50), 2),
+            'p95': round(1000 * percentile(latencies, 0.95), 2),
+            'p99': round(1000 * percentile(latencies, 0.99), 2),
+            'max': round(1000 * latencies[-1], 2),
+        },
+        'sql_per_request': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/license_load_test.db')
+    parser.add_argument('--software', type=int, default=10)
+    parser.add_argument('--applications', type=int, default=5, help='Applications per software')
+    parser.add_argument('--licenses', type=int, default=1000, help='Licenses per application')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route')
+    parser.add_argument('--routes', help='Only run routes whose name matches this regular expression, e.g. "GET /api/license"')
+    parser.add_argument('--no-catalog-cache', action='store_true', help='Measure the catalog routes without their cache')
+    parser.add_argument('--output', help='Write the report to this file instead of stdout')
+    args = parser.parse_args()
+
+    # configurations reads these at import time
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='license-load-test-'))
+    os.environ.setdefault('LOGO_PIPELINE_WORKERS', '0')
+    if args.no_catalog_cache:
+        os.environ['CATALOG_CACHE_BACKEND'] = 'none'
+    if 'LICENSE_SIGNING_KEYS_DIR' not in os.environ:
+        # Sold and allocated licenses get their signed token, as in production
+        from commands.signing_keys import write_signing_key
+        os.environ['LICENSE_SIGNING_KEYS_DIR'] = tempfile.mkdtemp(prefix='license-signing-keys-')
+        write_signing_key(os.environ['LICENSE_SIGNING_KEYS_DIR'], 'benchmark')
+
+    stub = LogServiceStub()
+    stub.start()
+    from user_functions.record_user_log import log_shipper
+    log_shipper.url = stub.url
+
+    app = create_app(args.database_url)
+    migrate(app)
+    seeded = seed(app, software=args.software, applications=args.applications, licenses=args.licenses)
+
+    from models import db
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    tokens = mint_tokens(app)
+    fixtures = create_fixtures(app, args.warmup + args.requests)
+
+    routes = build_routes(fixtures)
+    if args.routes:
+        routes = [route for route in routes if re.search(args.routes, route.name)]
+
+    results = {}
+    # The resources print their errors; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        for route in routes:
+            if args.warmup:
+                run_route(app, route, tokens, counter, 0, args.warmup, args.concurrency)
+            results[route.name] = run_route(app, route, tokens, counter, args.warmup, args.requests, args.concurrency)
+        log_shipper.close()
+
+    report = {
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0],
+        'dataset': seeded,
+        'concurrency': args.concurrency,
+        'requests_per_route': args.requests,
+        'catalog_cache': not args.no_catalog_cache,
+        'routes': results,
+        'log_service': {'received': stub.events, **log_shipper.stats()},
+    }
+    stub.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    else:
+        print(output)
+    if any(result['errors'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
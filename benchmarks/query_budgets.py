@@ -0,0 +1,189 @@
+"""
+query_budgets.py
+
+Runs every route against a seeded database and checks the SQL statements each
+request sends to the database against a declared per-route budget. Any SELECT
+that is repeated with the same shape within one request is reported as an N+1,
+even when the route is within its budget: the statement runs once per parent
+row, and a bigger dataset would break the budget.
+
+    python benchmarks/query_budgets.py --database-url sqlite:////tmp/budgets.db
+
+The catalog cache is disabled so that the catalog routes run their queries.
+Exits with status 1 if any route is over budget, shows an N+1, has no budget
+declared or answers with an unexpected status.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from collections import Counter
+
+from seed import create_app, migrate, seed
+from load_test import LogServiceStub, QueryCounter, Route, build_routes, create_fixtures, mint_tokens
+
+# Most statements a single request of each route may run, whatever the size of the dataset.
+# Status changes get one more for the inventory row of a status an application did not have yet;
+# selling tries the guarded UPDATE once per status a license can be sold from.
+QUERY_BUDGETS = {
+    'GET /api/software': 5,
+    'GET /api/software (sparse)': 2,
+    'POST /api/software': 3,
+    'GET /api/software/<id>': 5,
+    'PUT /api/software/<id>': 5,
+    'PUT /api/software/logo/<id>': 4,
+    'GET /api/application': 3,
+    'GET /api/application (admin)': 2,
+    'GET /api/application (sparse)': 1,
+    'POST /api/application': 4,
+    'GET /api/application/<id>': 3,
+    'PUT /api/application/<id>': 3,
+    'PUT /api/application/logo/<id>': 3,
+    'GET /api/application/software/<software_id>': 3,
+    'GET /api/license': 1,
+    'GET /api/license (sparse)': 2,
+    'POST /api/license': 3,
+    'POST /api/license/import': 4,
+    'GET /api/license/export': 1,
+    'GET /api/license/<id>': 2,
+    'PUT /api/license/<id>': 2,
+    'GET /api/license/application/<application_id>': 1,
+    'PUT /api/license/credit/<id>': 5,
+    'PUT /api/license/sell/<id>': 7,
+    'PUT /api/license/avail/<id>': 5,
+    'PUT /api/license/status': 5,
+    'POST /api/license/application/<application_id>/allocate': 7,
+    # A lookup by key hash, plus the Bloom filter sync of the worker when it is due
+    'POST /api/license/validate': 3,
+    'POST /api/license/validate (batch)': 3,
+    'GET /api/license/keys': 0,
+    'GET /api/search/software': 1,
+    'GET /api/search/application': 1,
+    'GET /api/search/license': 1,
+    'DELETE /api/license/<id>': 4,
+    'DELETE /api/application/<id>': 3,
+    'DELETE /api/software/<id>': 2,
+}
+
+# The same SELECT shape this many times in one request is an N+1
+REPEAT_THRESHOLD = 3
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PARAMETER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+|%s)\s*,?)+\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement:str) -> str:
+    '''The statement with its literals and the length of its IN lists taken out.'''
+    shape = LITERAL.sub('?', statement)
+    shape = PARAMETER_LIST.sub('(...)', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def repeated_selects(statements:list, threshold:int=REPEAT_THRESHOLD) -> dict:
+    shapes = Counter(statement_shape(statement) for statement in statements)
+    return {shape: count for shape, count in shapes.items()
+            if count >= threshold and shape.upper().startswith('SELECT')}
+
+
+def check_route(app, route:Route, tokens:dict, counter:QueryCounter, requests:int) -> dict:
+    client = app.test_client()
+    worst = []
+    statuses = Counter()
+    n_plus_one = {}
+    for i in range(requests):
+        path, kwargs = route.build(i)
+        headers = dict(tokens[route.token]) if route.token else {}
+        counter.reset()
+        response = client.open('/api/' + path, method=route.method, headers=headers, **kwargs)
+        response.get_data()
+        statements = list(counter.statements)
+        statuses[response.status_code] += 1
+        if len(statements) > len(worst):
+            worst = statements
+        n_plus_one.update(repeated_selects(statements))
+
+    budget = QUERY_BUDGETS.get(route.name)
+    problems = []
+    if budget is None:
+        problems.append('no query budget declared')
+    elif len(worst) > budget:
+        problems.append(f'{len(worst)} statements, budget is {budget}')
+    for shape, count in n_plus_one.items():
+        problems.append(f'N+1: {count} x {shape}')
+    unexpected = sorted(status for status in statuses if status not in route.expect)
+    if unexpected:
+        problems.append(f'unexpected status {unexpected}')
+
+    return {'statements': len(worst), 'budget': budget, 'problems': problems,
+            'worst_request': [statement_shape(statement) for statement in worst] if problems else None}
+
+
+def budget_routes(fixtures:dict) -> list:
+    '''The load test routes, and the variants that have a budget of their own.'''
+    routes = build_routes(fixtures)
+    # Admins get the applications with their licenses instead of the catalog view
+    routes.insert(6, Route('GET', 'application (admin)', lambda i: ('application', {}), 'admin'))
+    # Sparse fieldsets skip the relations that were not asked for
+    routes[0:0] = [
+        Route('GET', 'software (sparse)', lambda i: ('software?fields=name&include=application_count', {})),
+        Route('GET', 'application (sparse)', lambda i: ('application?fields=description,price&include=', {})),
+        Route('GET', 'license (sparse)', lambda i: ('license?limit=100&fields=license_key&include=application', {}), 'admin'),
+    ]
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/license_query_budgets.db')
+    parser.add_argument('--software', type=int, default=5)
+    parser.add_argument('--applications', type=int, default=5, help='Applications per software')
+    parser.add_argument('--licenses', type=int, default=20, help='Licenses per application')
+    parser.add_argument('--requests', type=int, default=3, help='Requests per route; the worst one is checked')
+    args = parser.parse_args()
+
+    # configurations reads these at import time
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='license-query-budgets-'))
+    os.environ.setdefault('LOGO_PIPELINE_WORKERS', '0')
+    os.environ['CATALOG_CACHE_BACKEND'] = 'none'
+    # Keep the token revocation sync out of the counted requests
+    os.environ.setdefault('REVOCATION_SYNC_INTERVAL', '3600')
+    if 'LICENSE_SIGNING_KEYS_DIR' not in os.environ:
+        # Sold and allocated licenses get their signed token, as in production
+        from commands.signing_keys import write_signing_key
+        os.environ['LICENSE_SIGNING_KEYS_DIR'] = tempfile.mkdtemp(prefix='license-signing-keys-')
+        write_signing_key(os.environ['LICENSE_SIGNING_KEYS_DIR'], 'benchmark')
+
+    stub = LogServiceStub()
+    stub.start()
+    from user_functions.record_user_log import log_shipper
+    log_shipper.url = stub.url
+
+    app = create_app(args.database_url)
+    migrate(app)
+    seed(app, software=args.software, applications=args.applications, licenses=args.licenses)
+
+    from models import db
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    tokens = mint_tokens(app)
+    fixtures = create_fixtures(app, args.requests)
+
+    # The first authenticated request loads the revocation filter
+    app.test_client().get('/api/license?limit=1', headers=tokens['admin'])
+
+    report = {}
+    for route in budget_routes(fixtures):
+        report[route.name] = check_route(app, route, tokens, counter, args.requests)
+    log_shipper.close()
+    stub.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if any(result['problems'] for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+query_plans.py
+
+Seeds a large database and checks that the hot list, filter and allocate
+queries are answered from indexes rather than full table scans.
+
+    python benchmarks/query_plans.py --database-url sqlite:////tmp/plans.db --licenses 20000
+
+Exits with status 1 if any query plan contains a full scan or an explicit sort.
+"""
+import argparse
+import json
+import sys
+
+from seed import create_app, migrate, seed
+
+
+def hot_queries():
+    from models import db
+    from models.application import ApplicationModel
+    from models.license import LicenseModel
+
+    def page(query, id_column, after=1000, limit=100):
+        return query.filter(id_column > after).order_by(id_column.asc()).limit(limit + 1)
+
+    return {
+        'license page': page(LicenseModel.query, LicenseModel.id),
+        'license page by status': page(LicenseModel.filter_query(LicenseModel.query, license_status='sold'), LicenseModel.id),
+        'license page by application': page(LicenseModel.filter_query(LicenseModel.query, application_id=7), LicenseModel.id),
+        'license page by application and status': page(
+            LicenseModel.filter_query(LicenseModel.query, application_id=7, license_status='on_credit'), LicenseModel.id),
+        'allocate candidates': LicenseModel.query.with_entities(LicenseModel.id)
+            .filter_by(application_id=7, license_status='available')
+            .order_by(LicenseModel.id.asc()).limit(10),
+        'license status counts': db.session.query(LicenseModel.application_id, LicenseModel.license_status, db.func.count(LicenseModel.id))
+            .filter(LicenseModel.application_id.in_([1, 2, 3]))
+            .group_by(LicenseModel.application_id, LicenseModel.license_status),
+        'license key lookup': db.session.query(LicenseModel.license_key)
+            .filter(LicenseModel.license_key.in_(['KEY-000001-0000000001', 'KEY-000002-0000000002'])),
+        'applications by software': ApplicationModel.query.filter(ApplicationModel.software_id.in_([1, 2])),
+        'license key prefix search': LicenseModel.search_keys_query('KEY-000007-', after='KEY-000007-0000001000').limit(21),
+    }
+
+
+def explain(query):
+    '''Return (plan_lines, problems) for a query on the current database; problems
+    are full table scans and sorts that an index should have made unnecessary.'''
+    from models import db
+
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'postgresql':
+        plan = db.session.execute('EXPLAIN (FORMAT JSON) ' + sql).scalar()[0]['Plan']
+        lines, full_scans = [], []
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            line = f"{node['Node Type']} on {node.get('Relation Name', '-')} using {node.get('Index Name', '-')}"
+            lines.append(line)
+            if node['Node Type'] in ('Seq Scan', 'Sort'):
+                full_scans.append(line)
+            nodes.extend(node.get('Plans', []))
+        return lines, full_scans
+
+    lines = [row[-1] for row in db.session.execute('EXPLAIN QUERY PLAN ' + sql)]
+    # 'SCAN <table>' without an index is a full table scan in SQLite
+    full_scans = [line for line in lines if (line.startswith('SCAN') and 'USING' not in line) or 'TEMP B-TREE' in line]
+    return lines, full_scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/license_query_plans.db')
+    parser.add_argument('--software', type=int, default=20)
+    parser.add_argument('--applications', type=int, default=10, help='Applications per software')
+    parser.add_argument('--licenses', type=int, default=2000, help='Licenses per application')
+    args = parser.parse_args()
+
+    app = create_app(args.database_url)
+    migrate(app)
+    seed(app, software=args.software, applications=args.applications, licenses=args.licenses)
+
+    from models import db
+    report = {}
+    with app.app_context():
+        # Make sure the planner has statistics for the seeded tables
+        db.session.execute('ANALYZE')
+        for name, query in hot_queries().items():
+            lines, full_scans = explain(query)
+            report[name] = {'plan': lines, 'index_only': not full_scans}
+
+    print(json.dumps(report, indent=2))
+    if not all(result['index_only'] for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
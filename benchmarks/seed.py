@@ -0,0 +1,83 @@
+"""
+seed.py
+
+Builds the Flask app against a scratch database, brings the schema up to date
+through the migrations and seeds it with generated software, applications and
+licenses. Shared by the scripts in this directory.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'app')
+sys.path.insert(0, os.path.abspath(APP_DIR))
+
+# configurations reads these at import time
+os.environ.setdefault('MAIL_PORT', '25')
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-secret')
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+
+STATUS_CYCLE = ('available', 'available', 'available', 'on_credit', 'sold')
+
+
+def create_app(database_url:str):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = database_url
+    from main import app
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    return app
+
+
+def migrate(app) -> None:
+    from flask_migrate import upgrade
+
+    with app.app_context():
+        upgrade(directory=os.path.join(APP_DIR, 'migrations'))
+
+
+def seed(app, software:int=10, applications:int=5, licenses:int=1000, chunk_size:int=10000) -> dict:
+    '''Insert software x applications x licenses rows unless the database already has data.'''
+    from models import db
+    from models.software import SoftwareModel
+    from models.application import ApplicationModel
+    from models.license import LicenseModel
+
+    with app.app_context():
+        if db.session.query(SoftwareModel.id).first():
+            return {'seeded': False}
+
+        created = datetime(2020, 1, 1)
+        db.session.execute(SoftwareModel.__table__.insert(), [
+            {'id': s + 1, 'name': f'Software {s + 1}', 'logo': 'software.png', 'created': created}
+            for s in range(software)
+        ])
+        db.session.execute(ApplicationModel.__table__.insert(), [
+            {'id': s * applications + a + 1, 'software_id': s + 1, 'description': f'Application {s + 1}.{a + 1}',
+             'logo': 'application.png', 'price': 10.0 + a, 'download_link': 'https://example.com/download', 'created': created}
+            for s in range(software) for a in range(applications)
+        ])
+
+        rows = []
+        license_id = 0
+        for application_id in range(1, software * applications + 1):
+            for _ in range(licenses):
+                license_id += 1
+                rows.append({
+                    'id': license_id,
+                    'application_id': application_id,
+                    'license_key': f'KEY-{application_id:06d}-{license_id:010d}',
+                    'license_status': STATUS_CYCLE[license_id % len(STATUS_CYCLE)],
+                    'created': created + timedelta(seconds=license_id),
+                })
+                if len(rows) >= chunk_size:
+                    db.session.execute(LicenseModel.__table__.insert(), rows)
+                    rows = []
+        if rows:
+            db.session.execute(LicenseModel.__table__.insert(), rows)
+        if db.engine.dialect.name == 'postgresql':
+            # Explicit ids do not advance the serial sequences
+            for table in ('software', 'applications', 'licenses'):
+                db.session.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+        db.session.commit()
+        LicenseModel.reconcile_inventory(list(range(1, software * applications + 1)))
+        return {'seeded': True, 'software': software, 'applications': software * applications, 'licenses': license_id}
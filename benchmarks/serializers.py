@@ -0,0 +1,98 @@
+"""
+serializers.py
+
+Compares the marshmallow schemas with the compiled serializers the list
+endpoints use. Each case dumps the same page of rows both ways inside a
+request context, checks that the two JSON documents are byte for byte the
+same and reports the time per page of each. The schemas dump their nested
+applications and licenses with the compiled serializers too, so the nested
+cases mostly measure the top level.
+
+    python benchmarks/serializers.py --database-url sqlite:////tmp/serializers.db --page-size 1000
+
+Exits with status 1 if any case renders differently.
+"""
+import argparse
+import json
+import sys
+import time
+
+from seed import create_app, migrate, seed
+
+
+def cases(page_size:int) -> dict:
+    '''name -> (marshmallow dump, compiled dump), both without arguments.'''
+    from models.application import ApplicationModel
+    from models.license import LicenseModel
+    from models.software import SoftwareModel
+    from schemas.application import (ApplicationSchema, ApplicationCountSchema, application_serializer,
+                                     application_count_serializer, application_context, application_count_context)
+    from schemas.license import LicenseSchema, license_serializer
+    from schemas.software import SoftwareCountSchema, software_count_serializer, software_count_context
+
+    licenses, _ = LicenseModel.fetch_page(limit=page_size)
+    license_rows, _ = LicenseModel.fetch_page_rows(limit=page_size)
+    applications, _ = ApplicationModel.fetch_page(limit=min(page_size, 100))
+    software, _ = SoftwareModel.fetch_page(limit=min(page_size, 100))
+    with_licenses = application_context(applications)
+    with_counts = application_count_context(applications)
+    software_counts = software_count_context(software)
+
+    return {
+        'licenses': (
+            lambda: LicenseSchema(many=True, exclude=('application',)).dump(licenses),
+            lambda: license_serializer.dump(license_rows)),
+        'applications with licenses': (
+            lambda: ApplicationSchema(many=True, context=with_licenses).dump(applications),
+            lambda: application_serializer.dump(applications, context=with_licenses)),
+        'application counts': (
+            lambda: ApplicationCountSchema(many=True, context=with_counts).dump(applications),
+            lambda: application_count_serializer.dump(applications, context=with_counts)),
+        'software counts': (
+            lambda: SoftwareCountSchema(many=True, context=software_counts).dump(software),
+            lambda: software_count_serializer.dump(software, context=software_counts)),
+    }
+
+
+def per_call(func, repeat:int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/license_serializers.db')
+    parser.add_argument('--software', type=int, default=10)
+    parser.add_argument('--applications', type=int, default=5, help='Applications per software')
+    parser.add_argument('--licenses', type=int, default=200, help='Licenses per application')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(args.database_url)
+    migrate(app)
+    seed(app, software=args.software, applications=args.applications, licenses=args.licenses)
+
+    report = {}
+    with app.test_request_context('/api/license'):
+        for name, (schema_dump, compiled_dump) in cases(args.page_size).items():
+            identical = json.dumps(schema_dump()) == json.dumps(compiled_dump())
+            schema_time = per_call(schema_dump, args.repeat)
+            compiled_time = per_call(compiled_dump, args.repeat)
+            report[name] = {
+                'identical': identical,
+                'marshmallow_ms': round(1000 * schema_time, 3),
+                'compiled_ms': round(1000 * compiled_time, 3),
+                'speedup': round(schema_time / compiled_time, 1) if compiled_time else None,
+            }
+
+    print(json.dumps(report, indent=2))
+    if not all(result['identical'] for result in report.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Shared test setup. Apps are built by the factory in main.py against scratch
+SQLite databases, migrated like production, and seeded with the generators in
+benchmarks/seed.py. Set TEST_DATABASE_URL and TEST_REPLICA_URL to run against
+empty Postgres databases instead.
+"""
+import os
+import sys
+
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks')
+sys.path.insert(0, os.path.abspath(BENCHMARKS_DIR))
+
+import seed # puts app/ on sys.path and the settings configurations reads at import in the environment
+from load_test import LogServiceStub
+
+
+@pytest.fixture(scope='session')
+def log_service():
+    '''A local stub of the log service that user logs are shipped to.'''
+    from user_functions.record_user_log import log_shipper
+
+    stub = LogServiceStub()
+    stub.start()
+    log_shipper.url = stub.url
+    yield stub
+    log_shipper.close()
+    stub.shutdown()
+
+
+@pytest.fixture(scope='session')
+def make_app(tmp_path_factory, log_service):
+    '''Build, migrate and seed an app: make_app(name, **config), `name` naming its scratch database.'''
+    from configurations import Testing
+    from main import create_app
+
+    def make(name:str, software:int=5, applications:int=5, licenses:int=20, **config):
+        directory = tmp_path_factory.mktemp(name)
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': os.getenv('TEST_DATABASE_URL', f'sqlite:///{directory}/{name}.db'),
+            'UPLOAD_FOLDER': str(directory / 'uploads'),
+            'LOGO_PIPELINE_WORKERS': 0,
+            'CATALOG_CACHE_BACKEND': 'none',
+            'WARM_UP': False,
+        }
+        settings.update(config)
+        app = create_app(type(f'{name.title()}Config', (Testing,), settings))
+        seed.migrate(app)
+        seed.seed(app, software=software, applications=applications, licenses=licenses)
+        return app
+    return make
@@ -0,0 +1,47 @@
+"""
+Catalog cache invalidation: the tags a software write bumps, and the memory
+backend forgetting the generations of tags that were not bumped for a TTL.
+"""
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    from user_functions import catalog_cache
+
+    now = [0.0]
+    monkeypatch.setattr(catalog_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_generations_of_tags_not_bumped_for_a_ttl_are_forgotten(clock):
+    from user_functions.catalog_cache import MemoryBackend
+
+    backend = MemoryBackend(ttl=60)
+    backend.bump('software:1')
+    clock[0] = 30
+    backend.bump('software:2')
+    clock[0] = 61
+    backend.bump('software:3')
+
+    assert sorted(backend._generations) == ['software:2', 'software:3']
+    assert backend.generation('software:1') == 0
+    # A forgotten tag bumped again never gets back a generation it had before
+    backend.bump('software:1')
+    assert backend.generation('software:1') == 4
+
+
+def test_software_writes_invalidate_its_applications(make_app, monkeypatch):
+    from models.application import ApplicationModel
+    from user_functions.catalog_cache import MemoryBackend, catalog_cache, invalidate_software
+
+    app = make_app('catalog_cache', software=2, applications=2, licenses=1)
+    monkeypatch.setattr(catalog_cache, 'backend', MemoryBackend())
+    with app.app_context():
+        application_ids = [application.id for application in ApplicationModel.fetch_by_software_id(1)]
+        invalidate_software(1)
+
+    bumped = set(catalog_cache.backend._generations)
+    assert {'software:list', 'software:1', 'application:software:1', 'application:list'} <= bumped
+    assert {f'application:{id}' for id in application_ids} <= bumped
+    assert 'software:2' not in bumped
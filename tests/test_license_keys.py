@@ -0,0 +1,51 @@
+"""
+License keys are unique: adding, re-keying or importing a key that is already
+stored answers 409 or counts a duplicate, never 500, including when another
+writer stores the key between the lookup and the insert.
+"""
+import pytest
+
+from load_test import mint_tokens
+
+STORED_KEY = 'KEY-000001-0000000001'
+
+
+@pytest.fixture(scope='module')
+def keys_app(make_app):
+    app = make_app('license_keys', software=1, applications=1, licenses=5)
+    return app, mint_tokens(app)['admin']
+
+
+def test_adding_a_stored_key_conflicts(keys_app):
+    app, admin = keys_app
+    response = app.test_client().post('/api/license', headers=admin, json={'application_id': 1, 'license_key': STORED_KEY})
+    assert response.status_code == 409
+    assert response.get_json() == {'message': 'This license key already exists.'}
+
+
+def test_re_keying_to_a_stored_key_conflicts(keys_app):
+    app, admin = keys_app
+    response = app.test_client().put('/api/license/2', headers=admin, json={'license_key': STORED_KEY})
+    assert response.status_code == 409
+
+
+def test_import_counts_keys_stored_by_another_writer_as_duplicates(keys_app, monkeypatch):
+    from models.license import LicenseModel
+
+    app, admin = keys_app
+    fetch_existing_keys = LicenseModel.fetch_existing_keys
+    lookups = []
+
+    def stale_first_lookup(license_keys):
+        # The first lookup misses STORED_KEY, as if it were stored right after
+        lookups.append(license_keys)
+        return set() if len(lookups) == 1 else fetch_existing_keys(license_keys)
+    monkeypatch.setattr(LicenseModel, 'fetch_existing_keys', stale_first_lookup)
+
+    body = f'license_key,application_id\n{STORED_KEY},1\nKEY-IMPORTED-1,1\n'
+    response = app.test_client().post('/api/license/import', headers=admin, data=body, content_type='text/csv')
+    assert response.status_code == 201
+    report = response.get_json()
+    assert (report['inserted'], report['duplicates']) == (1, 1)
+    with app.app_context():
+        assert fetch_existing_keys([STORED_KEY, 'KEY-IMPORTED-1']) == {STORED_KEY, 'KEY-IMPORTED-1'}
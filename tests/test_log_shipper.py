@@ -0,0 +1,122 @@
+"""
+The log shipper against a local log service stub that can be made to refuse
+batches: the bounded queue, the spool and its locks, the caller's token kept
+off disk, and the replay.
+"""
+import json
+import os
+import threading
+
+import pytest
+
+from load_test import LogServiceStub
+
+CALLER = 'Bearer caller-token'
+SERVICE_TOKEN = 'service-token'
+
+
+@pytest.fixture
+def stub():
+    stub = LogServiceStub()
+    stub.start()
+    yield stub
+    stub.shutdown()
+
+
+@pytest.fixture
+def make_shipper(stub, tmp_path):
+    from user_functions.log_shipper import LogShipper
+
+    shippers = []
+
+    def make(**kwargs):
+        kwargs.setdefault('service_token', SERVICE_TOKEN)
+        shipper = LogShipper(stub.url, spool_path=str(tmp_path / 'spool' / 'user_logs.ndjson'), **kwargs)
+        shippers.append(shipper)
+        return shipper
+    yield make
+    for shipper in shippers:
+        shipper.close()
+
+
+def event(n:int=1) -> dict:
+    return {'authorization': CALLER, 'user_id': n, 'method': 'post', 'description': f'Event {n}'}
+
+
+def test_a_full_queue_drops_events_instead_of_blocking(stub, make_shipper, monkeypatch):
+    shipper = make_shipper(max_queue_size=2)
+    # No worker: the queue only fills
+    monkeypatch.setattr(shipper, '_ensure_worker', lambda: None)
+
+    assert [shipper.submit(event(n)) for n in range(3)] == [True, True, False]
+    assert (shipper.queue_depth, shipper.dropped) == (2, 1)
+    shipper.close()
+    assert (stub.events, shipper.shipped) == (2, 2)
+
+
+def test_undelivered_batches_are_spooled_without_the_callers_token_and_replayed(stub, make_shipper):
+    shipper = make_shipper()
+    stub.status = 503
+    shipper._ship([event(1), event(2)])
+    assert shipper.spooled == 2
+    with open(shipper.spool_path) as spool:
+        spooled = spool.read()
+    assert 'caller-token' not in spooled and '"user_id": 1' in spooled
+
+    stub.status = 201
+    shipper._replay_spool()
+    assert shipper.replayed == 2
+    assert stub.received == [(f'Bearer {SERVICE_TOKEN}', [
+        {'user_id': 1, 'method': 'post', 'description': 'Event 1'},
+        {'user_id': 2, 'method': 'post', 'description': 'Event 2'},
+    ])]
+    assert not os.path.exists(shipper.spool_path) and not os.path.exists(shipper.spool_path + '.replay')
+
+
+def test_without_a_service_token_undelivered_batches_are_dropped(stub, make_shipper):
+    shipper = make_shipper(service_token=None)
+    stub.status = 503
+    shipper._ship([event()])
+    assert (shipper.dropped, shipper.spooled) == (1, 0)
+    assert not os.path.exists(os.path.dirname(shipper.spool_path))
+
+
+def test_corrupt_spool_lines_are_skipped(stub, make_shipper):
+    shipper = make_shipper()
+    os.makedirs(os.path.dirname(shipper.spool_path))
+    with open(shipper.spool_path, 'w') as spool:
+        spool.write(json.dumps({'user_id': 1}) + '\n' + '{"user_id": 2, "descr\n' + '7\n' + json.dumps({'user_id': 3}) + '\n')
+
+    shipper._replay_spool()
+    assert (shipper.replayed, shipper.corrupt) == (2, 2)
+    assert [events for _, events in stub.received] == [[{'user_id': 1}, {'user_id': 3}]]
+    assert not os.path.exists(shipper.spool_path + '.replay')
+
+
+def test_one_worker_replays_at_a_time(stub, make_shipper):
+    shipper, other_worker = make_shipper(), make_shipper()
+    stub.status = 503
+    shipper._ship([event()])
+    stub.status = 201
+
+    # Another worker (here, another open file) holds the replay lock
+    with shipper._file_lock(shipper.spool_path + '.replay.lock') as locked:
+        assert locked
+        other_worker._replay_spool()
+        assert (other_worker.replayed, stub.events) == (0, 0)
+        assert os.path.exists(shipper.spool_path)
+
+    other_worker._replay_spool()
+    assert (other_worker.replayed, stub.events) == (1, 1)
+
+
+def test_appends_wait_for_the_spool_lock(stub, make_shipper):
+    shipper, other_worker = make_shipper(), make_shipper()
+    with shipper._file_lock(shipper.spool_path + '.lock'):
+        appending = threading.Thread(target=other_worker._spool, args=([event()],))
+        appending.start()
+        appending.join(0.2)
+        assert appending.is_alive()
+        assert not os.path.exists(shipper.spool_path)
+    appending.join(5)
+    assert other_worker.spooled == 1
@@ -0,0 +1,41 @@
+"""
+/metrics serves valid Prometheus text, every sample being a metric name, its
+labels and a number, and only to scrapers presenting METRICS_TOKEN.
+"""
+import re
+
+import pytest
+
+TOKEN = 'scraper-token'
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{.*\})? (-?[0-9.]+(e[+-]?[0-9]+)?|[+-]Inf|NaN)$')
+
+
+@pytest.fixture(scope='module')
+def metrics_app(make_app, tmp_path_factory):
+    from commands.signing_keys import write_signing_key
+
+    keys_directory = str(tmp_path_factory.mktemp('metrics_signing_keys'))
+    write_signing_key(keys_directory, 'k-2026')
+    return make_app('metrics', software=1, applications=1, licenses=5, METRICS_ENABLED=True, METRICS_TOKEN=TOKEN,
+                    LICENSE_SIGNING_KEYS_DIR=keys_directory)
+
+
+def test_every_sample_is_numeric(metrics_app):
+    client = metrics_app.test_client()
+    client.get('/api/software')
+    response = client.get('/metrics', headers={'Authorization': f'Bearer {TOKEN}'})
+    assert response.status_code == 200
+
+    samples = [line for line in response.get_data(as_text=True).splitlines() if line and not line.startswith('#')]
+    assert [sample for sample in samples if not SAMPLE.match(sample)] == []
+    assert any(re.match(r'license_api_license_signing_key_info\{worker="\d+",key_id="k-2026"\} 1$', sample) for sample in samples)
+
+
+@pytest.mark.parametrize('headers', ({}, {'Authorization': 'Bearer wrong-token'}))
+def test_scrapers_without_the_token_are_refused(metrics_app, headers):
+    assert metrics_app.test_client().get('/metrics', headers=headers).status_code == 401
+
+
+def test_without_a_token_metrics_are_not_served(make_app):
+    app = make_app('metrics_without_token', software=1, applications=1, licenses=1, METRICS_ENABLED=True)
+    assert app.test_client().get('/metrics').status_code == 404
@@ -0,0 +1,13 @@
+from flask import Flask
+
+from user_functions.pagination import next_page_link
+
+
+def test_next_page_link_keeps_the_path_arguments():
+    app = Flask(__name__)
+    app.add_url_rule('/license/application/<int:application_id>', 'application_licenses', lambda application_id: '')
+
+    with app.test_request_context('/license/application/1?application_id=2&limit=10'):
+        app.preprocess_request()
+        assert next_page_link(None) is None
+        assert next_page_link(30) == '/license/application/1?limit=10&after=30'
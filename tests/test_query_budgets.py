@@ -0,0 +1,47 @@
+"""
+Every route stays within its query budget and runs no N+1, as declared in
+benchmarks/query_budgets.py. Sold and allocated licenses are signed, as in
+production.
+"""
+import pytest
+
+from load_test import QueryCounter, create_fixtures, mint_tokens
+from query_budgets import QUERY_BUDGETS, budget_routes, check_route, repeated_selects
+
+REQUESTS = 3
+
+
+@pytest.fixture(scope='module')
+def budget_app(make_app, tmp_path_factory):
+    from commands.signing_keys import write_signing_key
+
+    keys_directory = str(tmp_path_factory.mktemp('signing_keys'))
+    write_signing_key(keys_directory, 'test')
+    # Keep the token revocation sync out of the counted requests
+    return make_app('budgets', REVOCATION_SYNC_INTERVAL=3600, LICENSE_SIGNING_KEYS_DIR=keys_directory)
+
+
+def test_repeated_selects_ignore_literals():
+    statements = [f'SELECT * FROM licenses WHERE application_id = {id}' for id in range(3)]
+    assert repeated_selects(statements) == {'SELECT * FROM licenses WHERE application_id = ?': 3}
+    assert repeated_selects(statements[:2]) == {}
+
+
+def test_routes_stay_within_their_query_budgets(budget_app):
+    from models import db
+
+    with budget_app.app_context():
+        counter = QueryCounter(db.engine)
+    tokens = mint_tokens(budget_app)
+    fixtures = create_fixtures(budget_app, REQUESTS)
+    # The first authenticated request loads the revocation filter
+    budget_app.test_client().get('/api/license?limit=1', headers=tokens['admin'])
+
+    routes = budget_routes(fixtures)
+    problems = {}
+    for route in routes:
+        result = check_route(budget_app, route, tokens, counter, REQUESTS)
+        if result['problems']:
+            problems[route.name] = result['problems'] + result['worst_request']
+    assert problems == {}
+    assert sorted(QUERY_BUDGETS) == sorted(route.name for route in routes), 'budgets declared for routes that do not exist'
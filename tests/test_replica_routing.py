@@ -0,0 +1,140 @@
+"""
+Read replica routing against two local databases, a primary and a replica,
+both migrated and seeded alike. The replica's copy of one software row is then
+renamed, so a response shows which database it was read from.
+"""
+import os
+import threading
+
+import pytest
+
+from load_test import mint_tokens
+from seed import migrate, seed
+
+REPLICA_NAME = 'Software 1 (Replica)'
+# Software names are stored title cased
+RENAMED = 'Software 1 (Renamed)'
+
+
+class StatementLog(object):
+    '''The SQL statements this thread sends to each engine.'''
+    def __init__(self, engines:dict):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', self._recorder(name))
+
+    def _recorder(self, name:str):
+        def record(conn, cursor, statement, *args):
+            self.statements.append((name, statement))
+        return record
+
+    def reset(self) -> None:
+        self._local.statements = []
+
+    @property
+    def statements(self) -> list:
+        if not hasattr(self._local, 'statements'):
+            self._local.statements = []
+        return self._local.statements
+
+    def on(self, name:str) -> list:
+        return [statement for engine, statement in self.statements if engine == name]
+
+
+@pytest.fixture(scope='module')
+def routing(make_app, tmp_path_factory):
+    from models import db
+    from models.software import SoftwareModel
+
+    replica_url = os.getenv('TEST_REPLICA_URL', f"sqlite:///{tmp_path_factory.mktemp('replica')}/replica.db")
+    app = make_app('primary', software=2, applications=2, licenses=10, SQLALCHEMY_BINDS={'replica': replica_url})
+    primary_url = app.config['SQLALCHEMY_DATABASE_URI']
+    # The replica gets the same schema and rows, through its own URL
+    app.config['SQLALCHEMY_DATABASE_URI'] = replica_url
+    migrate(app)
+    seed(app, software=2, applications=2, licenses=10)
+    app.config['SQLALCHEMY_DATABASE_URI'] = primary_url
+
+    with app.app_context():
+        primary, replica = db.get_engine(app), db.get_engine(app, bind='replica')
+        replica.execute(SoftwareModel.__table__.update().where(SoftwareModel.__table__.c.id == 1).values(name=REPLICA_NAME))
+        statements = StatementLog({'primary': primary, 'replica': replica})
+    return app, statements, mint_tokens(app), {'primary': primary, 'replica': replica}
+
+
+def request(routing, method:str, path:str, token:str=None, **kwargs):
+    app, statements, tokens, _ = routing
+    statements.reset()
+    return app.test_client().open(f'/api/{path}', method=method, headers=tokens[token] if token else {}, **kwargs)
+
+
+def test_get_reads_the_replica(routing):
+    _, statements, _, _ = routing
+    response = request(routing, 'GET', 'software/1')
+    assert response.status_code == 200
+    assert response.get_json()['name'] == REPLICA_NAME
+    assert statements.on('primary') == []
+
+
+@pytest.mark.parametrize('path', ('software', 'application', 'license?limit=10', 'license/application/1', 'search/software?q=Software'))
+def test_catalog_and_license_gets_read_the_replica(routing, path):
+    _, statements, _, _ = routing
+    response = request(routing, 'GET', path, 'admin')
+    assert response.status_code == 200
+    assert statements.on('replica')
+    # Revoked tokens are always read from the primary
+    assert [statement for statement in statements.on('primary') if 'revoked_tokens' not in statement] == []
+
+
+def test_writes_use_the_primary_and_read_their_write_back(routing):
+    from models.software import SoftwareModel
+
+    app, statements, _, engines = routing
+    response = request(routing, 'PUT', 'software/1', 'admin', json={'name': RENAMED})
+    assert response.status_code == 200
+    assert response.get_json()['name'] == RENAMED
+    assert statements.on('replica') == []
+
+    table = SoftwareModel.__table__
+    with app.app_context():
+        names = {name: engine.execute(table.select().where(table.c.id == 1)).first().name for name, engine in engines.items()}
+    assert names == {'primary': RENAMED, 'replica': REPLICA_NAME}
+
+
+def test_reads_after_a_write_in_a_get_use_the_primary(routing):
+    from models import db
+    from models.software import SoftwareModel
+
+    app, statements, _, _ = routing
+    with app.test_request_context('/api/software/1', method='GET'):
+        app.preprocess_request()
+        statements.reset()
+        assert SoftwareModel.query.get(1).name == REPLICA_NAME
+        assert len(statements.on('replica')) == 1
+
+        db.session.add(SoftwareModel(name='Software written in a GET', logo='software.png'))
+        db.session.flush()
+        assert SoftwareModel.query.filter_by(name='Software written in a GET').first() is not None
+        assert len(statements.on('replica')) == 1
+        db.session.rollback()
+
+
+def test_locking_reads_use_the_primary(routing):
+    from models import db
+    from models.routing import pin_to_primary
+    from models.software import SoftwareModel
+
+    app, statements, _, _ = routing
+    with app.test_request_context('/api/software/1', method='GET'):
+        app.preprocess_request()
+        statements.reset()
+        SoftwareModel.query.filter_by(id=1).with_for_update().first()
+        assert statements.on('primary') and not statements.on('replica')
+
+        pin_to_primary()
+        statements.reset()
+        SoftwareModel.query.get(2)
+        assert statements.on('primary') and not statements.on('replica')
+        db.session.rollback()